@@ -1,4 +1,5 @@
 import socket
+import protocolo
 
 HOST = "127.0.0.1"
 PORT = 65432
@@ -6,19 +7,19 @@ PORT = 65432
 def main():
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         s.connect((HOST, PORT))
-        bienvenida = s.recv(4096).decode("utf-8", errors="ignore")
-        print(bienvenida, end="")
+        entrada = s.makefile("rb")
+        bienvenida = protocolo.lee_mensaje(entrada)
+        print(bienvenida)
         while True:
             try:
                 pregunta = input("> ")
             except (EOFError, KeyboardInterrupt):
                 pregunta = "salir"
-            s.sendall((pregunta + "\n").encode("utf-8"))
-            data = s.recv(4096)
-            if not data:
+            s.sendall(protocolo.codifica(pregunta))
+            respuesta = protocolo.lee_mensaje(entrada)
+            if respuesta is None:
                 break
-            respuesta = data.decode("utf-8", errors="ignore")
-            print(respuesta, end="")
+            print(respuesta)
             if "Adiós." in respuesta:
                 break
 
@@ -1,23 +1,70 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
 import socket
+import sys
 import threading
-import unicodedata
-import difflib
+import time
+from pathlib import Path
+import aritmetica
+import conocimiento
 import eliza_engine
+import normalizacion
+import protocolo
+import semantica
+from cache_lru import FALTA, CacheLRU
+from limite_tasa import LimiteTasa
+from metricas import METRICAS
 
 HOST = "127.0.0.1"
 PORT = 65432
 
+# Base de conocimiento externa (JSONL o SQLite); se recarga en caliente con SIGHUP
+KB_RUTA = os.environ.get("CHATBOT_KB", str(Path(__file__).resolve().with_name("conocimiento.jsonl")))
+# Snapshot precompilado de la base (se reconstruye si cambia el origen); "0" lo desactiva.
+# Por defecto, <KB_RUTA>.kbsnap
+KB_SNAPSHOT = os.environ.get("CHATBOT_KB_SNAPSHOT", "")
+
+# Etapa semántica (TF-IDF, ver semantica.py): similitud coseno mínima para contestar
+# con la respuesta de la clave más parecida, que además debe tener las mismas palabras
+# con contenido; 0 desactiva la etapa. Las candidatas que no llegan, si comparten alguna
+# palabra y pasan de UMBRAL_SUGERENCIA_SEMANTICA, solo se sugieren ("¿Quisiste decir...?").
+UMBRAL_SEMANTICO = float(os.environ.get("CHATBOT_SEMANTICA_UMBRAL", "0.78"))
+UMBRAL_SUGERENCIA_SEMANTICA = float(os.environ.get("CHATBOT_SEMANTICA_SUGERENCIA", "0.5"))
+
+# Caché de respuestas (entradas por caché; TTL en segundos, 0 = sin caducidad)
+CACHE_MAX = int(os.environ.get("CHATBOT_CACHE_MAX", "4096"))
+CACHE_TTL = float(os.environ.get("CHATBOT_CACHE_TTL", "0")) or None
+
+# Modo del servidor: "hilos" (un hilo por conexión) o "asyncio" (un solo event loop)
+MODO = "hilos"
+LIMITE_BUFFER_ESCRITURA = 64 * 1024  # bytes pendientes antes de pausar al escritor
+
+# Protección frente a sobrecarga (ambos modos). Los plazos en segundos; 0 = sin plazo.
+MAX_CONEXIONES = int(os.environ.get("CHATBOT_MAX_CONEXIONES", "1000"))  # más allá: "ocupado"
+TIEMPO_INACTIVO = float(os.environ.get("CHATBOT_TIEMPO_INACTIVO", "600"))  # espera del siguiente mensaje
+TIEMPO_LECTURA = float(os.environ.get("CHATBOT_TIEMPO_LECTURA", "30"))  # para completar un mensaje o un envío
+# Mensajes por segundo y ráfaga por IP de cliente; 0 lo desactiva (el controlador
+# conecta a todos sus usuarios desde la misma IP)
+TASA_CLIENTE = float(os.environ.get("CHATBOT_TASA", "0"))
+RAFAGA_CLIENTE = int(os.environ.get("CHATBOT_RAFAGA", "50"))
+# Al recibir SIGTERM se deja de aceptar y se espera como mucho este tiempo a que
+# terminen las conexiones en curso (las que esperan su siguiente mensaje se cierran ya)
+TIEMPO_DRENAJE = float(os.environ.get("CHATBOT_TIEMPO_DRENAJE", "30"))
+
+SALUDO = "Conectado al servidor de preguntas. Escribe 'salir' para terminar."
+OCUPADO = "Servidor ocupado. Intenta más tarde."
+DEMASIADO_LARGO = "Error: mensaje demasiado largo."
+LIMITADO = "Demasiadas preguntas seguidas. Espera un momento."
+COMANDO_ESTADISTICAS = "/estadisticas"  # responde con las métricas en una línea JSON
+MARCA_LISTO = "LISTO"  # primera palabra de la línea que se imprime al empezar a aceptar
+
 # ---------------- Normalización / Estándar de preguntas ----------------
-def normaliza(txt: str) -> str:
-    txt = txt.strip().lower()
-    txt = "".join(
-        c for c in unicodedata.normalize("NFD", txt)
-        if unicodedata.category(c) != "Mn"
-    )
-    for ch in "¿?¡!.,;:-_()[]{}\"'":
-        txt = txt.replace(ch, " ")
-    txt = " ".join(txt.split())
-    return txt
+# Minúsculas, sin acentos ni signos y con los espacios colapsados. La implementación
+# (tablas de traducción de una pasada y memoria de entradas frecuentes) está en normalizacion.py.
+normaliza = normalizacion.normaliza
 
 def estandariza_pregunta(txt: str) -> str:
     """
@@ -27,278 +74,710 @@ def estandariza_pregunta(txt: str) -> str:
     return normaliza(txt)
 
 # ---------------- Base de conocimiento  ----------------
-def base_conocimiento():
-    pares = {
-        "como te llamas?": "Mi nombre es Diego.",
-        "que edad tienes?": "Tengo la corta edad de 21.",
-        "de donde eres?": "Vengo de Mexico wey.",
-        "cual es tu color favorito?": "Azul.",
-        "cual es tu comida favorita?": "Me encantan las enchiladas suizas.",
-        "que musica te gusta?": "Banda, pop y rock.",
-        "que idioma hablas?": "Principalmente español.",
-        "quien es tu creador?": "Fui creado por un ser celestial que me gusta llamar Dios.",
-        "que puedes hacer?": "Muchas cosas productivas e interesantes.",
-        "como estas?": "Muy bien amigo gracias",
-        "cuantos continentes hay?": "Siete.",
-        "capital de mexico?": "Ciudad de México.",
-        "capital de francia?": "París.",
-        "quien escribio don quijote?": "Miguel de Cervantes.",
-        "planeta mas cercano al sol?": "Mercurio.",
-        "como se llama el planeta rojo?": "Marte.",
-        "oceano mas grande?": "Océano Pacífico.",
-        "animal terrestre mas rapido?": "Guepardo.",
-        "mamifero mas grande?": "La ballena azul.",
-        "metal liquido a temperatura ambiente?": "Mercurio.",
-        "resultado de 2 + 2?": "4.",
-        "cuantos dias tiene un ano bisiesto?": "366.",
-        "formula quimica del agua?": "H2O.",
-        "idioma oficial de brasil?": "Portugués.",
-        "moneda de japon?": "Yen.",
-        "capital de espana?": "Madrid.",
-        "quien pinto la mona lisa?": "Leonardo da Vinci.",
-        "en que continente esta egipto?": "África.",
-        "punto de congelacion del agua en c?": "0 °C.",
-        "quien fue albert einstein?": "Un físico teórico de renombre mundial.",
-        "area de un triangulo?": "Base por altura dividido entre 2.",
-        "cuantas horas tiene un dia?": "24.",
-        "cuantos minutos tiene una hora?": "60.",
-        "cuantos segundos tiene un minuto?": "60.",
-        "que es la fotosintesis?": "Proceso por el que las plantas transforman luz en energia.",
-        "que significa cpu?": "Unidad Central de Procesamiento.",
-        "que es un byte?": "Conjunto de 8 bits.",
-        "que es http?": "Un protocolo para transferir informacion en la web.",
-        "que es la www?": "La World Wide Web, un sistema de documentos interconectados.",
-        "quien fundo microsoft?": "Bill Gates y Paul Allen.",
-        "quien fundo apple?": "Steve Jobs, Steve Wozniak y Ronald Wayne.",
-        "capital de argentina?": "Buenos Aires.",
-        "capital de colombia?": "Bogotá.",
-        "capital de peru?": "Lima.",
-        "capital de chile?": "Santiago.",
-        "capital de italia?": "Roma.",
-        "capital de alemania?": "Berlín.",
-        "capital de canada?": "Ottawa.",
-        "capital de estados unidos?": "Washington, D. C.",
-        "montana mas alta del mundo?": "El Monte Everest.",
-        "capa mas externa de la tierra?": "La corteza terrestre.",
-        "que gas respiramos principalmente?": "Oxígeno (aprox. 21% del aire).",
-        "cuantos huesos tiene el cuerpo humano adulto?": "206.",
-        "simbolo quimico del oro?": "Au.",
-        "que significa onu?": "Organizacion de las Naciones Unidas.",
-        "que significa nasa?": "Administracion Nacional de Aeronautica y del Espacio.",
-        "resultado de 9 x 9?": "81.",
-        "numero pi aproximado?": "3.1416.",
-        "en que pais esta la torre eiffel?": "Francia.",
-    }
-    assert len(pares) >= 50, f"Se esperaban 50 entradas, hay {len(pares)}"
-    return {normaliza(k): v for k, v in pares.items()}
-
-QA = base_conocimiento()
-CLAVES = list(QA.keys())
+def base_conocimiento(ruta=None):
+    """Pares {pregunta normalizada: respuesta} leídos del archivo de la base."""
+    return carga_base(ruta).qa
 
-# ---------------- Aritmética en lenguaje natural ----------------
-def operar(a: float, op: str, b: float) -> float:
-    if op == "+":
-        return a + b
-    if op == "-":
-        return a - b
-    if op == "*":
-        return a * b
-    if op == "/":
-        if b == 0:
-            raise ZeroDivisionError("División entre cero")
-        return a / b
-    raise ValueError("Operador no soportado")
-
-_UNIDADES = {
-    "cero":0, "un":1, "uno":1, "una":1, "dos":2, "tres":3, "cuatro":4,
-    "cinco":5, "seis":6, "siete":7, "ocho":8, "nueve":9
-}
-_ESPECIALES = {
-    "diez":10, "once":11, "doce":12, "trece":13, "catorce":14, "quince":15,
-    "dieciseis":16, "diecisiete":17, "dieciocho":18, "diecinueve":19,
-    "veinte":20, "veintiuno":21, "veintidos":22, "veintitres":23,
-    "veinticuatro":24, "veinticinco":25, "veintiseis":26, "veintisiete":27,
-    "veintiocho":28, "veintinueve":29
-}
-_DECENAS = {
-    "treinta":30, "cuarenta":40, "cincuenta":50, "sesenta":60,
-    "setenta":70, "ochenta":80, "noventa":90
-}
-_CIENTOS = {
-    "cien":100, "ciento":100, "doscientos":200, "trescientos":300,
-    "cuatrocientos":400, "quinientos":500, "seiscientos":600,
-    "setecientos":700, "ochocientos":800, "novecientos":900
-}
-_MULTIPLIERS = {"mil":1000}
-
-def _parse_num_palabras(tokens, i0):
-    """
-    Intenta leer un número en español empezando en tokens[i0].
-    Devuelve (valor, consumidos) o (None, 0) si no hay número.
-    Soporta 0..9999 aprox. (unidades, decenas con 'y', cientos y 'mil').
-    """
-    n = len(tokens)
-    i = i0
-    valor = 0
-    actual = 0
-    consumidos = 0
-
-    while i < n:
-        t = tokens[i]
-        if t == "y":
-            i += 1; consumidos += 1
-            continue
-        if t in _MULTIPLIERS:
-            mult = _MULTIPLIERS[t]
-            if actual == 0:
-                actual = 1
-            valor += actual * mult
-            actual = 0
-            i += 1; consumidos += 1
-            continue
-        if t in _CIENTOS:
-            actual += _CIENTOS[t]
-            i += 1; consumidos += 1
-            continue
-        if t in _DECENAS:
-            actual += _DECENAS[t]
-            i += 1; consumidos += 1
-            continue
-        if t in _ESPECIALES:
-            actual += _ESPECIALES[t]
-            i += 1; consumidos += 1
-            continue
-        if t in _UNIDADES:
-            actual += _UNIDADES[t]
-            i += 1; consumidos += 1
-            continue
-        break
+def ruta_snapshot(ruta=None):
+    if KB_SNAPSHOT == "0":
+        return None
+    return KB_SNAPSHOT if KB_SNAPSHOT and not ruta else f"{ruta or KB_RUTA}.kbsnap"
 
-    if consumidos == 0:
-        return None, 0
-    return valor + actual, consumidos
+def carga_base(ruta=None) -> conocimiento.BaseConocimiento:
+    # Los índices quedan listos (leídos del snapshot o construidos) antes de publicar
+    # la versión y de hacer fork: ni una petición ni un proceso hijo los construye.
+    indices = ("difuso", "semantico") if UMBRAL_SEMANTICO > 0 else ("difuso",)
+    return conocimiento.carga(ruta or KB_RUTA, normaliza, ruta_snapshot(ruta),
+                              normaliza_lote=normalizacion.normaliza_lote, indices=indices)
 
-_OP_MAP = {
-    "+": "+", "-": "-", "*": "*", "/": "/",
-    "x": "*",
-    "mas": "+", "menos": "-", "por": "*", "entre": "/", "dividido": "/", "multiplicado": "*",
-    "sumar": "+", "restar": "-", "multiplicar": "*", "dividir": "/",
-}
+# La base se carga la primera vez que se necesita: importar el módulo (p. ej. el
+# controlador, para HOST/PORT) no la lee.
+_KB: conocimiento.BaseConocimiento | None = None
+_KB_LOCK = threading.Lock()  # serializa cargas y recargas; las lecturas no lo necesitan
 
-def _float_token(tok: str):
-    t = tok.replace(",", ".")
-    try:
-        return float(t)
-    except ValueError:
-        return None
+def kb_actual() -> conocimiento.BaseConocimiento:
+    kb = _KB
+    if kb is None:
+        with _KB_LOCK:
+            if _KB is None:
+                _publica(carga_base())
+            kb = _KB
+    return kb
 
-def _extrae_operacion(k: str):
+def _publica(kb):
+    global _KB
+    _KB = kb
+    _CACHE_DET.limpia()
+
+def __getattr__(nombre):
+    # Alias de la versión actual, resueltos al usarlos
+    if nombre == "QA":
+        return kb_actual().qa
+    if nombre == "CLAVES":
+        return kb_actual().claves
+    if nombre == "INDICE_DIFUSO":
+        return kb_actual().indice_difuso
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+def recarga_base(ruta=None) -> conocimiento.BaseConocimiento:
     """
-    De un texto normalizado 'k' obtiene el primer patrón:
-        número  operador  número
-    Retorna (a, op, b) o None si no lo encuentra.
+    Construye una versión nueva de la base aparte y la publica con una sola
+    asignación. Las peticiones en curso conservan la versión que tomaron al
+    empezar; si la carga falla, la versión anterior sigue activa.
     """
-    tokens = k.split()
-    items = []  # mezcla de floats y ops str
-    i = 0
-    while i < len(tokens):
-        t = tokens[i]
-        # operador
-        if t in _OP_MAP:
-            items.append(_OP_MAP[t])
-            i += 1
-            continue
-        # número en dígitos (acepta decimales . o ,)
-        v = _float_token(t)
-        if v is not None:
-            items.append(v)
-            i += 1
-            continue
-        # número en palabras (puede abarcar varios tokens)
-        v2, used = _parse_num_palabras(tokens, i)
-        if used > 0:
-            items.append(float(v2))
-            i += used
-            continue
-        # otro texto -> ignorar
-        i += 1
+    with _KB_LOCK:
+        nueva = carga_base(ruta)
+        _publica(nueva)
+    return nueva
 
-    # Buscar el primer patrón número op número
-    for j in range(len(items) - 2):
-        if isinstance(items[j], (int, float)) and isinstance(items[j+2], (int, float)) and isinstance(items[j+1], str):
-            return float(items[j]), items[j+1], float(items[j+2])
-    return None
+def _recarga_en_segundo_plano(*_):
+    def tarea():
+        try:
+            kb = recarga_base()
+            print(f"Base de conocimiento recargada: {kb!r}")
+        except Exception as e:
+            print(f"Error al recargar la base de conocimiento (se conserva v{kb_actual().version}): {e}")
+    threading.Thread(target=tarea, daemon=True).start()
 
-def _fmt_num(x: float) -> str:
-    if isinstance(x, float) and x.is_integer():
-        return str(int(x))
-    return f"{x:.10g}"
+def instala_senal_recarga():
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, _recarga_en_segundo_plano)
 
-def intenta_aritmetica(k: str):
-    trio = _extrae_operacion(k)
-    if not trio:
-        return None
-    a, op, b = trio
-    try:
-        r = operar(a, op, b)
-    except ZeroDivisionError:
-        return "Error: división entre cero."
-    except Exception:
-        return None
-    return f"Resultado: {_fmt_num(r)}"
+# ---------------- Aritmética en lenguaje natural ----------------
+# La aritmética (léxico, analizador por precedencia y límites) vive en aritmetica.py.
+# intenta_aritmetica() recibe el texto original: normaliza() quita "-", "(" y los decimales.
+operar = aritmetica.operar
+intenta_aritmetica = aritmetica.intenta_aritmetica
 
 # ---------------- Respuesta principal ----------------
-def responder(pregunta_original: str) -> str:
+# Cachés delante de responder(). Las etapas deterministas se guardan por su
+# propia clave: la aritmética por el texto de aritmetica.prepara() y la
+# búsqueda semántica y la sugerencia difusa por la pregunta normalizada y la versión de la base. ELIZA depende del texto original (mayúsculas,
+# acentos), así que va aparte y se indexa por ese texto.
+_CACHE_DET = CacheLRU(CACHE_MAX, CACHE_TTL)
+_CACHE_ELIZA = CacheLRU(CACHE_MAX, CACHE_TTL)
+
+def configura_cache(max_entradas: int = CACHE_MAX, ttl: float | None = CACHE_TTL):
+    global _CACHE_DET, _CACHE_ELIZA
+    _CACHE_DET = CacheLRU(max_entradas, ttl)
+    _CACHE_ELIZA = CacheLRU(max_entradas, ttl)
+
+def estadisticas_cache() -> dict:
+    return {"deterministas": _CACHE_DET.estadisticas(), "eliza": _CACHE_ELIZA.estadisticas()}
+
+def _cacheado(cache: CacheLRU, clave, calcula):
+    valor = cache.get(clave)
+    if valor is FALTA:
+        valor = calcula()
+        cache.put(clave, valor)
+    return valor
+
+def _quisiste_decir(kb, clave: str) -> str:
+    return f"No tengo esa exacta. ¿Quisiste decir: '{clave}'?\nRespuesta: {kb.qa[clave]}"
+
+def _sugerencia(kb, k: str):
+    sugerencias = kb.indice_difuso.cercanas(k, n=1)
+    if sugerencias:
+        return _quisiste_decir(kb, sugerencias[0])
+    return None
+
+def _semantica(kb, k: str):
+    """
+    (respuesta, sugerencia) de la etapa semántica. Solo se contesta directamente
+    si la clave llega a UMBRAL_SEMANTICO y tiene las mismas palabras con contenido
+    que la pregunta ("cual es la capital de francia" -> "capital de francia", pero no
+    "capital de portugal" -> "capital de italia" ni "me gusta la capital de francia").
+    """
+    indice = kb.indice_semantico if UMBRAL_SEMANTICO > 0 else None
+    if indice is None:
+        return None, None
+    propias = semantica.palabras_contenido(k)
+    sugerida = None
+    for clave, puntos in indice.consulta(k, 3):
+        if puntos < UMBRAL_SUGERENCIA_SEMANTICA:
+            break
+        suyas = semantica.palabras_contenido(clave)
+        if propias and suyas == propias and puntos >= UMBRAL_SEMANTICO:
+            return kb.qa[clave], None
+        if sugerida is None and suyas & propias:
+            sugerida = clave
+    return None, (_quisiste_decir(kb, sugerida) if sugerida is not None else None)
+
+def _marca(tiempos, etapa: str, t0: float) -> float:
+    ahora = time.perf_counter()
+    tiempos.append((etapa, ahora - t0))
+    return ahora
+
+def responder_con_etapa(pregunta_original: str, tiempos: list | None = None):
+    """
+    Devuelve (respuesta, etapa que contestó). Si se pasa la lista `tiempos`,
+    se le añade (etapa, segundos) por cada etapa recorrida.
+    """
+    kb = kb_actual()  # la misma versión de la base durante toda la petición
+    t = time.perf_counter() if tiempos is not None else 0.0
     k = estandariza_pregunta(pregunta_original)
+    if tiempos is not None:
+        t = _marca(tiempos, "normaliza", t)
     if not k:
-        return "Pregunta vacía. Intenta de nuevo."
+        return "Pregunta vacía. Intenta de nuevo.", "vacia"
 
     # 1) Intento de aritmética básica a partir de la frase
-    posible = intenta_aritmetica(k)
+    posible = _cacheado(_CACHE_DET, ("aritmetica", aritmetica.prepara(pregunta_original)),
+                        lambda: intenta_aritmetica(pregunta_original))
+    if tiempos is not None:
+        t = _marca(tiempos, "aritmetica", t)
     if posible is not None:
-        return posible
+        return posible, "aritmetica"
 
     # 2) Preguntas de la base de conocimiento
-    if k in QA:
-        return QA[k]
+    respuesta = kb.qa.get(k)
+    if tiempos is not None:
+        t = _marca(tiempos, "kb", t)
+    if respuesta is not None:
+        return respuesta, "kb"
+    # 2.2) La misma pregunta dicha con otras palabras (similitud TF-IDF)
+    parecida, sugerida = _cacheado(_CACHE_DET, ("semantica", kb.version, k), lambda: _semantica(kb, k))
+    if tiempos is not None:
+        t = _marca(tiempos, "semantica", t)
+    if parecida is not None:
+        return parecida, "semantica"
     # 2.5) Intenta respuesta estilo terapeuta (patrones ELIZA)
-    eliza = eliza_engine.eliza_reply(pregunta_original)
+    texto = pregunta_original.strip()
+    eliza = _cacheado(_CACHE_ELIZA, texto, lambda: eliza_engine.eliza_reply(texto, fallback=False))
+    if eliza is None:
+        eliza = eliza_engine.eliza_fallback(texto)
+        # La genérica ("Entiendo...") contesta a cualquier frase sin "?": antes de
+        # ella va la sugerencia semántica, o nunca llegaría a darse para una frase
+        if eliza is not None and sugerida is not None:
+            if tiempos is not None:
+                _marca(tiempos, "eliza", t)
+            return sugerida, "semantica_sugerida"
+    if tiempos is not None:
+        t = _marca(tiempos, "eliza", t)
     if eliza is not None:
-        return eliza
+        return eliza, "eliza"
 
-    sugerencias = difflib.get_close_matches(k, CLAVES, n=1, cutoff=0.82)
-    if sugerencias:
-        mejor = sugerencias[0]
-        return f"No tengo esa exacta. ¿Quisiste decir: '{mejor}'?\nRespuesta: {QA[mejor]}"
-    return "No sé esa. Intenta una pregunta corta y básica."
+    # 3) La clave más parecida letra a letra (errores de tecleo), como sugerencia
+    sugerencia = _cacheado(_CACHE_DET, ("difusa", kb.version, k), lambda: _sugerencia(kb, k))
+    if tiempos is not None:
+        _marca(tiempos, "difusa", t)
+    if sugerencia is not None:
+        return sugerencia, "difusa"
+    # 4) Parecida por TF-IDF pero sin las mismas palabras: solo se sugiere (las
+    #    preguntas con "?" llegan aquí; las frases ya la recibieron antes de ELIZA)
+    if sugerida is not None:
+        return sugerida, "semantica_sugerida"
+    return "No sé esa. Intenta una pregunta corta y básica.", "sin_respuesta"
+
+def responder(pregunta_original: str) -> str:
+    if not METRICAS.activas:
+        return responder_con_etapa(pregunta_original)[0]
+    tiempos = []
+    t0 = time.perf_counter()
+    respuesta, etapa = responder_con_etapa(pregunta_original, tiempos)
+    METRICAS.registra_respuesta(etapa, time.perf_counter() - t0, tiempos)
+    return respuesta
+
+def estadisticas() -> dict:
+    """Lo que devuelve el comando de estadísticas del socket."""
+    inst = METRICAS.instantanea()
+    inst["cache"] = estadisticas_cache()
+    kb = kb_actual()
+    inst["kb"] = {"version": kb.version, "entradas": len(kb), "origen": kb.origen}
+    return inst
+
+# ---------------- Servidor TCP (hilo por conexión) ----------------
+# Protocolo: un mensaje por línea (ver protocolo.py). Las preguntas se atienden
+# en orden, así que un cliente puede enviar varias seguidas (pipelining) y leer
+# las respuestas en el mismo orden.
+_LIMITE_TASA: LimiteTasa | None = None
+
+def configura_limites(tasa: float = TASA_CLIENTE, rafaga: int = RAFAGA_CLIENTE):
+    """Activa (tasa > 0) o desactiva el límite de mensajes por cliente."""
+    global _LIMITE_TASA
+    _LIMITE_TASA = LimiteTasa(tasa, rafaga) if tasa > 0 else None
+
+configura_limites()
+
+def _plazo(segundos: float) -> float | None:
+    return segundos if segundos and segundos > 0 else None
+
+# ---------------- Apagado ordenado (drenaje) ----------------
+# Cada conexión abierta se registra con un objeto que sabe cerrarla cuando no
+# tenga una pregunta a medias (cierra_en_espera()): su LectorSocket en el modo
+# hilos o su _Vigia en asyncio.
+_DRENANDO = threading.Event()
+_EN_CURSO: set = set()
+_EN_CURSO_LOCK = threading.Lock()
+
+def _registra(conexion):
+    with _EN_CURSO_LOCK:
+        _EN_CURSO.add(conexion)
+    if _DRENANDO.is_set():  # aceptada justo antes de cerrar el socket de escucha
+        conexion.cierra_en_espera()
 
-# ---------------- Servidor TCP (sin cambios) ----------------
-def maneja_cliente(conn, addr):
+def _olvida(conexion):
+    with _EN_CURSO_LOCK:
+        _EN_CURSO.discard(conexion)
+
+def _empieza_drenaje():
+    _DRENANDO.set()
+    with _EN_CURSO_LOCK:
+        abiertas = list(_EN_CURSO)
+    for conexion in abiertas:
+        conexion.cierra_en_espera()
+    print(f"Drenando: {len(abiertas)} conexiones abiertas (máx. {TIEMPO_DRENAJE:g} s)", flush=True)
+
+def _fin_drenaje():
+    quedan = len(_EN_CURSO)
+    print(f"Drenaje terminado ({quedan} conexiones cortadas)" if quedan else "Drenaje terminado", flush=True)
+
+def anuncia_listo(sock: socket.socket, modo: str):
+    """Línea que espera el controlador para saber que el servidor ya acepta conexiones."""
+    host, puerto = sock.getsockname()[:2]
+    # Una sola escritura: con -u, print() manda el texto y el salto de línea por
+    # separado y otra línea podría colarse entre ambos.
+    sys.stdout.write(f"{MARCA_LISTO} {host}:{puerto} pid={os.getpid()} modo={modo}\n")
+    sys.stdout.flush()
+
+def atiende_mensaje(pregunta: str, cliente=None):
+    """Devuelve (respuesta, cerrar) para una pregunta recibida por el socket."""
+    limite = _LIMITE_TASA
+    if limite is not None and cliente is not None and not limite.permite(cliente):
+        if METRICAS.activas:
+            METRICAS.suma("limitadas")
+        return LIMITADO, False
+    pregunta = pregunta.strip()
+    if pregunta == COMANDO_ESTADISTICAS:
+        return json.dumps(estadisticas(), ensure_ascii=False), False
+    if normaliza(pregunta) == "salir":
+        return "Adiós.", True
+    return responder(pregunta), False
+
+def _envia(conn, texto: str):
+    datos = protocolo.codifica(texto)
+    try:
+        conn.sendall(datos)
+    except (TimeoutError, BlockingIOError):
+        raise protocolo.PlazoAgotado("escritura") from None
+    if METRICAS.activas:
+        METRICAS.suma("bytes_salida", len(datos))
+
+def _rechaza(conn):
+    """Respuesta inmediata de "ocupado" sin crear hilo; si no cabe en el buffer, solo se cierra."""
+    if METRICAS.activas:
+        METRICAS.suma("rechazadas")
+    try:
+        conn.setblocking(False)
+        conn.send(protocolo.codifica(OCUPADO))
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+def maneja_cliente(conn, addr, plazas: threading.BoundedSemaphore | None = None):
+    """
+    Atiende una conexión hasta que el cliente sale o cierra, o vence un plazo:
+    TIEMPO_INACTIVO sin empezar un mensaje o TIEMPO_LECTURA para terminar de
+    recibirlo (o de enviar la respuesta). Al acabar libera su plaza.
+    """
+    entrada = protocolo.LectorSocket(conn, _plazo(TIEMPO_INACTIVO), _plazo(TIEMPO_LECTURA))
+    protocolo.fija_plazo_envio(conn, _plazo(TIEMPO_LECTURA))  # un cliente que no lee tampoco retiene el hilo
+    _registra(entrada)
+    cliente = addr[0] if addr else None
+    medir = METRICAS.activas
+    if medir:
+        METRICAS.suma("conexiones")
+        METRICAS.ajusta("conexiones_activas", 1)
     try:
-        conn.sendall("Conectado al servidor de preguntas. Escribe 'salir' para terminar.\n".encode("utf-8"))
+        _envia(conn, SALUDO)
         while True:
-            data = conn.recv(4096)
-            if not data:
+            try:
+                pregunta = entrada.lee_mensaje()
+            except protocolo.LineaDemasiadoLarga:
+                _envia(conn, DEMASIADO_LARGO)
                 break
-            pregunta = data.decode("utf-8", errors="ignore").strip()
-            if normaliza(pregunta) == "salir":
-                conn.sendall("Adiós.\n".encode("utf-8"))
+            if pregunta is None:
                 break
-            respuesta = responder(pregunta)
-            conn.sendall((respuesta + "\n").encode("utf-8"))
+            if medir:
+                METRICAS.suma("mensajes")
+                METRICAS.suma("bytes_entrada", len(pregunta.encode("utf-8")) + 1)
+            respuesta, cerrar = atiende_mensaje(pregunta, cliente)
+            _envia(conn, respuesta)
+            if cerrar:
+                break
+    except protocolo.PlazoAgotado as e:
+        # Se cierra sin más: un cliente con la conexión en reserva (el pool del
+        # controlador) ve el cierre y reconecta en lugar de leer un aviso suelto.
+        if medir:
+            METRICAS.suma("caducadas_" + e.fase)
+    except (ConnectionError, TimeoutError):
+        pass
     finally:
+        _olvida(entrada)
+        if medir:
+            METRICAS.ajusta("conexiones_activas", -1)
         conn.close()
+        if plazas is not None:
+            plazas.release()
 
-def main():
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind((HOST, PORT))
-        s.listen()
-        print(f"Servidor escuchando en {HOST}:{PORT} (Ctrl+C para salir)")
-        while True:
-            conn, addr = s.accept()
-            hilo = threading.Thread(target=maneja_cliente, args=(conn, addr), daemon=True)
-            hilo.start()
+def crea_socket_escucha() -> socket.socket:
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if os.name == "posix":
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    s.bind((HOST, PORT))
+    s.listen(128)
+    return s
+
+class _Drenaje(Exception):
+    """Saca al hilo principal de accept() al recibir SIGTERM."""
+
+def main_hilos(sock: socket.socket | None = None, max_conexiones: int = MAX_CONEXIONES,
+               anuncia: bool = True):
+    # Control de admisión: con todas las plazas ocupadas se contesta "ocupado" y se
+    # cierra en el propio bucle de accept(), sin crear hilo ni reservar memoria.
+    plazas = threading.BoundedSemaphore(max_conexiones)
+    en_accept = False
+
+    def al_terminar(signum, frame):
+        _DRENANDO.set()
+        if en_accept:  # fuera de accept() el bucle ve _DRENANDO al dar la vuelta
+            raise _Drenaje
+
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, al_terminar)
+    with sock or crea_socket_escucha() as s:
+        if anuncia:  # en pre-fork solo habla el supervisor
+            print(f"Servidor escuchando en {HOST}:{PORT}, "
+                  f"máx. {max_conexiones} conexiones (Ctrl+C para salir)")
+            anuncia_listo(s, "hilos")
+        try:
+            while not _DRENANDO.is_set():
+                en_accept = True
+                conn, addr = s.accept()
+                en_accept = False
+                if not plazas.acquire(blocking=False):
+                    _rechaza(conn)
+                    continue
+                try:
+                    threading.Thread(target=maneja_cliente, args=(conn, addr, plazas), daemon=True).start()
+                except RuntimeError:  # el sistema no da más hilos
+                    plazas.release()
+                    _rechaza(conn)
+        except _Drenaje:
+            en_accept = False  # un segundo SIGTERM durante el drenaje no debe cortarlo
+    # Socket de escucha cerrado: las conexiones nuevas van a quien lo comparta (o se rechazan)
+    _empieza_drenaje()
+    limite = time.monotonic() + TIEMPO_DRENAJE
+    while _EN_CURSO and time.monotonic() < limite:
+        time.sleep(0.05)
+    _fin_drenaje()
+
+# ---------------- Servidor asyncio (un solo event loop) ----------------
+_NUNCA = float("inf")
+
+class _Vigia:
+    """
+    Plazo vigente de una conexión asyncio con un solo temporizador. Cambiar de
+    plazo es una asignación; el temporizador solo se reprograma si el nuevo
+    plazo vence antes y, al saltar, se vuelve a armar si el vigente aún no ha
+    vencido. Con mensajes seguidos salta una vez por plazo en lugar de crear y
+    cancelar temporizadores (o tareas, como wait_for()) en cada mensaje.
+    """
+    def __init__(self, loop, transport):
+        self.loop = loop
+        self.transport = transport
+        self.fase = None
+        self.vence = _NUNCA
+        self.caducada = None  # fase en la que venció el plazo, si venció
+        self.cerrar = False  # drenaje: no esperar más mensajes (tras el primero)
+        self.atendidos = 0
+        self._temporizador = None
+        self._cuando = _NUNCA
+
+    def plazo(self, segundos: float, fase: str):
+        self.fase = fase
+        self.vence = self.loop.time() + segundos if segundos > 0 else _NUNCA
+        if self.vence < self._cuando:
+            self._arma(self.vence)
+
+    def _arma(self, cuando: float):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+        self._cuando = cuando
+        self._temporizador = self.loop.call_at(cuando, self._salta) if cuando < _NUNCA else None
+
+    def _salta(self):
+        self._temporizador, self._cuando = None, _NUNCA
+        if self.loop.time() >= self.vence:
+            self.caducada = self.fase
+            self.transport.abort()  # la lectura o el drain() pendientes terminan en el acto
+        else:
+            self._arma(self.vence)
+
+    def cancela(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+
+    def cierra_en_espera(self):
+        """Como LectorSocket.cierra_en_espera(): la conexión acaba al terminar su pregunta."""
+        self.cerrar = True
+        if self.fase == "inactiva" and self.atendidos:
+            self.transport.close()  # la lectura pendiente ve el fin de la conexión
+
+async def maneja_cliente_async(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                               limite: asyncio.Semaphore):
+    """
+    Mismo protocolo que maneja_cliente(), pero como corrutina.
+    Si ya hay MAX_CONEXIONES activas se responde "ocupado" y se cierra.
+    Tras cada escritura se espera a drain() para aplicar contrapresión:
+    un cliente que no lee no hace crecer el buffer sin límite.
+    Los plazos los vigila _Vigia, que aborta la conexión al vencer.
+    """
+    if limite.locked():
+        if METRICAS.activas:
+            METRICAS.suma("rechazadas")
+        try:
+            writer.write(protocolo.codifica(OCUPADO))
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+        return
+
+    async with limite:
+        writer.transport.set_write_buffer_limits(high=LIMITE_BUFFER_ESCRITURA)
+        medir = METRICAS.activas
+        if medir:
+            METRICAS.suma("conexiones")
+            METRICAS.ajusta("conexiones_activas", 1)
+        peer = writer.get_extra_info("peername")
+        cliente = peer[0] if peer else None
+        vigia = _Vigia(asyncio.get_running_loop(), writer.transport)
+        plazo = vigia.plazo
+        _registra(vigia)
+        try:
+            writer.write(protocolo.codifica(SALUDO))
+            plazo(TIEMPO_LECTURA, "escritura")
+            await writer.drain()
+            while not (vigia.cerrar and vigia.atendidos):
+                plazo(TIEMPO_INACTIVO, "inactiva")
+                primero = await reader.read(1)  # el plazo de lectura corre desde el primer byte
+                if not primero:
+                    break
+                plazo(TIEMPO_LECTURA, "lectura")
+                try:
+                    linea = primero if primero == b"\n" else primero + await reader.readline()
+                except ValueError:  # línea más larga que el límite del StreamReader
+                    writer.write(protocolo.codifica(DEMASIADO_LARGO))
+                    plazo(TIEMPO_LECTURA, "escritura")
+                    await writer.drain()
+                    break
+                respuesta, cerrar = atiende_mensaje(protocolo.decodifica(linea), cliente)
+                datos = protocolo.codifica(respuesta)
+                writer.write(datos)
+                if medir:
+                    METRICAS.suma("mensajes")
+                    METRICAS.suma("bytes_entrada", len(linea))
+                    METRICAS.suma("bytes_salida", len(datos))
+                plazo(TIEMPO_LECTURA, "escritura")
+                await writer.drain()
+                vigia.atendidos += 1
+                if cerrar:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            vigia.cancela()
+            _olvida(vigia)
+            if medir:
+                METRICAS.ajusta("conexiones_activas", -1)
+                if vigia.caducada:
+                    METRICAS.suma("caducadas_" + vigia.caducada)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+async def main_async(max_conexiones: int = MAX_CONEXIONES, sock: socket.socket | None = None,
+                     anuncia: bool = True):
+    limite = asyncio.Semaphore(max_conexiones)
+    loop = asyncio.get_running_loop()
+    parada = asyncio.Event()
+    if hasattr(signal, "SIGTERM") and threading.current_thread() is threading.main_thread():
+        try:
+            loop.add_signal_handler(signal.SIGTERM, parada.set)
+        except NotImplementedError:  # Windows: SIGTERM termina sin drenaje
+            pass
+    servidor = await asyncio.start_server(
+        lambda r, w: maneja_cliente_async(r, w, limite),
+        sock=sock or crea_socket_escucha(), limit=protocolo.MAX_LINEA + 1)
+    if anuncia:  # en pre-fork solo habla el supervisor
+        print(f"Servidor (asyncio) escuchando en {HOST}:{PORT}, "
+              f"máx. {max_conexiones} conexiones (Ctrl+C para salir)")
+        anuncia_listo(servidor.sockets[0], "asyncio")
+    try:
+        await parada.wait()
+    finally:
+        servidor.close()
+    _empieza_drenaje()
+    fin = loop.time() + TIEMPO_DRENAJE
+    while _EN_CURSO and loop.time() < fin:
+        await asyncio.sleep(0.05)
+    _fin_drenaje()
+
+# ---------------- Pre-fork (varios procesos, un solo puerto) ----------------
+def ejecuta_modo(modo: str, max_conexiones: int, sock: socket.socket | None = None,
+                 anuncia: bool = True):
+    """Atiende hasta recibir SIGTERM (y drenar) o Ctrl+C."""
+    if modo == "asyncio":
+        try:
+            asyncio.run(main_async(max_conexiones, sock, anuncia))
+        except KeyboardInterrupt:
+            pass
+    else:
+        main_hilos(sock, max_conexiones, anuncia)
+
+def _trabajador(sock: socket.socket, modo: str, max_conexiones: int):
+    """Cuerpo de un proceso hijo: atiende en el socket heredado hasta que lo maten."""
+    codigo = 1
+    try:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C lo gestiona el supervisor
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)  # hasta que ejecuta_modo() ponga el drenaje
+        instala_senal_recarga()
+        ejecuta_modo(modo, max_conexiones, sock, anuncia=False)
+        codigo = 0
+    finally:
+        os._exit(codigo)  # nunca volver al código del supervisor
+
+def main_prefork(procesos: int, modo: str, max_conexiones: int, sock: socket.socket | None = None):
+    """
+    El supervisor abre el socket de escucha (o usa `sock`) y crea `procesos` hijos
+    con fork(); todos heredan el mismo socket y el kernel reparte las conexiones
+    entre ellos, así el trabajo de CPU se reparte entre núcleos en vez de quedarse
+    detrás del GIL de un solo proceso. Si un hijo muere se arranca otro.
+    SIGTERM/Ctrl+C paran a todos (cada uno drena sus conexiones); SIGHUP recarga
+    la base en cada uno.
+    """
+    if not hasattr(os, "fork"):
+        raise SystemExit("--procesos > 1 necesita un sistema con fork().")
+    sock = sock or crea_socket_escucha()
+    hijos: dict[int, float] = {}  # pid -> momento de arranque
+    terminando = False
+
+    def arranca():
+        pid = os.fork()
+        if pid == 0:
+            _trabajador(sock, modo, max_conexiones)
+        hijos[pid] = time.monotonic()
+
+    def termina(signum, frame):
+        nonlocal terminando
+        terminando = True
+        sock.close()  # los hijos conservan su copia hasta que empiezan a drenar
+        for pid in list(hijos):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def reenvia_recarga(signum, frame):
+        # Se recarga también aquí (sin hilo, para no hacer fork con el lock tomado)
+        # para que los hijos que se arranquen después hereden la base nueva.
+        try:
+            recarga_base()
+        except Exception as e:
+            print(f"Error al recargar la base de conocimiento en el supervisor: {e}")
+        for pid in list(hijos):
+            try:
+                os.kill(pid, signal.SIGHUP)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, termina)
+    signal.signal(signal.SIGINT, termina)
+    signal.signal(signal.SIGHUP, reenvia_recarga)
+    for _ in range(procesos):
+        arranca()
+    print(f"Supervisor {os.getpid()}: {procesos} procesos ({modo}) en {HOST}:{PORT}")
+    anuncia_listo(sock, modo)
+
+    while hijos:
+        try:
+            pid, estado = os.wait()
+        except ChildProcessError:
+            break
+        inicio = hijos.pop(pid, None)
+        if inicio is None or terminando:
+            continue
+        print(f"Proceso {pid} terminó (código {os.waitstatus_to_exitcode(estado)}); se arranca otro")
+        if time.monotonic() - inicio < 1.0:
+            time.sleep(1.0)  # falla al arrancar: no entrar en un bucle de fork
+        if not terminando:
+            arranca()
+    sock.close()
+
+# ---------------- Arranque ----------------
+def main(argv=None):
+    global TIEMPO_INACTIVO, TIEMPO_LECTURA, TIEMPO_DRENAJE, UMBRAL_SEMANTICO, UMBRAL_SUGERENCIA_SEMANTICA
+    parser = argparse.ArgumentParser(description="Servidor TCP de preguntas.")
+    parser.add_argument("--modo", choices=("hilos", "asyncio"), default=MODO,
+                        help="hilos: un hilo por conexión; asyncio: un solo event loop")
+    parser.add_argument("--max-conexiones", type=int, default=MAX_CONEXIONES,
+                        help="conexiones simultáneas; las demás reciben \"ocupado\" al instante")
+    parser.add_argument("--tiempo-inactivo", type=float, default=TIEMPO_INACTIVO,
+                        help="segundos sin recibir un mensaje antes de cerrar la conexión (0 = sin plazo)")
+    parser.add_argument("--tiempo-lectura", type=float, default=TIEMPO_LECTURA,
+                        help="segundos para terminar de recibir un mensaje o de enviar la respuesta")
+    parser.add_argument("--tasa", type=float, default=TASA_CLIENTE,
+                        help="mensajes por segundo por IP de cliente (0 = sin límite)")
+    parser.add_argument("--rafaga", type=int, default=RAFAGA_CLIENTE,
+                        help="mensajes seguidos que se permiten a una IP por encima de --tasa")
+    parser.add_argument("--tiempo-drenaje", type=float, default=TIEMPO_DRENAJE,
+                        help="al recibir SIGTERM, segundos de espera a las conexiones en curso")
+    parser.add_argument("--fd", type=int, default=None,
+                        help="descriptor de un socket de escucha heredado (reinicio sin cortes, POSIX)")
+    parser.add_argument("--kb", default=None,
+                        help="archivo de la base de conocimiento (.jsonl o .sqlite)")
+    parser.add_argument("--umbral-semantico", type=float, default=UMBRAL_SEMANTICO,
+                        help="similitud TF-IDF mínima para contestar por la etapa semántica (0 la desactiva)")
+    parser.add_argument("--umbral-sugerencia-semantica", type=float, default=UMBRAL_SUGERENCIA_SEMANTICA,
+                        help="similitud TF-IDF mínima para sugerir una pregunta parecida al final")
+    parser.add_argument("--cache-max", type=int, default=CACHE_MAX,
+                        help="entradas máximas de cada caché de respuestas (0 la desactiva)")
+    parser.add_argument("--cache-ttl", type=float, default=CACHE_TTL or 0,
+                        help="segundos de vida de una respuesta cacheada (0 = sin caducidad)")
+    parser.add_argument("--procesos", type=int, default=1,
+                        help="procesos que atienden el mismo puerto (pre-fork, solo POSIX)")
+    parser.add_argument("--metricas", action=argparse.BooleanOptionalAction, default=METRICAS.activas,
+                        help="instrumentación por etapa y por conexión (CHATBOT_METRICAS=0 la apaga)")
+    args = parser.parse_args(argv)
+    configura_cache(args.cache_max, args.cache_ttl or None)
+    configura_limites(args.tasa, args.rafaga)
+    METRICAS.activas = args.metricas
+    TIEMPO_INACTIVO, TIEMPO_LECTURA = args.tiempo_inactivo, args.tiempo_lectura
+    UMBRAL_SEMANTICO = args.umbral_semantico
+    UMBRAL_SUGERENCIA_SEMANTICA = args.umbral_sugerencia_semantica
+    TIEMPO_DRENAJE = args.tiempo_drenaje
+
+    global KB_RUTA
+    if args.kb:
+        KB_RUTA = args.kb
+        recarga_base()
+    print(f"Base de conocimiento: {kb_actual()!r} (SIGHUP para recargar)")
+
+    # Con --fd el socket ya escucha (lo abrió quien lanzó el proceso, p. ej. el
+    # controlador): un proceso nuevo puede empezar a aceptar antes de que el
+    # anterior deje de hacerlo, sin que haya un momento con el puerto cerrado.
+    sock = socket.socket(fileno=args.fd) if args.fd is not None else None
+    if args.procesos > 1:
+        main_prefork(args.procesos, args.modo, args.max_conexiones, sock)
+        return
+    instala_senal_recarga()
+    ejecuta_modo(args.modo, args.max_conexiones, sock)
 
 if __name__ == "__main__":
     main()
-
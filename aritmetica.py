@@ -0,0 +1,406 @@
+"""
+Aritmética en lenguaje natural (español) para el servidor.
+
+Tres pasos:
+  1) prepara(): minúsculas y sin acentos, conservando los signos que importan
+     para una expresión (dígitos con decimales o exponente como "1e5",
+     + - * / ^ % y paréntesis).
+  2) Léxico en una pasada: cada palabra se busca en un trie de palabras
+     precompilado (números como "doscientos", "millones"; operadores de una o
+     varias palabras como "dividido entre", "elevado a", "por ciento"). Los
+     números escritos se van acumulando mientras las palabras encajen
+     ("tres millones doscientos mil cuarenta y dos"). Las palabras que no son
+     de la expresión se descartan, como hacía el extractor anterior; "a la"
+     solo es potencia entre dos números seguidos ("2 a la 5", no "voy a la
+     escuela").
+  3) Analizador por precedencia (descenso recursivo) que evalúa al vuelo:
+        expr    := term (("+" | "-") term)*
+        term    := unario (("*" | "/") unario)*
+        unario  := ("-" | "+") unario | potencia
+        potencia:= postfijo ("^" unario)?          (asociativa por la derecha)
+        postfijo:= primario ("%" | "al cuadrado" | "al cubo")*
+        primario:= número | "(" expr ")" | "raiz cuadrada de" unario
+     "20 % de 50" se lee como 20/100 * 50.
+
+Se evalúa la primera subexpresión que contenga algún operador binario o una
+raíz; un sufijo suelto no basta ("estoy al 100%", "3 metros al cuadrado"
+siguen siendo frases normales). Todo se
+calcula en coma flotante y con límites duros (longitud, número de elementos,
+profundidad, pasos del analizador, exponente y tamaño del resultado), así que
+ninguna entrada puede disparar el tiempo de CPU ni la memoria.
+"""
+import math
+import re
+
+import normalizacion
+
+MAX_ENTRADA = 500        # caracteres del texto original
+MAX_ELEMENTOS = 128      # números y operadores tras el léxico
+MAX_PROFUNDIDAD = 32     # paréntesis / unarios anidados
+MAX_PASOS = 20_000       # llamadas del analizador (incluye reintentos)
+MAX_EXPONENTE = 1024
+MAX_RESULTADO = 1e100    # valor absoluto máximo de cualquier resultado intermedio
+
+class ErrorAritmetico(Exception):
+    """Error al evaluar una expresión bien formada; el mensaje va al usuario."""
+
+class _Incompleta(Exception):
+    """La secuencia no forma una expresión válida desde esta posición."""
+
+# ---------------- Léxico ----------------
+_UNIDADES = {
+    "cero": 0, "un": 1, "uno": 1, "una": 1, "dos": 2, "tres": 3, "cuatro": 4,
+    "cinco": 5, "seis": 6, "siete": 7, "ocho": 8, "nueve": 9,
+}
+_ESPECIALES = {
+    "diez": 10, "once": 11, "doce": 12, "trece": 13, "catorce": 14, "quince": 15,
+    "dieciseis": 16, "diecisiete": 17, "dieciocho": 18, "diecinueve": 19,
+    "veinte": 20, "veintiun": 21, "veintiuno": 21, "veintiuna": 21, "veintidos": 22,
+    "veintitres": 23, "veinticuatro": 24, "veinticinco": 25, "veintiseis": 26,
+    "veintisiete": 27, "veintiocho": 28, "veintinueve": 29,
+}
+_DECENAS = {
+    "treinta": 30, "cuarenta": 40, "cincuenta": 50, "sesenta": 60,
+    "setenta": 70, "ochenta": 80, "noventa": 90,
+}
+_CIENTOS = {
+    "cien": 100, "ciento": 100, "doscientos": 200, "doscientas": 200,
+    "trescientos": 300, "trescientas": 300, "cuatrocientos": 400, "cuatrocientas": 400,
+    "quinientos": 500, "quinientas": 500, "seiscientos": 600, "seiscientas": 600,
+    "setecientos": 700, "setecientas": 700, "ochocientos": 800, "ochocientas": 800,
+    "novecientos": 900, "novecientas": 900,
+}
+_MULTIPLICADORES = {
+    "mil": 10**3,
+    "millon": 10**6, "millones": 10**6,
+    "billon": 10**12, "billones": 10**12,
+}
+
+# Frases de operadores: (tipo, valor)
+_FRASES = {
+    "mas": ("op", "+"), "menos": ("op", "-"),
+    "por": ("op", "*"), "x": ("op", "*"), "multiplicado por": ("op", "*"),
+    "entre": ("op", "/"), "dividido": ("op", "/"),
+    "dividido entre": ("op", "/"), "dividido por": ("op", "/"),
+    "sumar": ("op", "+"), "restar": ("op", "-"), "multiplicar": ("op", "*"), "dividir": ("op", "/"),
+    "elevado a": ("op", "^"), "elevado al": ("op", "^"),
+    "por ciento": ("post", "%"),
+    "al cuadrado": ("post", 2), "elevado al cuadrado": ("post", 2),
+    "al cubo": ("post", 3), "elevado al cubo": ("post", 3),
+    "raiz cuadrada de": ("func", "raiz"), "raiz de": ("func", "raiz"),
+    "abre parentesis": ("(", None), "cierra parentesis": (")", None),
+}
+
+# Frases que solo son operador justo entre dos números; en otro sitio son
+# palabras corrientes ("tengo 2 hermanos y voy a la escuela 5 dias").
+_FRASES_ENTRE_NUMEROS = {"a la": ("op", "^")}
+
+_SIMBOLOS = {
+    "+": ("op", "+"), "-": ("op", "-"), "*": ("op", "*"), "x": ("op", "*"), "×": ("op", "*"),
+    "/": ("op", "/"), "÷": ("op", "/"), "^": ("op", "^"), "**": ("op", "^"),
+    "%": ("post", "%"), "(": ("(", None), ")": (")", None),
+}
+
+_FIN = "$"  # clave de la entrada terminal de un nodo del trie
+
+def _construye_trie():
+    trie: dict = {}
+    def inserta(frase: str, entrada):
+        nodo = trie
+        for palabra in frase.split():
+            nodo = nodo.setdefault(palabra, {})
+        nodo[_FIN] = entrada
+    for tabla, clase in ((_UNIDADES, "unidad"), (_ESPECIALES, "especial"),
+                         (_DECENAS, "decena"), (_CIENTOS, "ciento")):
+        for palabra, valor in tabla.items():
+            inserta(palabra, ("palabra", valor, clase))
+    for palabra, valor in _MULTIPLICADORES.items():
+        inserta(palabra, ("palabra", valor, "mult"))
+    for frase, entrada in _FRASES.items():
+        inserta(frase, entrada)
+    for frase, entrada in _FRASES_ENTRE_NUMEROS.items():
+        inserta(frase, ("entre", entrada))
+    return trie
+
+_TRIE = _construye_trie()
+
+# Tope de lo que puede seguir a cada clase dentro de un grupo de tres cifras.
+_SIGUIENTE = {"unidad": 1, "especial": 1, "decena": 10, "ciento": 100}
+
+_RE_TOKEN = re.compile(r"\d+(?:[.,]\d+)?(?:e[-+]?\d+)?|[a-zñ]+|\*\*|[-+*/×÷^%()]")
+
+def prepara(texto: str) -> str:
+    """Texto en minúsculas, sin acentos y con los espacios normalizados."""
+    return normalizacion.sin_acentos(texto)
+
+class _Numero:
+    """Acumula palabras numéricas: total (billones/millones), miles y grupo < 1000."""
+    def __init__(self, inicial=None):
+        self.total = 0
+        self.miles = 0
+        self.grupo = inicial or 0
+        self.tope = 0 if inicial is not None else 1000  # tras un número en cifras solo caben multiplicadores
+        self.ultima = "cifra" if inicial is not None else None
+
+    def agrega(self, valor, clase) -> bool:
+        if clase == "mult":
+            if self.ultima == "mult" and self.grupo == 0 and not (self.miles and valor > 1000):
+                return False  # "mil mil": empieza otro número ("mil millones" sí vale)
+            base = self.grupo or 1
+            if valor == 1000:
+                self.miles += base * 1000
+            elif valor == 10**6:
+                self.total += ((self.miles + self.grupo) or 1) * valor
+                self.miles = 0
+            else:
+                # el billón multiplica todo lo que se ha acumulado antes
+                self.total = ((self.total + self.miles + self.grupo) or 1) * valor
+                self.miles = 0
+            self.grupo = 0
+            self.tope = 1000
+            self.ultima = "mult"
+            return True
+        if valor >= self.tope:
+            return False
+        self.grupo += valor
+        self.tope = _SIGUIENTE[clase]
+        self.ultima = clase
+        return True
+
+    def valor(self) -> float:
+        return float(self.total + self.miles + self.grupo)
+
+def _lee_numero(texto: str) -> float:
+    return float(texto.replace(",", "."))
+
+def _es_numero(palabra: str) -> bool:
+    return palabra[:1].isdigit() or _TRIE.get(palabra, {}).get(_FIN, ("",))[0] == "palabra"
+
+def tokeniza(texto: str) -> list:
+    """Lista de (tipo, valor) con tipo en num, op, post, func, ( y )."""
+    crudos = _RE_TOKEN.findall(prepara(texto))
+    salida = []
+    numero = None
+
+    def cierra_numero():
+        nonlocal numero
+        if numero is not None:
+            salida.append(("num", numero.valor()))
+            numero = None
+
+    i, n = 0, len(crudos)
+    while i < n:
+        t = crudos[i]
+        if t[0].isdigit():
+            cierra_numero()
+            numero = _Numero(_lee_numero(t))
+            i += 1
+            continue
+        if t in _SIMBOLOS and not t.isalpha():
+            cierra_numero()
+            salida.append(_SIMBOLOS[t])
+            i += 1
+            continue
+        # Frase más larga del trie que empiece en esta palabra
+        nodo, entrada, largo = _TRIE, None, 0
+        j = i
+        while j < n and crudos[j] in nodo:
+            nodo = nodo[crudos[j]]
+            j += 1
+            if _FIN in nodo:
+                entrada, largo = nodo[_FIN], j - i
+        if entrada is not None and entrada[0] == "entre":
+            entre_numeros = numero is not None and i + largo < n and _es_numero(crudos[i + largo])
+            entrada = entrada[1] if entre_numeros else None
+        if entrada is None:
+            if t == "y" and numero is not None and numero.ultima == "decena" \
+               and i + 1 < n and crudos[i + 1] in _UNIDADES:
+                i += 1  # "treinta y dos"
+                continue
+            if t == "de" and salida and salida[-1] == ("post", "%") and numero is None:
+                salida.append(("op", "*"))  # "20 % de 50"
+            else:
+                cierra_numero()  # palabra ajena a la expresión
+            i += 1
+            continue
+        if entrada[0] == "palabra":
+            _, valor, clase = entrada
+            if numero is None or not numero.agrega(valor, clase):
+                cierra_numero()
+                numero = _Numero()
+                numero.agrega(valor, clase)
+        else:
+            cierra_numero()
+            salida.append(entrada)
+        i += largo
+    cierra_numero()
+    return salida
+
+# ---------------- Evaluación ----------------
+def _comprueba(x: float) -> float:
+    if not math.isfinite(x) or abs(x) > MAX_RESULTADO:
+        raise ErrorAritmetico("Error: resultado demasiado grande.")
+    return x
+
+def operar(a: float, op: str, b: float) -> float:
+    if op == "+":
+        return _comprueba(a + b)
+    if op == "-":
+        return _comprueba(a - b)
+    if op == "*":
+        return _comprueba(a * b)
+    if op == "/":
+        if b == 0:
+            raise ZeroDivisionError("División entre cero")
+        return _comprueba(a / b)
+    if op == "^":
+        if abs(b) > MAX_EXPONENTE:
+            raise ErrorAritmetico("Error: exponente demasiado grande.")
+        if a == 0 and b < 0:
+            raise ZeroDivisionError("División entre cero")
+        try:
+            r = a ** b
+        except OverflowError:
+            raise ErrorAritmetico("Error: resultado demasiado grande.") from None
+        if isinstance(r, complex):
+            raise ErrorAritmetico("Error: operación no válida.")
+        return _comprueba(r)
+    raise ValueError("Operador no soportado")
+
+class _Analizador:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+        self.pasos = 0
+        self.operadores = 0  # binarios y raíces aplicados: una expresión sin ellos no es una cuenta
+
+    def _mira(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def _paso(self, profundidad):
+        self.pasos += 1
+        if self.pasos > MAX_PASOS:
+            raise ErrorAritmetico("Error: expresión demasiado compleja.")
+        if profundidad > MAX_PROFUNDIDAD:
+            raise ErrorAritmetico("Error: expresión demasiado anidada.")
+
+    def _binaria(self, siguiente, ops, profundidad):
+        valor = siguiente(profundidad)
+        while self._mira() in ops:
+            guardado, aplicados = self.pos, self.operadores
+            op = self._mira()[1]
+            self.pos += 1
+            try:
+                derecha = siguiente(profundidad)
+            except _Incompleta:
+                # Operador colgando ("40 mas o menos"): la expresión acaba antes
+                self.pos, self.operadores = guardado, aplicados
+                break
+            valor = operar(valor, op, derecha)
+            self.operadores += 1
+        return valor
+
+    def expr(self, profundidad=0):
+        self._paso(profundidad)
+        return self._binaria(self.term, {("op", "+"), ("op", "-")}, profundidad)
+
+    def term(self, profundidad):
+        self._paso(profundidad)
+        return self._binaria(self.unario, {("op", "*"), ("op", "/")}, profundidad)
+
+    def unario(self, profundidad):
+        self._paso(profundidad)
+        tipo, valor = self._mira()
+        if tipo == "op" and valor in "+-":
+            self.pos += 1
+            v = self.unario(profundidad + 1)
+            return -v if valor == "-" else v
+        return self.potencia(profundidad)
+
+    def potencia(self, profundidad):
+        self._paso(profundidad)
+        base = self.postfijo(profundidad)
+        if self._mira() == ("op", "^"):
+            guardado, aplicados = self.pos, self.operadores
+            self.pos += 1
+            try:
+                exponente = self.unario(profundidad + 1)
+            except _Incompleta:
+                self.pos, self.operadores = guardado, aplicados
+                return base
+            self.operadores += 1
+            return operar(base, "^", exponente)
+        return base
+
+    def postfijo(self, profundidad):
+        valor = self.primario(profundidad)
+        while self._mira()[0] == "post":
+            sufijo = self._mira()[1]
+            self.pos += 1
+            # No cuenta como operador: "al 100%" o "3 metros al cuadrado" no son cuentas
+            valor = _comprueba(valor / 100) if sufijo == "%" else operar(valor, "^", sufijo)
+        return valor
+
+    def primario(self, profundidad):
+        self._paso(profundidad)
+        tipo, valor = self._mira()
+        if tipo == "num":
+            self.pos += 1
+            return _comprueba(valor)
+        if tipo == "(":
+            self.pos += 1
+            v = self.expr(profundidad + 1)
+            if self._mira()[0] != ")":
+                raise _Incompleta()
+            self.pos += 1
+            return v
+        if tipo == "func":
+            self.pos += 1
+            v = self.unario(profundidad + 1)
+            if v < 0:
+                raise ErrorAritmetico("Error: operación no válida.")
+            self.operadores += 1
+            return math.sqrt(v)
+        raise _Incompleta()
+
+_INICIOS = {"num", "(", "func"}
+
+def evalua(texto: str):
+    """
+    Devuelve el valor de la primera subexpresión con algún operador binario o
+    raíz, o None si el texto no contiene ninguna. Lanza ErrorAritmetico o ZeroDivisionError.
+    """
+    if len(texto) > MAX_ENTRADA:
+        return None
+    tokens = tokeniza(texto)
+    if len(tokens) > MAX_ELEMENTOS:
+        raise ErrorAritmetico("Error: expresión demasiado larga.")
+    analizador = _Analizador(tokens)
+    for inicio, (tipo, valor) in enumerate(tokens):
+        if tipo not in _INICIOS and not (tipo == "op" and valor in "+-"):
+            continue
+        analizador.pos, analizador.operadores = inicio, 0
+        try:
+            resultado = analizador.expr()
+        except _Incompleta:
+            continue
+        if analizador.operadores:
+            return resultado
+    return None
+
+def formatea(x: float) -> str:
+    if x.is_integer() and abs(x) < 1e15:
+        return str(int(x))
+    return f"{x:.10g}"
+
+def intenta_aritmetica(texto: str):
+    """Respuesta del servidor si el texto contiene una cuenta; None en otro caso."""
+    try:
+        r = evalua(texto)
+    except ZeroDivisionError:
+        return "Error: división entre cero."
+    except ErrorAritmetico as e:
+        return str(e)
+    if r is None:
+        return None
+    return f"Resultado: {formatea(r)}"
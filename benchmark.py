@@ -0,0 +1,290 @@
+"""
+Banco de pruebas de rendimiento del chatbot.
+
+Dos subcomandos:
+
+  carga  -> abre muchas conexiones TCP concurrentes contra Servidor.py, repite
+            una mezcla configurable de preguntas y mide peticiones por segundo
+            y latencias p50/p95/p99 (en total y por tipo de pregunta).
+
+              python benchmark.py carga --conexiones 200 --duracion 10
+              python benchmark.py carga --mezcla kb=5,difusa=2,aritmetica=2,eliza=1
+
+  micro  -> microbenchmarks en proceso de normaliza, intenta_aritmetica,
+            eliza_reply, la búsqueda difusa (difflib frente al índice) y
+            responder(). El resultado se guarda en JSON con el commit actual
+            para poder comparar ejecuciones:
+
+              python benchmark.py micro --salida bench/antes.json
+              python benchmark.py micro --salida bench/despues.json --compara bench/antes.json
+
+El servidor se arranca aparte (python Servidor.py ...).
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import conocimiento
+import protocolo
+
+KB_POR_DEFECTO = Path(__file__).resolve().with_name("conocimiento.jsonl")
+
+PREGUNTAS_ARITMETICA = [
+    "cuanto es 2 mas 3?", "(12 + 8) * 3", "veinte por ciento de 150",
+    "dos mil trescientos menos cuarenta y cinco", "2 elevado a 10", "100 / 7",
+    "tres al cuadrado mas cuatro al cuadrado", "1,5 * (4 - 2,25)",
+]
+PREGUNTAS_ELIZA = [
+    "estoy cansado de estudiar", "me gusta programar en python",
+    "siento que nadie me escucha", "quiero aprender a tocar la guitarra",
+    "no me gusta mi trabajo", "siempre llego tarde a clase",
+    "pienso que el examen fue difícil", "hoy hace mucho calor en la ciudad",
+]
+
+def _mutacion(texto: str, rnd: random.Random) -> str:
+    """Errata sencilla (cambia una letra) para forzar la búsqueda difusa."""
+    letras = [i for i, c in enumerate(texto) if c.isalpha()]
+    if not letras:
+        return texto
+    i = rnd.choice(letras)
+    return texto[:i] + rnd.choice("aeiourstln") + texto[i + 1:]
+
+def preguntas_por_tipo(ruta_kb=KB_POR_DEFECTO, semilla: int = 1) -> dict[str, list[str]]:
+    rnd = random.Random(semilla)
+    kb = [p for p, _ in conocimiento.lee_pares(ruta_kb)]
+    return {
+        "kb": kb,
+        "difusa": [_mutacion(p, rnd) for p in kb for _ in range(3)],
+        "aritmetica": PREGUNTAS_ARITMETICA,
+        "eliza": PREGUNTAS_ELIZA,
+    }
+
+def lee_mezcla(texto: str) -> dict[str, float]:
+    """'kb=5,difusa=2' -> {'kb': 5.0, 'difusa': 2.0}"""
+    mezcla = {}
+    for parte in texto.split(","):
+        nombre, _, peso = parte.partition("=")
+        mezcla[nombre.strip()] = float(peso or 1)
+    return mezcla
+
+def percentiles(muestras: list[float]) -> dict:
+    if not muestras:
+        return {"n": 0}
+    orden = sorted(muestras)
+    def p(q):
+        return orden[min(len(orden) - 1, int(q * len(orden)))]
+    return {
+        "n": len(orden),
+        "media_ms": round(statistics.fmean(orden) * 1e3, 3),
+        "p50_ms": round(p(0.50) * 1e3, 3),
+        "p95_ms": round(p(0.95) * 1e3, 3),
+        "p99_ms": round(p(0.99) * 1e3, 3),
+        "max_ms": round(orden[-1] * 1e3, 3),
+    }
+
+# ---------------- Prueba de carga ----------------
+async def _conexion(host, port, fin, elige, latencias, errores):
+    try:
+        reader, writer = await asyncio.open_connection(host, port, limit=protocolo.MAX_LINEA + 1)
+    except OSError as e:
+        errores.append(f"conexión: {e}")
+        return
+    try:
+        saludo = await reader.readline()
+        if not saludo:
+            errores.append("cerrada antes del saludo")
+            return
+        while time.perf_counter() < fin:
+            tipo, pregunta = elige()
+            t0 = time.perf_counter()
+            writer.write(protocolo.codifica(pregunta))
+            await writer.drain()
+            linea = await reader.readline()
+            if not linea:
+                errores.append("cerrada por el servidor")
+                return
+            latencias.setdefault(tipo, []).append(time.perf_counter() - t0)
+    except (OSError, ValueError) as e:
+        errores.append(f"{type(e).__name__}: {e}")
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+async def prueba_carga(host, port, conexiones, duracion, mezcla, ruta_kb=KB_POR_DEFECTO, semilla=1):
+    preguntas = preguntas_por_tipo(ruta_kb, semilla)
+    desconocidos = set(mezcla) - set(preguntas)
+    if desconocidos:
+        raise ValueError(f"Tipos de pregunta desconocidos: {', '.join(sorted(desconocidos))}")
+    tipos = [t for t in mezcla if mezcla[t] > 0]
+    pesos = [mezcla[t] for t in tipos]
+    rnd = random.Random(semilla)
+
+    def elige():
+        tipo = rnd.choices(tipos, pesos)[0]
+        return tipo, rnd.choice(preguntas[tipo])
+
+    latencias: dict[str, list[float]] = {}
+    errores: list[str] = []
+    inicio = time.perf_counter()
+    fin = inicio + duracion
+    await asyncio.gather(*(_conexion(host, port, fin, elige, latencias, errores)
+                           for _ in range(conexiones)))
+    transcurrido = time.perf_counter() - inicio
+    todas = [x for lst in latencias.values() for x in lst]
+    return {
+        "conexiones": conexiones,
+        "duracion_s": round(transcurrido, 3),
+        "peticiones": len(todas),
+        "rps": round(len(todas) / transcurrido, 1) if transcurrido else 0.0,
+        "errores": len(errores),
+        "primeros_errores": errores[:5],
+        "latencia": percentiles(todas),
+        "por_tipo": {t: percentiles(v) for t, v in sorted(latencias.items())},
+    }
+
+# ---------------- Microbenchmarks ----------------
+def _mide(funcion, entradas, repeticiones=5, minimo_s=0.2) -> dict:
+    """ns por llamada: mediana y mínimo de varias rondas sobre todas las entradas."""
+    vueltas = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(vueltas):
+            for x in entradas:
+                funcion(x)
+        if time.perf_counter() - t0 >= minimo_s / repeticiones or vueltas >= 1 << 20:
+            break
+        vueltas *= 2
+    rondas = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        for _ in range(vueltas):
+            for x in entradas:
+                funcion(x)
+        rondas.append((time.perf_counter() - t0) / (vueltas * len(entradas)))
+    return {
+        "ns_por_llamada": round(statistics.median(rondas) * 1e9, 1),
+        "ns_min": round(min(rondas) * 1e9, 1),
+        "llamadas_por_ronda": vueltas * len(entradas),
+    }
+
+def microbenchmarks(repeticiones=5) -> dict:
+    import difflib
+
+    import eliza_engine
+    import Servidor
+
+    preguntas = preguntas_por_tipo(Servidor.KB_RUTA)
+    mezcla = [p for lst in preguntas.values() for p in lst]
+    kb = Servidor.kb_actual()
+    difusas = [Servidor.normaliza(p) for p in preguntas["difusa"][:30]]
+    cutoff = kb.indice_difuso.cutoff
+
+    import normalizacion
+
+    # Textos distintos en cada llamada, para medir la normalización y no la memoria
+    corpus = [f"{p} {i}" for i in range(50) for p in mezcla]
+    casos = {
+        "normaliza": (Servidor.normaliza, mezcla),
+        "normaliza_referencia": (normalizacion.normaliza_referencia, corpus),
+        "normaliza_sin_memoria": (normalizacion._rapida, corpus),
+        "intenta_aritmetica": (Servidor.intenta_aritmetica, preguntas["aritmetica"]),
+        "intenta_aritmetica_sin_cuenta": (Servidor.intenta_aritmetica, preguntas["kb"]),
+        "eliza_reply": (eliza_engine.eliza_reply, preguntas["eliza"]),
+        "difusa_difflib": (lambda k: difflib.get_close_matches(k, kb.claves, 1, cutoff), difusas),
+        "difusa_indice": (lambda k: kb.indice_difuso.cercanas(k, 1), difusas),
+    }
+    if kb.indice_semantico is not None:  # sin NumPy la etapa no existe
+        casos["semantica"] = (lambda k: kb.indice_semantico.consulta(k, 1), difusas)
+    resultados = {nombre: _mide(f, entradas, repeticiones) for nombre, (f, entradas) in casos.items()}
+    # normaliza_lote() recibe el corpus entero; se expresa en ns por texto para compararlo
+    lote = _mide(normalizacion.normaliza_lote, [corpus], repeticiones)
+    for campo in ("ns_por_llamada", "ns_min"):
+        lote[campo] = round(lote[campo] / len(corpus), 1)
+    lote["llamadas_por_ronda"] *= len(corpus)
+    resultados["normaliza_lote"] = lote
+
+    # responder() de extremo a extremo, sin caché y con la caché caliente
+    Servidor.configura_cache(0)
+    resultados["responder_sin_cache"] = _mide(Servidor.responder, mezcla, repeticiones)
+    Servidor.configura_cache()
+    for p in mezcla:
+        Servidor.responder(p)
+    resultados["responder_cache_caliente"] = _mide(Servidor.responder, mezcla, repeticiones)
+    return resultados
+
+def _commit_actual() -> str | None:
+    try:
+        salida = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=Path(__file__).resolve().parent, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return salida.stdout.strip() or None
+
+def compara(actual: dict, anterior: dict):
+    print(f"{'caso':32} {'antes ns':>12} {'ahora ns':>12} {'cambio':>8}")
+    for nombre, r in actual["resultados"].items():
+        previo = anterior.get("resultados", {}).get(nombre)
+        if not previo:
+            print(f"{nombre:32} {'-':>12} {r['ns_por_llamada']:>12} {'nuevo':>8}")
+            continue
+        a, b = previo["ns_por_llamada"], r["ns_por_llamada"]
+        print(f"{nombre:32} {a:>12} {b:>12} {b / a:>7.2f}x")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pruebas de rendimiento del chatbot.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_carga = sub.add_parser("carga", help="prueba de carga contra un servidor en marcha")
+    p_carga.add_argument("--host", default="127.0.0.1")
+    p_carga.add_argument("--puerto", type=int, default=65432)
+    p_carga.add_argument("--conexiones", type=int, default=50)
+    p_carga.add_argument("--duracion", type=float, default=10.0, help="segundos")
+    p_carga.add_argument("--mezcla", default="kb=4,difusa=2,aritmetica=2,eliza=2",
+                         help="pesos por tipo: kb, difusa, aritmetica, eliza")
+    p_carga.add_argument("--kb", default=str(KB_POR_DEFECTO),
+                         help="base de la que salen las preguntas kb/difusa")
+    p_carga.add_argument("--semilla", type=int, default=1)
+    p_carga.add_argument("--salida", help="guarda el resultado en este JSON")
+
+    p_micro = sub.add_parser("micro", help="microbenchmarks en proceso")
+    p_micro.add_argument("--repeticiones", type=int, default=5)
+    p_micro.add_argument("--salida", help="guarda el resultado en este JSON")
+    p_micro.add_argument("--compara", help="JSON de una ejecución anterior")
+
+    args = parser.parse_args(argv)
+    meta = {
+        "commit": _commit_actual(),
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+    }
+
+    if args.comando == "carga":
+        resultado = asyncio.run(prueba_carga(args.host, args.puerto, args.conexiones,
+                                             args.duracion, lee_mezcla(args.mezcla),
+                                             args.kb, args.semilla))
+        informe = {**meta, "tipo": "carga", "mezcla": args.mezcla, **resultado}
+    else:
+        informe = {**meta, "tipo": "micro", "resultados": microbenchmarks(args.repeticiones)}
+
+    print(json.dumps(informe, ensure_ascii=False, indent=2))
+    if args.salida:
+        Path(args.salida).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.salida).write_text(json.dumps(informe, ensure_ascii=False, indent=2) + "\n",
+                                     encoding="utf-8")
+    if args.comando == "micro" and args.compara:
+        compara(informe, json.loads(Path(args.compara).read_text(encoding="utf-8")))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
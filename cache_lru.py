@@ -0,0 +1,71 @@
+"""
+Caché LRU acotada, con caducidad opcional y segura entre hilos.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+FALTA = object()  # centinela: la clave no está (None es un valor cacheable)
+
+class CacheLRU:
+    def __init__(self, max_entradas: int = 4096, ttl: float | None = None):
+        """
+        max_entradas: tope de entradas (0 desactiva la caché).
+        ttl: segundos de vida de cada entrada; None = sin caducidad.
+        """
+        if max_entradas < 0:
+            raise ValueError(f"max_entradas debe ser >= 0: {max_entradas!r}")
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._datos: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+        self.caducados = 0
+
+    def __len__(self):
+        return len(self._datos)
+
+    def get(self, clave, defecto=FALTA):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return defecto
+            valor, expira = entrada
+            if expira is not None and expira <= time.monotonic():
+                del self._datos[clave]
+                self.caducados += 1
+                self.fallos += 1
+                return defecto
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def put(self, clave, valor):
+        if self.max_entradas == 0:
+            return
+        expira = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._datos[clave] = (valor, expira)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+                self.desalojos += 1
+
+    def limpia(self):
+        with self._lock:
+            self._datos.clear()
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "entradas": len(self._datos),
+                "max_entradas": self.max_entradas,
+                "ttl": self.ttl,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "desalojos": self.desalojos,
+                "caducados": self.caducados,
+            }
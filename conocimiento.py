@@ -0,0 +1,405 @@
+"""
+Base de conocimiento externa: carga en streaming desde JSONL o SQLite y
+versiones inmutables que el servidor puede sustituir en caliente.
+
+Formatos admitidos:
+  * .jsonl / .ndjson: una entrada por línea, {"pregunta": "...", "respuesta": "..."}
+  * .db / .sqlite / .sqlite3: tabla qa(pregunta TEXT, respuesta TEXT)
+
+Los archivos se leen registro a registro; nunca se carga el texto completo en
+memoria, solo el diccionario ya normalizado.
+
+Snapshot precompilado (.kbsnap): las claves ya normalizadas y ordenadas, con
+sus respuestas, en un archivo binario versionado que se abre con mmap. Cargar
+la base desde él no normaliza nada ni construye diccionarios: las búsquedas
+son una bisección sobre el archivo mapeado, así que el arranque (y el de cada
+proceso que se relanza) no crece con el tamaño de la base. La cabecera guarda
+tamaño y mtime del archivo de origen y una huella de normaliza(); si alguno
+cambia, el snapshot se reconstruye solo:
+
+    python conocimiento.py conocimiento.jsonl    # -> conocimiento.jsonl.kbsnap
+
+Tras los textos van, en secciones, los arrays de los índices derivados (la
+búsqueda difusa y, con NumPy, la semántica), construidos sobre las claves en
+el orden del snapshot. Se abren sobre el mismo mmap sin copiarlos, así que
+ni el arranque, ni una recarga, ni cada proceso hijo los reconstruye.
+"""
+import argparse
+import bisect
+import functools
+import itertools
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+import zlib
+from array import array
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+
+import semantica
+from indice_difuso import IndiceDifuso
+
+CUTOFF_DIFUSO = 0.82
+_EXT_JSONL = {".jsonl", ".ndjson"}
+_EXT_SQLITE = {".db", ".sqlite", ".sqlite3"}
+_LOTE_SQLITE = 1000
+_LOTE_NORMALIZA = 1000
+
+_MAGIA_SNAPSHOT = b"KBSN"
+_FORMATO_SNAPSHOT = 2
+# Cabecera: magia, formato, secciones de índices, huella de normaliza(), tamaño y mtime del origen, entradas
+_CABECERA = struct.Struct("<4sHHIQqI4x")  # 32 bytes: los offsets quedan alineados
+# Cada sección: etiqueta y número de arrays; cada array: código de tipo y bytes, alineado a 8
+_SECCION = struct.Struct("<4sI")
+_ARRAY = struct.Struct("<c7xQ")
+_TAMANOS = {b"B": 1, b"i": 4, b"q": 8, b"f": 4}  # códigos de array admitidos
+# Índices que pueden guardarse en el snapshot, por nombre del atributo indice_<nombre>
+INDICES = {"difuso": b"DIFU", "semantico": b"SEMA"}
+# Texto de prueba para la huella de normaliza(): si cambia su salida, cambia la huella
+_SONDA = " ¿Qué TAL? ¡Año, niño!; (cañón) [über] {Ça} \"x\" 'y' a-b_c.  Ñandú:1,5 "
+
+_versiones = itertools.count(1)
+
+class BaseConocimiento:
+    """
+    Una versión de la base: pares normalizados más sus índices.
+    No se modifica después de construirse; una recarga crea otra instancia, así
+    que quien ya tiene la referencia sigue viendo la versión con la que empezó.
+    """
+    def __init__(self, qa: Mapping[str, str], origen: str = ""):
+        self.version = next(_versiones)
+        self.origen = origen
+        self.qa = qa
+
+    # Los índices derivados se leen del snapshot si los trae y, si no, se construyen
+    # la primera vez que alguien los usa o al llamar a prepara_indices().
+    @functools.cached_property
+    def claves(self) -> Sequence[str]:
+        if isinstance(self.qa, QAMapeado):
+            return self.qa.claves()
+        return list(self.qa.keys())
+
+    def _partes(self, nombre: str):
+        return self.qa.seccion(INDICES[nombre]) if isinstance(self.qa, QAMapeado) else None
+
+    @functools.cached_property
+    def indice_difuso(self) -> IndiceDifuso:
+        partes = self._partes("difuso")
+        if partes is not None:
+            return IndiceDifuso.desde_partes(self.claves, partes, cutoff=CUTOFF_DIFUSO)
+        return IndiceDifuso(self.claves, cutoff=CUTOFF_DIFUSO)
+
+    @functools.cached_property
+    def indice_semantico(self) -> "semantica.IndiceSemantico | None":
+        """Índice TF-IDF de las claves; None si no está NumPy."""
+        if not semantica.disponible():
+            return None
+        partes = self._partes("semantico")
+        if partes is not None:
+            return semantica.IndiceSemantico.desde_partes(self.claves, partes)
+        return semantica.IndiceSemantico(self.claves)
+
+    def prepara_indices(self, nombres=tuple(INDICES)) -> "BaseConocimiento":
+        """Deja listos ahora los índices pedidos (p. ej. antes de atender o de hacer fork)."""
+        for nombre in nombres:
+            getattr(self, f"indice_{nombre}")
+        return self
+
+    @functools.cached_property
+    def claves_ordenadas(self) -> list[str]:
+        return sorted(self.qa)
+
+    def con_prefijo(self, prefijo: str, n: int = 10) -> list[str]:
+        """Hasta n claves que empiezan por `prefijo` (ya normalizado), en orden alfabético."""
+        if isinstance(self.qa, QAMapeado):  # el snapshot ya está ordenado: no hace falta copiarlo
+            return self.qa.con_prefijo(prefijo, n)
+        claves = self.claves_ordenadas
+        i = bisect.bisect_left(claves, prefijo)
+        return list(itertools.takewhile(lambda c: c.startswith(prefijo), claves[i:i + n]))
+
+    def __len__(self):
+        return len(self.qa)
+
+    def __repr__(self):
+        return f"<BaseConocimiento v{self.version} {len(self)} entradas de {self.origen or '?'}>"
+
+def lee_jsonl(ruta):
+    """Genera (pregunta, respuesta) leyendo el archivo línea a línea."""
+    with open(ruta, encoding="utf-8") as f:
+        for n, linea in enumerate(f, 1):
+            linea = linea.strip()
+            if not linea or linea.startswith("#"):
+                continue
+            try:
+                reg = json.loads(linea)
+                yield reg["pregunta"], reg["respuesta"]
+            except (ValueError, KeyError, TypeError) as e:
+                raise ValueError(f"{ruta}:{n}: entrada inválida ({e})") from None
+
+def lee_sqlite(ruta, tabla: str = "qa"):
+    """Genera (pregunta, respuesta) recorriendo la tabla por lotes."""
+    con = sqlite3.connect(f"file:{ruta}?mode=ro", uri=True)
+    try:
+        cur = con.execute(f'SELECT pregunta, respuesta FROM "{tabla}"')
+        while True:
+            filas = cur.fetchmany(_LOTE_SQLITE)
+            if not filas:
+                break
+            yield from filas
+    finally:
+        con.close()
+
+def lee_pares(ruta):
+    ext = Path(ruta).suffix.lower()
+    if ext in _EXT_JSONL:
+        return lee_jsonl(ruta)
+    if ext in _EXT_SQLITE:
+        return lee_sqlite(ruta)
+    raise ValueError(f"Formato de base de conocimiento no soportado: {ruta}")
+
+def _normaliza_pares(ruta, normaliza, normaliza_lote=None) -> dict[str, str]:
+    """Pares del archivo con la pregunta normalizada, en lotes si hay normaliza_lote."""
+    qa = {}
+    if normaliza_lote is None:
+        for pregunta, respuesta in lee_pares(ruta):
+            qa[normaliza(pregunta)] = respuesta
+        return qa
+    pares = lee_pares(ruta)
+    while lote := list(itertools.islice(pares, _LOTE_NORMALIZA)):
+        preguntas, respuestas = zip(*lote)
+        qa.update(zip(normaliza_lote(preguntas), respuestas))
+    return qa
+
+def carga(ruta, normaliza, snapshot=None, normaliza_lote=None, indices=()) -> BaseConocimiento:
+    """
+    Construye una versión nueva de la base. Con `snapshot`, la lee de ese archivo
+    si corresponde al origen actual y trae los `indices` pedidos (nombres de
+    INDICES); si no, la construye desde el origen y reescribe el snapshot (si no
+    se puede escribir, se sigue sin él). Los índices pedidos se devuelven ya
+    listos. `normaliza_lote`, si se da, normaliza listas de preguntas de una vez.
+    """
+    if not semantica.disponible():
+        indices = [n for n in indices if n != "semantico"]
+    if snapshot:
+        huella = huella_origen(ruta, normaliza)
+        try:
+            qa = QAMapeado.abre(snapshot, huella)
+            if all(qa.seccion(INDICES[n]) is not None for n in indices):
+                return BaseConocimiento(qa, origen=str(ruta)).prepara_indices(indices)
+        except (OSError, ValueError):
+            pass
+        kb = _construye(ruta, normaliza, normaliza_lote).prepara_indices(indices)
+        try:
+            guarda_snapshot(kb.qa, snapshot, huella, {n: getattr(kb, f"indice_{n}") for n in indices})
+        except OSError:
+            pass
+        return kb
+    return BaseConocimiento(_normaliza_pares(ruta, normaliza, normaliza_lote),
+                            origen=str(ruta)).prepara_indices(indices)
+
+def _construye(ruta, normaliza, normaliza_lote=None) -> BaseConocimiento:
+    """Base desde el origen con las claves en el orden del snapshot, para que sus índices valgan en él."""
+    qa = _normaliza_pares(ruta, normaliza, normaliza_lote)
+    return BaseConocimiento(dict(sorted(qa.items())), origen=str(ruta))
+
+# ---------------- Snapshot binario ----------------
+def huella_origen(ruta, normaliza) -> tuple[int, int, int]:
+    """(huella de normaliza, tamaño, mtime en ns) del archivo de origen."""
+    st = os.stat(ruta)
+    return zlib.crc32(normaliza(_SONDA).encode("utf-8")), st.st_size, st.st_mtime_ns
+
+def _relleno(pos: int) -> bytes:
+    return bytes(-pos % 8)
+
+def guarda_snapshot(qa: Mapping[str, str], ruta, huella, indices=None):
+    """
+    Escribe cabecera, offsets (uint32) de claves y respuestas y los textos en UTF-8,
+    con las claves ordenadas, y después una sección por cada índice de `indices`
+    ({nombre: índice}), que debe estar construido sobre las claves en ese orden.
+    Se escribe aparte y se renombra: quien tenga mapeada la versión anterior la
+    sigue leyendo intacta.
+    """
+    claves = sorted(qa)
+    indices = {n: i for n, i in (indices or {}).items() if i is not None}
+    for nombre, indice in indices.items():
+        if len(indice) != len(claves):
+            raise ValueError(f"El índice {nombre!r} no corresponde a estas claves")
+    offsets, trozos, pos = array("I", [0]), [], 0
+    for texto in itertools.chain(claves, (qa[c] for c in claves)):
+        b = texto.encode("utf-8")
+        trozos.append(b)
+        pos += len(b)
+        offsets.append(pos)
+    if pos >= 1 << 32:
+        raise OSError("Base de conocimiento demasiado grande para el snapshot")
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    tmp = f"{ruta}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(_CABECERA.pack(_MAGIA_SNAPSHOT, _FORMATO_SNAPSHOT, len(indices), *huella, len(claves)))
+            offsets.tofile(f)
+            f.writelines(trozos)
+            for nombre, indice in indices.items():
+                partes = indice.partes()
+                f.write(_relleno(f.tell()) + _SECCION.pack(INDICES[nombre], len(partes)))
+                for codigo, datos in partes:
+                    datos = memoryview(datos).cast("B")
+                    f.write(_relleno(f.tell()) + _ARRAY.pack(codigo.encode(), len(datos)))
+                    f.write(datos)
+        os.replace(tmp, ruta)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+class QAMapeado(Mapping):
+    """
+    Diccionario de solo lectura sobre un snapshot mapeado en memoria. Las claves
+    están ordenadas por punto de código, que es el mismo orden que sus bytes
+    UTF-8, así que se busca por bisección comparando bytes sin decodificar.
+    """
+    def __init__(self, mm: mmap.mmap, n: int):
+        self._mm = mm
+        self._n = n
+        self._offsets = memoryview(mm)[_CABECERA.size:_CABECERA.size + 4 * (2 * n + 1)].cast("I")
+        self._datos = _CABECERA.size + 4 * (2 * n + 1)
+        self._secciones: dict[bytes, list[memoryview]] = {}
+
+    @classmethod
+    def abre(cls, ruta, huella=None) -> "QAMapeado":
+        """Mapea el snapshot; ValueError si no es válido o no corresponde a `huella`."""
+        with open(ruta, "rb") as f:
+            if os.fstat(f.fileno()).st_size < _CABECERA.size:
+                raise ValueError(f"{ruta}: snapshot vacío o truncado")
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magia, formato, secciones, *guardada, n = _CABECERA.unpack_from(mm)
+        if magia != _MAGIA_SNAPSHOT or formato != _FORMATO_SNAPSHOT or sys.byteorder != "little":
+            mm.close()
+            raise ValueError(f"{ruta}: no es un snapshot de la base (formato {_FORMATO_SNAPSHOT})")
+        if huella is not None and tuple(guardada) != tuple(huella):
+            mm.close()
+            raise ValueError(f"{ruta}: el snapshot no corresponde al archivo de origen")
+        qa = cls(mm, n)
+        if qa._lee_secciones(qa._datos + qa._offsets[2 * n], secciones) != len(mm):
+            raise ValueError(f"{ruta}: snapshot truncado")
+        return qa
+
+    def _lee_secciones(self, pos: int, cuantas: int) -> int:
+        """Vistas (sin copia) de los arrays de cada sección; devuelve dónde acaban."""
+        vista, fin = memoryview(self._mm), len(self._mm)
+        for _ in range(cuantas):
+            pos += -pos % 8
+            if pos + _SECCION.size > fin:
+                return -1
+            etiqueta, narrays = _SECCION.unpack_from(self._mm, pos)
+            pos += _SECCION.size
+            partes = []
+            for _ in range(narrays):
+                pos += -pos % 8
+                if pos + _ARRAY.size > fin:
+                    return -1
+                codigo, largo = _ARRAY.unpack_from(self._mm, pos)
+                pos += _ARRAY.size
+                if codigo not in _TAMANOS or largo % _TAMANOS[codigo] or pos + largo > fin:
+                    return -1
+                partes.append(vista[pos:pos + largo].cast(codigo.decode()))
+                pos += largo
+            self._secciones[etiqueta] = partes
+        return pos
+
+    def seccion(self, etiqueta: bytes) -> list[memoryview] | None:
+        """Arrays guardados de un índice (ver INDICES), o None si el snapshot no lo trae."""
+        return self._secciones.get(etiqueta)
+
+    def claves(self) -> "ClavesMapeadas":
+        return ClavesMapeadas(self)
+
+    def _bytes(self, i: int) -> bytes:
+        return self._mm[self._datos + self._offsets[i]:self._datos + self._offsets[i + 1]]
+
+    def _primera(self, b: bytes) -> int:
+        """Posición de la primera clave >= b (bisección sobre los bytes)."""
+        lo, hi = 0, self._n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(mid) < b:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _busca(self, clave: str) -> int:
+        b = clave.encode("utf-8", "surrogatepass")
+        i = self._primera(b)
+        return i if i < self._n and self._bytes(i) == b else -1
+
+    def con_prefijo(self, prefijo: str, n: int = 10) -> list[str]:
+        """Hasta n claves que empiezan por `prefijo`; solo se decodifican esas."""
+        b = prefijo.encode("utf-8", "surrogatepass")
+        inicio, res = self._primera(b), []
+        for i in range(inicio, min(self._n, inicio + n)):
+            clave = self._bytes(i)
+            if not clave.startswith(b):
+                break
+            res.append(clave.decode("utf-8"))
+        return res
+
+    def __getitem__(self, clave):
+        i = self._busca(clave) if isinstance(clave, str) else -1
+        if i < 0:
+            raise KeyError(clave)
+        return self._bytes(self._n + i).decode("utf-8")
+
+    def get(self, clave, defecto=None):
+        i = self._busca(clave) if isinstance(clave, str) else -1
+        return defecto if i < 0 else self._bytes(self._n + i).decode("utf-8")
+
+    def __contains__(self, clave):
+        return isinstance(clave, str) and self._busca(clave) >= 0
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        for i in range(self._n):
+            yield self._bytes(i).decode("utf-8")
+
+class ClavesMapeadas(Sequence):
+    """Las claves de un QAMapeado por posición; solo se decodifican las que se piden."""
+    def __init__(self, qa: QAMapeado):
+        self._qa = qa
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._qa._bytes(i).decode("utf-8")
+
+    def __len__(self):
+        return len(self._qa)
+
+    def __iter__(self):
+        return iter(self._qa)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compila la base de conocimiento a un snapshot binario.")
+    parser.add_argument("origen", help="archivo .jsonl o .sqlite de la base")
+    parser.add_argument("-o", "--salida", help="snapshot a escribir (por defecto <origen>.kbsnap)")
+    args = parser.parse_args(argv)
+    from normalizacion import normaliza, normaliza_lote  # la misma con la que consulta Servidor
+    salida = args.salida or f"{args.origen}.kbsnap"
+    indices = [n for n in INDICES if n != "semantico" or semantica.disponible()]
+    kb = _construye(args.origen, normaliza, normaliza_lote).prepara_indices(indices)
+    guarda_snapshot(kb.qa, salida, huella_origen(args.origen, normaliza),
+                    {n: getattr(kb, f"indice_{n}") for n in indices})
+    print(f"{len(kb)} entradas e índices {', '.join(indices)} -> {salida}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,26 @@
 import os
 import sys
+import signal
+import json
+import atexit
+import itertools
 import socket
+import time
+import uuid
 import threading
 import subprocess
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from pathlib import Path
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, g, jsonify, request, send_from_directory
+
+import metricas
+import normalizacion
+import protocolo
+import tres_en_raya
+import k_en_raya
+from history_store import HistoryStore
 
 # --- Paths ---
 BASE_DIR = Path(__file__).resolve().parent
@@ -12,6 +28,9 @@ SERVER_SCRIPT = BASE_DIR / "Servidor.py"
 CLIENT_SCRIPT = BASE_DIR / "Cliente.py"
 
 HOST, PORT = "127.0.0.1", 65432
+STATS_COMMAND = "/estadisticas"
+READY_MARKER = "LISTO"  # marker in the line Servidor prints once it accepts connections
+server_module = None  # Servidor.py loaded in this process (used by the "inproc" backend)
 try:
     # Dynamic import without executing main()
     import importlib.util
@@ -20,6 +39,9 @@ try:
     spec.loader.exec_module(mod)  # type: ignore
     HOST = getattr(mod, "HOST", HOST)
     PORT = getattr(mod, "PORT", PORT)
+    STATS_COMMAND = getattr(mod, "COMANDO_ESTADISTICAS", STATS_COMMAND)
+    READY_MARKER = getattr(mod, "MARCA_LISTO", READY_MARKER)
+    server_module = mod
 except Exception:
     pass
 
@@ -29,87 +51,638 @@ app = Flask(__name__, static_url_path="/static", static_folder=str(BASE_DIR / "s
 server_proc: subprocess.Popen | None = None
 
 class TCPClientSession:
-    """Lightweight client that talks to the TCP server directly (robust for web)."""
-    def __init__(self, host: str, port: int):
+    """Lightweight client that talks to the TCP server directly (robust for web).
+
+    Messages are newline-framed (see protocolo.py) and read through a buffered
+    reader, so coalesced or split TCP segments never mix up replies.
+    """
+    def __init__(self, host: str, port: int, pipeline_window: int = 64):
         self.host = host
         self.port = port
+        self.pipeline_window = pipeline_window
         self.sock: socket.socket | None = None
+        self.rfile = None
         self.lock = threading.Lock()
 
     def connect(self):
-        if self.sock:
-            return "Ya conectado."
+        with self.lock:
+            if self.sock:
+                return "Ya conectado."
+            return self._connect_locked()
+
+    def _connect_locked(self) -> str:
+        """Open the socket and read the greeting (caller holds the lock).
+
+        ``self.sock`` is published last, so a send() never finds a socket
+        without its reader or takes the greeting for its own reply.
+        """
         s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.connect((self.host, self.port))
+        try:
+            s.connect((self.host, self.port))
+            rfile = s.makefile("rb")
+            greeting = protocolo.lee_mensaje(rfile)
+            if greeting is None:
+                raise ConnectionError("El servidor cerró la conexión.")
+        except BaseException:
+            s.close()
+            raise
+        self.rfile = rfile
         self.sock = s
-        greeting = s.recv(4096).decode("utf-8", errors="ignore").strip()
-        return greeting
+        return greeting.strip()
+
+    def _read_reply(self) -> str:
+        reply = protocolo.lee_mensaje(self.rfile)
+        if reply is None:
+            raise ConnectionError("El servidor cerró la conexión.")
+        return reply.strip()
 
     def send(self, text: str) -> str:
-        if not self.sock:
-            raise RuntimeError("Cliente no conectado.")
         with self.lock:
-            self.sock.sendall((text + "\n").encode("utf-8"))
-            data = self.sock.recv(4096)
-            return data.decode("utf-8", errors="ignore").strip()
+            if not self.sock:
+                raise RuntimeError("Cliente no conectado.")
+            self.sock.sendall(protocolo.codifica(text))
+            return self._read_reply()
+
+    def send_many(self, texts: list[str], replies: list[str] | None = None) -> list[str]:
+        """Pipeline several questions over the connection; replies come back in order.
+
+        At most ``pipeline_window`` questions are in flight at once, so a huge
+        batch cannot deadlock with both socket buffers full. Replies are
+        appended to ``replies`` as they arrive, so after an error the caller
+        knows how many questions were answered.
+        """
+        if replies is None:
+            replies = []
+        with self.lock:
+            if not self.sock:
+                raise RuntimeError("Cliente no conectado.")
+            sent = min(len(texts), self.pipeline_window)
+            self.sock.sendall(b"".join(protocolo.codifica(t) for t in texts[:sent]))
+            for _ in texts:
+                replies.append(self._read_reply())
+                if sent < len(texts):
+                    self.sock.sendall(protocolo.codifica(texts[sent]))
+                    sent += 1
+        return replies
+
+    def reconnect(self) -> str:
+        """Drop a broken socket (without the goodbye exchange) and connect again."""
+        with self.lock:
+            for f in (self.rfile, self.sock):
+                try:
+                    if f:
+                        f.close()
+                except OSError:
+                    pass
+            self.sock = None
+            self.rfile = None
+            return self._connect_locked()
 
     def disconnect(self):
-        if self.sock:
+        # Under the lock: a send() in flight finishes first, and none sees half a teardown
+        with self.lock:
+            if not self.sock:
+                return
             try:
-                self.sock.sendall(("salir\n").encode("utf-8"))
+                self.sock.sendall(protocolo.codifica("salir"))
                 try:
-                    self.sock.recv(4096)
+                    protocolo.lee_mensaje(self.rfile)
                 except Exception:
                     pass
             except Exception:
                 pass
             try:
+                self.rfile.close()
                 self.sock.close()
             finally:
                 self.sock = None
+                self.rfile = None
+
+class PoolExhausted(RuntimeError):
+    """Every pooled connection is busy and none can be evicted."""
 
-client_session = TCPClientSession(HOST, PORT)
-history:list[dict] = []
+class SessionPool:
+    """TCP connections to the server, one per browser session.
+
+    Each browser gets its own TCPClientSession, so requests from different
+    users run in parallel instead of queueing on a single socket lock.
+    Sessions are checked out while a request uses them and checked back in
+    afterwards; idle ones are closed after ``idle_timeout`` seconds and, when
+    the pool is full, the least recently used idle session makes room.
+    """
+    def __init__(self, host: str, port: int, max_size: int = 256, idle_timeout: float = 300.0):
+        self.host = host
+        self.port = port
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._entries: dict[str, dict] = {}  # sid -> {"session", "last_used", "in_use"}
+        self._lock = threading.Lock()
+        self._last_reap = 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def is_connected(self, sid: str | None) -> bool:
+        entry = self._entries.get(sid) if sid else None
+        return bool(entry) and entry["session"].sock is not None
+
+    def _reap(self, now: float) -> list[TCPClientSession]:
+        """Drop idle entries (caller holds the lock); returns sessions to close."""
+        if now - self._last_reap < 1.0:
+            return []
+        self._last_reap = now
+        stale = [sid for sid, e in self._entries.items()
+                 if not e["in_use"] and now - e["last_used"] > self.idle_timeout]
+        return [self._entries.pop(sid)["session"] for sid in stale]
+
+    def _make_room(self) -> TCPClientSession:
+        idle = [(e["last_used"], sid) for sid, e in self._entries.items() if not e["in_use"]]
+        if not idle:
+            raise PoolExhausted("Demasiados clientes conectados. Intenta más tarde.")
+        _, sid = min(idle)
+        return self._entries.pop(sid)["session"]
+
+    def checkout(self, sid: str, create: bool = False) -> TCPClientSession | None:
+        """Mark the session as in use. With ``create`` a missing one is added (not yet connected)."""
+        now = time.monotonic()
+        to_close = []
+        with self._lock:
+            to_close += self._reap(now)
+            entry = self._entries.get(sid)
+            if entry is None:
+                if not create:
+                    session = None
+                else:
+                    while len(self._entries) >= self.max_size:
+                        to_close.append(self._make_room())
+                    entry = self._entries[sid] = {
+                        "session": TCPClientSession(self.host, self.port),
+                        "last_used": now, "in_use": 0,
+                    }
+            if entry is not None:
+                entry["in_use"] += 1
+                entry["last_used"] = now
+                session = entry["session"]
+        for old in to_close:
+            old.disconnect()
+        return session
+
+    def checkin(self, sid: str, session: TCPClientSession):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is not None and entry["session"] is session:
+                entry["in_use"] -= 1
+                entry["last_used"] = time.monotonic()
+
+    @contextmanager
+    def session(self, sid: str, create: bool = False):
+        session = self.checkout(sid, create)
+        try:
+            yield session
+        finally:
+            if session is not None:
+                self.checkin(sid, session)
+
+    def connect(self, sid: str) -> str:
+        with self.session(sid, create=True) as session:
+            return session.connect()
+
+    def send(self, sid: str, text: str) -> str:
+        """Send through the session's connection, reconnecting once if it broke."""
+        with self.session(sid) as session:
+            if session is None or session.sock is None:
+                raise RuntimeError("Cliente no conectado.")
+            try:
+                return session.send(text)
+            except (OSError, ConnectionError):
+                session.reconnect()
+                return session.send(text)
+
+    def send_many(self, sid: str, texts: list[str]) -> tuple[list[str], str | None]:
+        """Pipeline ``texts`` over the session's connection.
+
+        Returns the replies received (in order) and, if the connection could
+        not be recovered, the error that stopped the batch early.
+        """
+        replies: list[str] = []
+        with self.session(sid) as session:
+            if session is None or session.sock is None:
+                raise RuntimeError("Cliente no conectado.")
+            try:
+                session.send_many(texts, replies)
+            except (OSError, ConnectionError):
+                try:
+                    session.reconnect()
+                    session.send_many(texts[len(replies):], replies)
+                except (OSError, ConnectionError) as e:
+                    return replies, str(e) or type(e).__name__
+        return replies, None
+
+    def remove(self, sid: str):
+        with self._lock:
+            entry = self._entries.pop(sid, None)
+        if entry:
+            entry["session"].disconnect()
+
+    def close_all(self):
+        with self._lock:
+            entries, self._entries = list(self._entries.values()), {}
+        for entry in entries:
+            entry["session"].disconnect()
+
+class InProcessBackend:
+    """Answers with the imported Servidor module instead of going through TCP.
+
+    Same interface as SessionPool. Calls run on a bounded thread pool: at
+    most ``workers`` run at once and ``max_pending`` may wait, beyond that
+    requests are refused (PoolExhausted) instead of piling up in Flask.
+    Batches run in jobs of ``chunk`` messages, each with its own timeout.
+    """
+    def __init__(self, module, workers: int = 8, max_pending: int = 64,
+                 timeout: float = 10.0, idle_timeout: float = 300.0,
+                 max_sessions: int = 256, chunk: int = 64):
+        if module is None:
+            raise RuntimeError("No se pudo importar Servidor.py para el backend en proceso.")
+        self.module = module
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.chunk = chunk
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="responder")
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._sessions: dict[str, float] = {}  # sid -> last use; only for /status
+        self._lock = threading.Lock()
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PoolExhausted(getattr(self.module, "OCUPADO", "Servidor ocupado."))
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise TimeoutError("El servidor tardó demasiado en responder.") from None
+
+    def _touch(self, sid: str):
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[sid] = now
+            if len(self._sessions) > 4 * self.max_sessions:
+                for old in [k for k, t in self._sessions.items() if now - t > self.idle_timeout]:
+                    del self._sessions[old]
+
+    def is_connected(self, sid: str | None) -> bool:
+        return bool(sid) and sid in self._sessions
+
+    def connect(self, sid: str) -> str:
+        if self.is_connected(sid):
+            return "Ya conectado."
+        self._touch(sid)
+        return self.module.SALUDO
+
+    def send(self, sid: str, text: str) -> str:
+        if not self.is_connected(sid):
+            raise RuntimeError("Cliente no conectado.")
+        self._touch(sid)
+        reply, close = self._run(self.module.atiende_mensaje, text)
+        if close:
+            self.remove(sid)
+        return reply
+
+    def send_many(self, sid: str, texts: list[str]) -> tuple[list[str], str | None]:
+        """Answer ``texts`` chunk by chunk.
+
+        A chunk that times out or finds the pool full stops the batch there:
+        the replies so far are returned with that error, like SessionPool
+        does when the connection cannot be recovered, and no further chunks
+        are started.
+        """
+        if not self.is_connected(sid):
+            raise RuntimeError("Cliente no conectado.")
+        self._touch(sid)
+        answer = self.module.atiende_mensaje
+        replies: list[str] = []
+        for i in range(0, len(texts), self.chunk):
+            part = texts[i:i + self.chunk]
+            try:
+                replies += self._run(lambda part=part: [answer(t)[0] for t in part])
+            except (PoolExhausted, TimeoutError) as e:
+                if not replies:
+                    raise
+                return replies, str(e)
+        return replies, None
+
+    def stats(self) -> dict:
+        return self.module.estadisticas()
+
+    def remove(self, sid: str):
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def close_all(self):
+        with self._lock:
+            self._sessions.clear()
+
+POOL_SIZE = int(os.environ.get("CHATBOT_POOL_SIZE", "256"))
+POOL_IDLE_SECONDS = float(os.environ.get("CHATBOT_POOL_IDLE", "300"))
+SESSION_COOKIE = "chat_sid"
+
+# "tcp": proxy to the Servidor.py process; "inproc": call responder() in this process
+BACKEND = os.environ.get("CHATBOT_BACKEND", "tcp")
+INPROC_WORKERS = int(os.environ.get("CHATBOT_INPROC_WORKERS", "8"))
+INPROC_TIMEOUT = float(os.environ.get("CHATBOT_INPROC_TIMEOUT", "10"))
+
+if BACKEND == "inproc":
+    client_pool = InProcessBackend(server_module, INPROC_WORKERS, INPROC_WORKERS * 8,
+                                   INPROC_TIMEOUT, POOL_IDLE_SECONDS, POOL_SIZE)
+elif BACKEND == "tcp":
+    client_pool = SessionPool(HOST, PORT, POOL_SIZE, POOL_IDLE_SECONDS)
+else:
+    raise SystemExit(f"CHATBOT_BACKEND desconocido: {BACKEND!r} (usa 'tcp' o 'inproc')")
+
+# Conversation history: last HISTORY_MAX entries in memory, all of them in the log file,
+# rotated into segments of HISTORY_SEGMENT_MB (HISTORY_SEGMENTS closed ones kept; 0 = all)
+HISTORY_FILE = os.environ.get("CHATBOT_HISTORY_FILE", str(BASE_DIR / "historial.jsonl"))
+HISTORY_MAX = int(os.environ.get("CHATBOT_HISTORY_MAX", "1000"))
+HISTORY_SEGMENT_MB = float(os.environ.get("CHATBOT_HISTORY_SEGMENT_MB", "16"))
+HISTORY_SEGMENTS = int(os.environ.get("CHATBOT_HISTORY_SEGMENTS", "0"))
+HISTORY_PAGE_MAX = 500
+MAX_BATCH = int(os.environ.get("CHATBOT_MAX_BATCH", "1000"))
+LOG_HEARTBEAT_SECONDS = 15.0
+history = HistoryStore(HISTORY_FILE or None, max_items=HISTORY_MAX,
+                       segment_bytes=int(HISTORY_SEGMENT_MB * 1024 * 1024),
+                       max_segments=HISTORY_SEGMENTS)
+atexit.register(history.close)
+
+# Typeahead: /suggest reads the KB in this process (the snapshot is mmapped, so it
+# shares pages with the server) and reloads it when the source file changes
+SUGGEST_DEFAULT, SUGGEST_MAX = 8, 20
+SUGGEST_CHECK_SECONDS = 2.0
+_suggest_source = {"checked": 0.0, "stamp": None}
 
 # --- Helpers ---
 def process_alive(p: subprocess.Popen | None) -> bool:
     return bool(p) and (p.poll() is None)
 
-def start_server_process():
+SERVER_PROCESSES = int(os.environ.get("CHATBOT_SERVER_PROCESSES", "1"))
+SERVER_MODE = os.environ.get("CHATBOT_SERVER_MODE", "hilos")
+SERVER_READY_TIMEOUT = float(os.environ.get("CHATBOT_SERVER_READY_TIMEOUT", "30"))
+SERVER_DRAIN_SECONDS = float(os.environ.get("CHATBOT_SERVER_DRAIN", "10"))
+SERVER_LOG_LINES = int(os.environ.get("CHATBOT_SERVER_LOG_LINES", "2000"))
+
+class EventRing:
+    """Last ``max_items`` items (server log lines, broadcast events), numbered so readers can resume.
+
+    Ids grow by one per item, so ``since(cursor)`` is a slice of the deque and
+    ``wait()`` lets a streaming reader block until something newer arrives.
+    Readers only keep a cursor: memory does not grow with the number of readers,
+    and one that falls more than ``max_items`` behind finds a gap after its cursor.
+    """
+    def __init__(self, max_items: int):
+        self._items: deque[dict] = deque(maxlen=max_items)
+        self._last_id = 0
+        self._cond = threading.Condition()
+
+    @property
+    def last_id(self) -> int:
+        return self._last_id
+
+    @property
+    def first_id(self) -> int:
+        """Oldest id still kept (``last_id + 1`` when empty)."""
+        with self._cond:
+            return self._items[0]["id"] if self._items else self._last_id + 1
+
+    def append(self, **fields) -> dict:
+        with self._cond:
+            self._last_id += 1
+            item = {"id": self._last_id, "t": time.time(), **fields}
+            self._items.append(item)
+            self._cond.notify_all()
+        return item
+
+    def since(self, cursor: int, limit: int | None = None) -> list[dict]:
+        with self._cond:
+            if not self._items:
+                return []
+            start = max(0, cursor - self._items[0]["id"] + 1)
+            stop = None if limit is None else start + limit
+            return list(itertools.islice(self._items, start, stop))
+
+    def wait(self, cursor: int, timeout: float) -> bool:
+        """Block until there is an item newer than ``cursor``; False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._last_id > cursor, timeout)
+
+server_logs = EventRing(SERVER_LOG_LINES)
+server_lock = threading.Lock()  # one start/restart/stop at a time
+
+# On POSIX the controller owns the listening socket and every server process
+# inherits it (--fd). A restarted server accepts on the same socket before the
+# old one stops, so the port is never closed and no connection is refused.
+server_listener: socket.socket | None = None
+
+def listening_socket() -> socket.socket | None:
+    global server_listener
+    if os.name != "posix":
+        return None
+    if server_listener is None:
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind((HOST, PORT))
+        s.listen(128)
+        server_listener = s
+    return server_listener
+
+def close_listener():
+    global server_listener
+    if server_listener is not None:
+        server_listener.close()
+        server_listener = None
+
+def _capture_output(proc: subprocess.Popen):
+    """Copy server output into the log ring and flag readiness when the marker shows up."""
+    try:
+        for line in proc.stdout:  # type: ignore[attr-defined]
+            line = line.rstrip("\n")
+            server_logs.append(pid=proc.pid, line=line)
+            if READY_MARKER in line:  # tolerate a worker's output landing on the same line
+                proc.ready.set()  # type: ignore[attr-defined]
+                publish_status()
+    except Exception:
+        pass
+    server_logs.append(pid=proc.pid, line=f"[proceso {proc.pid} terminado]")
+    if proc is server_proc:  # crashed rather than replaced: stop queueing connections for nobody
+        close_listener()
+        proc.wait()
+        publish_status()
+
+def spawn_server_process() -> subprocess.Popen:
+    """Launch Servidor.py on the shared listening socket (if any); does not wait for it."""
+    cmd = [sys.executable, "-u", str(SERVER_SCRIPT), "--modo", SERVER_MODE,
+           "--tiempo-drenaje", str(SERVER_DRAIN_SECONDS)]
+    if SERVER_PROCESSES > 1:
+        cmd += ["--procesos", str(SERVER_PROCESSES)]
+    listener = listening_socket()
+    if listener is not None:
+        cmd += ["--fd", str(listener.fileno())]
+    # Start unbuffered so logs flush. On POSIX the server gets its own process
+    # group, so stopping it also stops every pre-forked worker.
+    proc = subprocess.Popen(cmd,
+                            cwd=str(BASE_DIR),
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT,
+                            text=True,
+                            pass_fds=(listener.fileno(),) if listener is not None else (),
+                            start_new_session=(os.name == "posix"))
+    proc.ready = threading.Event()  # type: ignore[attr-defined]
+    threading.Thread(target=_capture_output, args=(proc,), daemon=True).start()
+    return proc
+
+def wait_ready(proc: subprocess.Popen, timeout: float = SERVER_READY_TIMEOUT) -> bool:
+    """True once ``proc`` printed the readiness marker; False if it exited or timed out."""
+    deadline = time.monotonic() + timeout
+    while not proc.ready.wait(0.05):  # type: ignore[attr-defined]
+        if not process_alive(proc) or time.monotonic() > deadline:
+            return False
+    return True
+
+def server_ready() -> bool:
+    return process_alive(server_proc) and server_proc.ready.is_set()  # type: ignore[union-attr]
+
+def start_server_process() -> bool:
+    """Start the server (if needed) and wait until it accepts connections."""
+    global server_proc
+    with server_lock:
+        if not process_alive(server_proc):
+            server_proc = spawn_server_process()
+        proc = server_proc
+    publish_status()
+    return wait_ready(proc)
+
+def restart_server_process() -> bool:
+    """Rolling restart: a new server takes over the listening socket, then the old one drains.
+
+    If the new process does not become ready the old one keeps serving.
+    Without an inherited socket (not POSIX) it falls back to stop + start.
+    """
     global server_proc
-    if process_alive(server_proc):
-        return True
-    # Start unbuffered so logs flush
-    server_proc = subprocess.Popen([sys.executable, "-u", str(SERVER_SCRIPT)],
-                                  cwd=str(BASE_DIR),
-                                  stdout=subprocess.PIPE,
-                                  stderr=subprocess.STDOUT,
-                                  text=True)
-    # Optional: read server log in background to avoid pipe filling
-    def _drain(proc: subprocess.Popen):
+    with server_lock:
+        old = server_proc
+        rolling = process_alive(old) and listening_socket() is not None
+        if rolling:
+            new = spawn_server_process()
+            if not wait_ready(new):
+                _stop(new, drain=False)
+                return False
+            server_proc = new
+    publish_status()
+    if not rolling:
+        stop_server_process()
+        return start_server_process()
+    # Idle pooled connections to the old server are closed by its drain; the pool
+    # reconnects on the next request and lands on the new one
+    threading.Thread(target=_stop, args=(old,), daemon=True).start()
+    return True
+
+def _signal_server_group(proc: subprocess.Popen, sig):
+    if os.name == "posix":
         try:
-            for _ in proc.stdout:  # type: ignore[attr-defined]
-                pass
-        except Exception:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
             pass
-    threading.Thread(target=_drain, args=(server_proc,), daemon=True).start()
-    return True
+    elif sig == getattr(signal, "SIGKILL", None):
+        proc.kill()
+    else:
+        proc.terminate()
 
-def stop_server_process():
-    global server_proc
-    if not process_alive(server_proc):
-        server_proc = None
-        return
+def _stop(proc: subprocess.Popen, drain: bool = True):
+    """SIGTERM (the server drains its connections), then SIGKILL if it takes too long."""
     try:
-        server_proc.terminate()  # send SIGTERM / terminate on Windows
-        server_proc.wait(timeout=2)
+        _signal_server_group(proc, signal.SIGTERM)  # supervisor and workers
+        proc.wait(timeout=(SERVER_DRAIN_SECONDS if drain else 0) + 5)
     except Exception:
         try:
-            server_proc.kill()
+            _signal_server_group(proc, getattr(signal, "SIGKILL", signal.SIGTERM))
+            proc.wait(timeout=2)
         except Exception:
             pass
-    finally:
-        server_proc = None
+
+def stop_server_process():
+    global server_proc
+    with server_lock:
+        proc, server_proc = server_proc, None
+        close_listener()  # new connections are refused right away instead of queueing
+    publish_status()
+    if process_alive(proc):
+        _stop(proc)
+
+def fetch_server_stats(timeout: float = 2.0) -> dict:
+    """Ask the TCP server for its metrics over a short-lived connection."""
+    with socket.create_connection((HOST, PORT), timeout=timeout) as s:
+        rfile = s.makefile("rb")
+        try:
+            protocolo.lee_mensaje(rfile)  # greeting
+            s.sendall(protocolo.codifica(STATS_COMMAND) + protocolo.codifica("salir"))
+            reply = protocolo.lee_mensaje(rfile)
+        finally:
+            rfile.close()
+    if reply is None:
+        raise ConnectionError("El servidor cerró la conexión.")
+    return json.loads(reply)
+
+# Perfect-play tic-tac-toe tables (built in ~0.1 s, or read from a snapshot file)
+tres_en_raya.carga(os.environ.get("CHATBOT_TTT_SNAPSHOT"))
+# Larger boards use the k_en_raya search engine with a per-move time budget (ms)
+GAME_MAX_MS = int(os.environ.get("CHATBOT_GAME_MAX_MS", "2000"))
+GAME_DEFAULT_MS = min(GAME_MAX_MS, 500)
+
+# --- Push channel (/events) ---
+# One broadcaster for every browser: events go into a bounded EventRing and each
+# Server-Sent Events stream follows it with its own cursor. A subscriber that
+# falls behind the ring (a slow or stalled reader) is dropped rather than
+# buffered; its EventSource reconnects and starts again from a status snapshot.
+EVENTS_BUFFER = int(os.environ.get("CHATBOT_EVENTS_BUFFER", "1000"))
+EVENTS_MAX_SUBSCRIBERS = int(os.environ.get("CHATBOT_EVENTS_MAX_SUBSCRIBERS", "256"))
+EVENTS_HEARTBEAT_SECONDS = 15.0
+EVENTS_RETRY_MS = 2000  # EventSource reconnection delay
+events = EventRing(EVENTS_BUFFER)
+_events_lock = threading.Lock()
+_events_stats = {"subscribers": 0, "dropped": 0}
+_last_status: dict | None = None
+
+def server_status() -> dict:
+    alive = process_alive(server_proc)
+    return {"server_on": alive, "server_ready": server_ready(), "server_pid": server_proc.pid if alive else None}
+
+def publish_status():
+    """Broadcast the server status if it changed since the last status event."""
+    global _last_status
+    with _events_lock:
+        current = server_status()
+        if current == _last_status:
+            return
+        _last_status = current
+        events.append(event="status", data=current)
+
+def publish_history(items: list[dict], sid: str):
+    """Broadcast new history entries; each subscriber is told whether they are its own."""
+    if items:
+        events.append(event="history", data={"items": items}, origin=sid)
+
+def _sse(item: dict, sid: str | None) -> str:
+    data = item["data"]
+    if "origin" in item:  # the session id itself never leaves the controller
+        data = {**data, "own": item["origin"] == sid}
+    return f"id: {item['id']}\nevent: {item['event']}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _release_subscriber():
+    with _events_lock:
+        _events_stats["subscribers"] -= 1
 
 # --- Routes ---
 @app.get("/")
@@ -126,36 +699,167 @@ def serve_game_html():
 @app.get("/game")
 def serve_game_short():
     return send_from_directory(BASE_DIR, "game.html")
+
+@app.post("/game/move")
+def game_move():
+    """
+    Body {"board": [rows*cols x "X"/"O"/""], "rows": 3, "cols": 3, "k": 3, "time_ms": 500}:
+    best move for whoever is to play. 3x3 with k=3 is answered from the perfect-play
+    tables; any other size is searched within time_ms (capped by CHATBOT_GAME_MAX_MS).
+    """
+    data = request.get_json(force=True, silent=True) or {}
+    try:
+        rows, cols, k = (int(data.get(n, 3)) for n in ("rows", "cols", "k"))
+        if (rows, cols, k) == (3, 3, 3):
+            r = tres_en_raya.mejor_jugada(data.get("board"))
+        else:
+            ms = min(max(int(data.get("time_ms", GAME_DEFAULT_MS)), 10), GAME_MAX_MS)
+            r = k_en_raya.mejor_jugada(data.get("board"), rows, cols, k, ms / 1000)
+    except (TypeError, ValueError) as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    body = {"ok": True, "move": r["jugada"], "score": r["valor"], "turn": r["turno"],
+            "finished": r["terminado"], "winner": r["ganador"]}
+    if "profundidad" in r:
+        body.update(depth=r["profundidad"], nodes=r["nodos"], ms=r["ms"])
+    return jsonify(body)
+
 @app.get("/status")
 def status():
     return jsonify({
-        "server_on": process_alive(server_proc),
-        "client_on": client_session.sock is not None,
+        **server_status(),
+        "subscribers": _events_stats["subscribers"],
+        "client_on": client_pool.is_connected(request.cookies.get(SESSION_COOKIE)),
+        "backend": BACKEND,
         "host": HOST, "port": PORT
     })
 
+@app.get("/metrics")
+def get_metrics():
+    """Server metrics in Prometheus text format (chatbot_up 0 if it is unreachable)."""
+    try:
+        stats = client_pool.stats() if BACKEND == "inproc" else fetch_server_stats()
+        body = "# TYPE chatbot_up gauge\nchatbot_up 1\n" + metricas.a_prometheus(stats)
+    except Exception:
+        body = "# TYPE chatbot_up gauge\nchatbot_up 0\n"
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+@app.get("/events")
+def events_stream():
+    """Server-Sent Events: "status" (server on/ready) and "history" (new questions and replies)."""
+    with _events_lock:
+        if _events_stats["subscribers"] >= EVENTS_MAX_SUBSCRIBERS:
+            return jsonify({"ok": False, "error": "Demasiados suscriptores."}), 503
+        _events_stats["subscribers"] += 1
+    sid = session_id()  # issues the cookie if this stream is the first request to need one
+    try:
+        cursor = int(request.headers.get("Last-Event-ID") or -1)
+    except ValueError:
+        cursor = -1
+
+    def generate(cursor):
+        yield f"retry: {EVENTS_RETRY_MS}\n\n"
+        if not events.first_id - 1 <= cursor <= events.last_id:
+            # New subscriber, or it missed events: start from the current state
+            cursor = events.last_id
+            snapshot = {"id": cursor, "event": "status", "data": server_status()}
+            yield _sse(snapshot, sid)
+        while True:
+            items = events.since(cursor)
+            if items and items[0]["id"] != cursor + 1:
+                with _events_lock:
+                    _events_stats["dropped"] += 1
+                return  # fell behind the buffer: dropped (the browser reconnects)
+            for item in items:
+                yield _sse(item, sid)
+                cursor = item["id"]
+            if not events.wait(cursor, EVENTS_HEARTBEAT_SECONDS):
+                yield ": ping\n\n"  # comment line; a closed client is noticed on the write
+
+    response = Response(generate(cursor), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.call_on_close(_release_subscriber)
+    return response
+
 @app.post("/server/start")
 def server_start():
-    start_server_process()
-    return jsonify({"ok": True, "server_on": True})
+    """Returns once the server accepts connections (503 if it did not come up)."""
+    try:
+        ready = start_server_process()
+    except OSError as e:  # e.g. the port is taken
+        return jsonify({"ok": False, "server_on": False, "error": str(e)}), 500
+    if not ready:
+        return jsonify({"ok": False, "server_on": process_alive(server_proc), "ready": False,
+                        "error": "El servidor no está listo; ver /server/logs."}), 503
+    return jsonify({"ok": True, "server_on": True, "ready": True})
+
+@app.post("/server/restart")
+def server_restart():
+    """Rolling restart without refusing connections; the old server finishes its requests."""
+    try:
+        ready = restart_server_process()
+    except OSError as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+    if not ready:
+        return jsonify({"ok": False, "error": "El servidor nuevo no arrancó; sigue el anterior."}), 503
+    return jsonify({"ok": True, "server_on": True, "ready": True, "pid": server_proc.pid})
 
 @app.post("/server/stop")
 def server_stop():
     stop_server_process()
     return jsonify({"ok": True, "server_on": False})
 
+@app.get("/server/logs")
+def server_logs_route():
+    """Cursor pagination like /history; ?stream=1 keeps sending new lines as NDJSON."""
+    try:
+        cursor = int(request.args.get("cursor") or 0)
+        limit = int(request.args.get("limit") or 200)
+    except ValueError:
+        return jsonify({"ok": False, "error": "cursor y limit deben ser enteros."}), 400
+    if cursor < 0 or limit <= 0:
+        return jsonify({"ok": False, "error": "cursor y limit deben ser positivos."}), 400
+
+    if request.args.get("stream"):
+        def generate(cursor=cursor):
+            while True:
+                for item in server_logs.since(cursor):
+                    cursor = item["id"]
+                    yield json.dumps(item, ensure_ascii=False) + "\n"
+                if not server_logs.wait(cursor, LOG_HEARTBEAT_SECONDS):
+                    yield "\n"  # heartbeat: a closed client is noticed on the next write
+        return Response(generate(), mimetype="application/x-ndjson")
+
+    items = server_logs.since(cursor, min(limit, HISTORY_PAGE_MAX))
+    return jsonify({"items": items, "next_cursor": items[-1]["id"] if items else cursor})
+
+def session_id() -> str:
+    """Browser session id from the cookie; a new one is issued if missing."""
+    sid = request.cookies.get(SESSION_COOKIE)
+    if not sid:
+        sid = g.new_sid = uuid.uuid4().hex
+    return sid
+
+@app.after_request
+def set_session_cookie(response):
+    sid = g.pop("new_sid", None)
+    if sid:
+        response.set_cookie(SESSION_COOKIE, sid, httponly=True, samesite="Lax")
+    return response
+
 @app.post("/client/connect")
 def client_connect():
     try:
-        greet = client_session.connect()
+        greet = client_pool.connect(session_id())
         return jsonify({"ok": True, "client_on": True, "greeting": greet})
+    except PoolExhausted as e:
+        return jsonify({"ok": False, "error": str(e)}), 503
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
 @app.post("/client/disconnect")
 def client_disconnect():
     try:
-        client_session.disconnect()
+        client_pool.remove(session_id())
         return jsonify({"ok": True, "client_on": False, "message": "Cliente desconectado."})
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
@@ -167,22 +871,124 @@ def client_send():
     if not msg:
         return jsonify({"ok": False, "error": "Mensaje vacío."}), 400
     try:
-        reply = client_session.send(msg)
-        history.append({"q": msg, "a": reply})
+        sid = session_id()
+        reply = client_pool.send(sid, msg)
+        publish_history([history.append(msg, reply)], sid)
         return jsonify({"ok": True, "reply": reply})
+    except PoolExhausted as e:
+        return jsonify({"ok": False, "error": str(e)}), 503
+    except TimeoutError as e:
+        return jsonify({"ok": False, "error": str(e)}), 504
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
+@app.post("/client/send_batch")
+def client_send_batch():
+    """Body {"messages": [...]}: every valid message is pipelined over one connection."""
+    data = request.get_json(force=True, silent=True) or {}
+    messages = data.get("messages")
+    if not isinstance(messages, list):
+        return jsonify({"ok": False, "error": "Se esperaba una lista 'messages'."}), 400
+    if len(messages) > MAX_BATCH:
+        return jsonify({"ok": False, "error": f"Lote demasiado grande (máximo {MAX_BATCH})."}), 413
+
+    results: list[dict] = [{} for _ in messages]
+    pending: list[tuple[int, str]] = []
+    for i, raw in enumerate(messages):
+        msg = raw.strip() if isinstance(raw, str) else ""
+        if not isinstance(raw, str):
+            results[i] = {"ok": False, "error": "El mensaje debe ser texto."}
+        elif not msg:
+            results[i] = {"ok": False, "error": "Mensaje vacío."}
+        elif normalizacion.normaliza(msg) == "salir":  # the server's own test; works without Servidor.py
+            results[i] = {"ok": False, "error": "'salir' no está permitido en un lote."}
+        elif len(protocolo.codifica(msg)) - 1 > protocolo.MAX_LINEA:  # escaped size on the wire
+            results[i] = {"ok": False, "error": "Mensaje demasiado largo."}
+        else:
+            pending.append((i, msg))
+
+    sid = session_id()
+    try:
+        replies, error = client_pool.send_many(sid, [m for _, m in pending])
+    except PoolExhausted as e:
+        return jsonify({"ok": False, "error": str(e)}), 503
+    except TimeoutError as e:
+        return jsonify({"ok": False, "error": str(e)}), 504
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+    added = []
+    for (i, msg), reply in zip(pending, replies):
+        results[i] = {"ok": True, "reply": reply}
+        added.append(history.append(msg, reply))
+    publish_history(added, sid)
+    for i, _ in pending[len(replies):]:
+        results[i] = {"ok": False, "error": error}
+    return jsonify({"ok": True, "results": results})
+
+def suggestion_kb():
+    """Current KB of the imported Servidor module, reloaded if its file changed."""
+    now = time.monotonic()
+    if now - _suggest_source["checked"] >= SUGGEST_CHECK_SECONDS:
+        _suggest_source["checked"] = now
+        try:
+            st = os.stat(server_module.KB_RUTA)
+            stamp = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            stamp = None
+        previous, _suggest_source["stamp"] = _suggest_source["stamp"], stamp
+        if previous is not None and stamp is not None and stamp != previous:
+            try:
+                server_module.recarga_base()
+            except Exception:
+                pass  # keep suggesting from the previous version
+    return server_module.kb_actual()
+
+@app.get("/suggest")
+def suggest():
+    """?q=<text>&n=N: up to N KB questions starting with the normalized text, alphabetically."""
+    if server_module is None:
+        return jsonify({"ok": False, "error": "No se pudo importar Servidor.py."}), 503
+    q = request.args.get("q", "")
+    try:
+        n = min(max(int(request.args.get("n") or SUGGEST_DEFAULT), 1), SUGGEST_MAX)
+    except ValueError:
+        return jsonify({"ok": False, "error": "n debe ser un entero."}), 400
+    prefix = server_module.normaliza(q[:protocolo.MAX_LINEA])
+    if prefix and q[-1:].isspace():
+        prefix += " "  # "capital " should not suggest "capitales"
+    suggestions = suggestion_kb().con_prefijo(prefix, n) if prefix else []
+    response = jsonify({"ok": True, "prefix": prefix, "suggestions": suggestions})
+    response.headers["Cache-Control"] = "private, max-age=5"
+    return response
+
 @app.get("/history")
 def get_history():
-    return jsonify({"items": history})
+    """Cursor pagination: ?cursor=<last id seen>&limit=N; ?stream=1 sends NDJSON."""
+    try:
+        cursor = int(request.args.get("cursor") or 0)
+        limit = int(request.args.get("limit") or 100)
+    except ValueError:
+        return jsonify({"ok": False, "error": "cursor y limit deben ser enteros."}), 400
+    if cursor < 0 or limit <= 0:
+        return jsonify({"ok": False, "error": "cursor y limit deben ser positivos."}), 400
+
+    if request.args.get("stream"):
+        stop = limit if "limit" in request.args else None  # no limit: everything after cursor
+        def generate():
+            for item in itertools.islice(history.iter_from(cursor), stop):
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        return Response(generate(), mimetype="application/x-ndjson")
+
+    items, next_cursor = history.page(cursor, min(limit, HISTORY_PAGE_MAX))
+    return jsonify({"items": items, "next_cursor": next_cursor})
 
 @app.post("/exit")
 def exit_all():
     try:
-        client_session.disconnect()
+        client_pool.close_all()
     except Exception:
         pass
+    history.flush()
     try:
         stop_server_process()
     except Exception:
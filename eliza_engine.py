@@ -1,81 +1,151 @@
+"""
+Respuestas estilo terapeuta (patrones ELIZA).
+
+Las reglas y la tabla de reflexión se leen de un archivo JSON (por defecto
+eliza_rules.json, o el indicado en CHATBOT_ELIZA) y se compilan una sola vez:
+
+  * La reflexión (yo -> tú, me -> te, ...) es una única expresión regular con
+    todas las palabras en alternancia; una sola pasada sobre el texto.
+  * Cada regla declara las palabras con las que puede empezar la frase
+    ("keywords"). Solo se prueban las reglas de la primera palabra, más las
+    genéricas (keywords vacío), en el orden del archivo.
+  * "reply" es una plantilla: {r1} es el grupo 1 reflejado, {l1} el grupo 1
+    en minúsculas y {g1} el grupo 1 tal cual.
+"""
+import json
+import os
 import re
+from pathlib import Path
+
+RULES_PATH = os.environ.get("CHATBOT_ELIZA", str(Path(__file__).resolve().with_name("eliza_rules.json")))
 
-_REFLECT = {
-    r"\byo\b": "tú",
-    r"\bme\b": "te",
-    r"\bmi\b": "tu",
-    r"\bmío\b": "tuyo",
-    r"\bmia\b": "tuya",
-    r"\bmios\b": "tuyos",
-    r"\bmias\b": "tuyas",
-    r"\bconmigo\b": "contigo",
-    r"\bsobre mí\b": "sobre ti",
-    r"\bsoy\b": "eres",
-    r"\bestoy\b": "estás",
-    r"\bera\b": "eras",
-    r"\bfui\b": "fuiste",
-    r"\bpuedo\b": "puedes",
-    r"\bquiero\b": "quieres",
-    r"\bnecesito\b": "necesitas",
-    r"\bpienso\b": "piensas",
-    r"\bsiento\b": "sientes",
-    r"\bmis\b": "tus",
-}
+_TRAILING_PUNCT = re.compile(r"[\s\.,;:!¿?]+$")
+_MULTISPACE = re.compile(r"\s{2,}")
+_FIRST_WORD = re.compile(r"\s*(\w+)")
+_PLACEHOLDER = re.compile(r"\{([rlg])(\d+)\}")
 
 def _strip_trailing_punct(s: str) -> str:
-    return re.sub(r"[\s\.,;:!¿?]+$", "", s or "")
+    return _TRAILING_PUNCT.sub("", s or "")
 
-def _reflect(text: str) -> str:
-    res = " " + _strip_trailing_punct(text.strip()) + " "
-    for pat, repl in _REFLECT.items():
-        res = re.sub(pat, repl, res, flags=re.IGNORECASE)
-    return res.strip()
-
-_RULES = [
-    (re.compile(r"^\s*estoy\s+.*\bporque\s+(.*)$", re.I),
-     lambda m: f"¿Por qué crees que {_reflect(m.group(1))}?"),
-    (re.compile(r"^\s*estoy\s+(.*)$", re.I),
-     lambda m: f"¿Por qué estás {_reflect(m.group(1))}?"),
-    (re.compile(r"^\s*(no\s+)?me\s+([a-záéíóúñ]+.*)$", re.I),
-     lambda m: f"¿Qué te hace pensar que {('no te ' if m.group(1) else 'te ')}{_reflect(m.group(2))}?"),
-    (re.compile(r"^\s*siento\s+(.*)$", re.I),
-     lambda m: f"¿Desde cuándo sientes que {_reflect(m.group(1))}?"),
-    (re.compile(r"^\s*quiero\s+(.*)$", re.I),
-     lambda m: f"¿Por qué quieres {_reflect(m.group(1))}?"),
-    (re.compile(r"^\s*porque\s+(.*)$", re.I),
-     lambda m: "¿Esa es la razón principal? ¿Hay otras razones?"),
-    (re.compile(r"^\s*pienso\s+que\s+(.*)$", re.I),
-     lambda m: f"¿Qué te lleva a pensar que {_reflect(m.group(1))}?"),
-    (re.compile(r"^\s*no\s+([a-záéíóúñ]+.*)$", re.I),
-     lambda m: f"¿Por qué no {_reflect(m.group(1))}?"),
-    (re.compile(r"^\s*(siempre|nunca)\s+(.*)$", re.I),
-     lambda m: f"¿Realmente {m.group(1).lower()} {_reflect(m.group(2))}? ¿Puedes recordar alguna excepción?"),
-    (re.compile(r"^\s*eres\s+(.*)$", re.I),
-     lambda m: f"¿Por qué crees que soy {_reflect(m.group(1))}?"),
-    (re.compile(r"^\s*soy\s+(.*)$", re.I),
-     lambda m: f"¿Desde cuándo eres {_reflect(m.group(1))}?"),
-    (re.compile(r".*\bque\s+no\s+me\s+([a-záéíóúñ]+.*)$", re.I),
-     lambda m: f"¿Por qué crees que no te {_reflect(m.group(1))}?"),
-]
-
-def eliza_reply(text: str):
-    if not text or text.strip() == "":
-        return None
-    t = text.strip()
-    if "?" in t and not re.search(r"^\s*(estoy|soy|me|siento|quiero|porque|pienso)\b", t, flags=re.I):
-        return None
-    for pat, func in _RULES:
-        m = pat.match(t)
-        if m:
-            try:
-                resp = func(m)
-            except Exception:
+def _compile_template(template: str):
+    """Parte la plantilla en literales y huecos (modo, número de grupo)."""
+    parts, pos = [], 0
+    for m in _PLACEHOLDER.finditer(template):
+        if m.start() > pos:
+            parts.append(template[pos:m.start()])
+        parts.append((m.group(1), int(m.group(2))))
+        pos = m.end()
+    if pos < len(template):
+        parts.append(template[pos:])
+    return parts
+
+class ElizaEngine:
+    def __init__(self, reflect: dict[str, str], rules: list[dict],
+                 question_openers=(), fallback: str | None = None):
+        self._reflect_map = {k.lower(): v for k, v in reflect.items()}
+        # Las entradas más largas primero, para que "sobre mí" gane a palabras sueltas.
+        words = sorted(self._reflect_map, key=len, reverse=True)
+        self._reflect_re = re.compile(
+            r"\b(?:" + "|".join(re.escape(w) for w in words) + r")\b", re.I) if words else None
+        self.question_openers = frozenset(w.lower() for w in question_openers)
+        self.fallback = fallback
+
+        self._generic = []
+        by_keyword: dict[str, list[tuple]] = {}
+        for i, rule in enumerate(rules):
+            compiled = (i, re.compile(rule["pattern"], re.I), _compile_template(rule["reply"]))
+            keywords = rule.get("keywords") or ()
+            if not keywords:
+                self._generic.append(compiled)
+            for kw in keywords:
+                by_keyword.setdefault(kw.lower(), []).append(compiled)
+        # Reglas de cada palabra mezcladas con las genéricas, conservando el orden del archivo.
+        self._by_keyword = {
+            kw: tuple(sorted(lst + self._generic, key=lambda c: c[0]))
+            for kw, lst in by_keyword.items()
+        }
+        self._generic = tuple(self._generic)
+        self.size = len(rules)
+
+    @classmethod
+    def from_file(cls, path=None):
+        with open(path or RULES_PATH, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("reflect", {}), data.get("rules", []),
+                   data.get("question_openers", ()), data.get("fallback"))
+
+    def reflect(self, text: str) -> str:
+        res = " " + _strip_trailing_punct(text.strip()) + " "
+        if self._reflect_re is not None:
+            table = self._reflect_map
+            res = self._reflect_re.sub(lambda m: table[m.group(0).lower()], res)
+        return res.strip()
+
+    def _render(self, parts, m) -> str:
+        out = []
+        for part in parts:
+            if isinstance(part, str):
+                out.append(part)
                 continue
-            resp = re.sub(r"\s{2,}", " ", resp).strip()
-            resp = _strip_trailing_punct(resp)
-            if not resp.endswith("?"):
-                resp += "?"
-            return resp
-    if len(t.split()) >= 2:
-        return "Entiendo. ¿Puedes contarme un poco más?"
-    return None
+            mode, n = part
+            value = m.group(n)
+            if mode == "r":
+                value = self.reflect(value)
+            elif mode == "l":
+                value = value.lower()
+            out.append(value)
+        return "".join(out)
+
+    def _admite(self, t: str) -> str | None:
+        """Primera palabra en minúsculas si ELIZA puede contestar a `t`; None si no."""
+        first = _FIRST_WORD.match(t)
+        first = first.group(1).lower() if first else ""
+        if "?" in t and first not in self.question_openers:
+            return None
+        return first
+
+    def reply(self, text: str, fallback: bool = True):
+        """Respuesta de las reglas; con `fallback`, la genérica si ninguna encaja."""
+        if not text or text.strip() == "":
+            return None
+        t = text.strip()
+        first = self._admite(t)
+        if first is None:
+            return None
+        for _, pat, parts in self._by_keyword.get(first, self._generic):
+            m = pat.match(t)
+            if m:
+                try:
+                    resp = self._render(parts, m)
+                except Exception:
+                    continue
+                resp = _MULTISPACE.sub(" ", resp).strip()
+                resp = _strip_trailing_punct(resp)
+                if not resp.endswith("?"):
+                    resp += "?"
+                return resp
+        return self.fallback_reply(t) if fallback else None
+
+    def fallback_reply(self, text: str):
+        """La respuesta genérica ("Entiendo...") si se daría para `text`; None si no."""
+        t = (text or "").strip()
+        if self.fallback is not None and len(t.split()) >= 2 and self._admite(t) is not None:
+            return self.fallback
+        return None
+
+_ENGINE = ElizaEngine.from_file()
+
+def load_rules(path=None) -> ElizaEngine:
+    """Carga (o recarga) las reglas desde el archivo y las deja activas."""
+    global _ENGINE
+    _ENGINE = ElizaEngine.from_file(path)
+    return _ENGINE
+
+def _reflect(text: str) -> str:
+    return _ENGINE.reflect(text)
+
+def eliza_reply(text: str, fallback: bool = True):
+    return _ENGINE.reply(text, fallback)
+
+def eliza_fallback(text: str):
+    return _ENGINE.fallback_reply(text)
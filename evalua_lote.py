@@ -0,0 +1,178 @@
+"""
+Evaluación por lotes, sin socket, de un corpus de preguntas con
+Servidor.responder_con_etapa().
+
+Lee las preguntas en streaming de un archivo JSONL o CSV, las reparte entre
+varios procesos en trozos (chunksize) y escribe cada resultado en cuanto
+llega, en el orden de entrada:
+
+    python evalua_lote.py preguntas.jsonl -o respuestas.jsonl
+    python evalua_lote.py registro.csv --columna texto -o respuestas.csv --procesos 8
+
+Entrada JSONL: una línea por pregunta, {"pregunta": "..."} o un texto JSON.
+Entrada CSV: la columna --columna (por defecto "pregunta"; si no existe, la primera).
+Salida (JSONL o CSV según la extensión; stdout si no se indica):
+    n, pregunta, respuesta, etapa, ms
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import Servidor
+
+CAMPOS = ("n", "pregunta", "respuesta", "etapa", "ms")
+
+# ---------------- Entrada ----------------
+def lee_jsonl(ruta):
+    with open(ruta, encoding="utf-8") as f:
+        for n, linea in enumerate(f, 1):
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                reg = json.loads(linea)
+            except ValueError as e:
+                raise ValueError(f"{ruta}:{n}: JSON inválido ({e})") from None
+            if isinstance(reg, str):
+                yield reg
+            elif isinstance(reg, dict):
+                yield str(reg.get("pregunta", ""))
+            else:
+                raise ValueError(f"{ruta}:{n}: se esperaba un texto o un objeto JSON")
+
+def lee_csv(ruta, columna="pregunta"):
+    with open(ruta, encoding="utf-8", newline="") as f:
+        lector = csv.reader(f)
+        cabecera = next(lector, None)
+        if cabecera is None:
+            return
+        i = cabecera.index(columna) if columna in cabecera else 0
+        for fila in lector:
+            if len(fila) > i:
+                yield fila[i]
+
+def lee_preguntas(ruta, columna="pregunta"):
+    if str(ruta) == "-":
+        return (json.loads(l) if l.lstrip().startswith(('"', "{")) else l.rstrip("\n")
+                for l in sys.stdin if l.strip())
+    if Path(ruta).suffix.lower() == ".csv":
+        return lee_csv(ruta, columna)
+    return lee_jsonl(ruta)
+
+# ---------------- Trabajo por proceso ----------------
+def _inicia_proceso(ruta_kb):
+    Servidor.METRICAS.activas = False
+    if ruta_kb and Servidor.KB_RUTA != ruta_kb:  # p. ej. con spawn, donde no se hereda
+        Servidor.KB_RUTA = ruta_kb
+        Servidor.recarga_base()
+
+def evalua(item):
+    n, pregunta = item
+    if isinstance(pregunta, dict):
+        pregunta = str(pregunta.get("pregunta", ""))
+    t0 = time.perf_counter()
+    respuesta, etapa = Servidor.responder_con_etapa(pregunta)
+    ms = (time.perf_counter() - t0) * 1e3
+    return n, pregunta, respuesta, etapa, round(ms, 4)
+
+# ---------------- Salida ----------------
+class _SalidaJSONL:
+    def __init__(self, f):
+        self.f = f
+
+    def escribe(self, fila):
+        self.f.write(json.dumps(dict(zip(CAMPOS, fila)), ensure_ascii=False) + "\n")
+
+class _SalidaCSV:
+    def __init__(self, f):
+        self.w = csv.writer(f)
+        self.w.writerow(CAMPOS)
+
+    def escribe(self, fila):
+        self.w.writerow(fila)
+
+def evalua_archivo(entrada, salida=None, procesos=None, chunksize=64, columna="pregunta",
+                   ruta_kb=None, progreso=True) -> dict:
+    """Evalúa todas las preguntas de `entrada`; devuelve un resumen."""
+    procesos = procesos or os.cpu_count() or 1
+    if ruta_kb:
+        Servidor.KB_RUTA = ruta_kb
+        Servidor.recarga_base()
+    else:
+        Servidor.kb_actual()  # base e índices listos antes del fork: los procesos los heredan
+
+    f = open(salida, "w", encoding="utf-8", newline="") if salida else sys.stdout
+    escritor = _SalidaCSV(f) if salida and Path(salida).suffix.lower() == ".csv" else _SalidaJSONL(f)
+    etapas = Counter()
+    t0 = time.perf_counter()
+    total = 0
+
+    # Tope de preguntas leídas y aún sin escribir: el archivo de entrada se lee al ritmo
+    # de los procesos, así un corpus enorme no acaba entero en memoria.
+    en_vuelo = threading.BoundedSemaphore(max(1, procesos * chunksize * 4))
+
+    def preguntas():
+        for item in enumerate(lee_preguntas(entrada, columna), 1):
+            en_vuelo.acquire()
+            yield item
+
+    pool = None
+    try:
+        if procesos == 1:
+            _inicia_proceso(None)
+            resultados = map(evalua, enumerate(lee_preguntas(entrada, columna), 1))
+        else:
+            pool = multiprocessing.Pool(procesos, initializer=_inicia_proceso,
+                                        initargs=(Servidor.KB_RUTA,))
+            resultados = pool.imap(evalua, preguntas(), chunksize=chunksize)
+        for fila in resultados:
+            if pool is not None:
+                en_vuelo.release()
+            escritor.escribe(fila)
+            etapas[fila[3]] += 1
+            total += 1
+            if progreso and total % 10000 == 0:
+                print(f"{total} preguntas...", file=sys.stderr)
+        if pool is not None:
+            pool.close()
+            pool.join()
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if salida:
+            f.close()
+        else:
+            f.flush()
+
+    transcurrido = time.perf_counter() - t0
+    return {
+        "preguntas": total,
+        "segundos": round(transcurrido, 3),
+        "por_segundo": round(total / transcurrido, 1) if transcurrido else 0.0,
+        "procesos": procesos,
+        "etapas": dict(etapas),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evalúa un archivo de preguntas con responder().")
+    parser.add_argument("entrada", help="archivo .jsonl o .csv ('-' para stdin)")
+    parser.add_argument("-o", "--salida", help="archivo .jsonl o .csv (por defecto stdout en JSONL)")
+    parser.add_argument("--procesos", type=int, default=None, help="por defecto, uno por núcleo")
+    parser.add_argument("--chunksize", type=int, default=64, help="preguntas por envío a cada proceso")
+    parser.add_argument("--columna", default="pregunta", help="columna de la pregunta en CSV")
+    parser.add_argument("--kb", default=None, help="base de conocimiento a usar")
+    args = parser.parse_args(argv)
+    resumen = evalua_archivo(args.entrada, args.salida, args.procesos, args.chunksize,
+                             args.columna, args.kb)
+    print(json.dumps(resumen, ensure_ascii=False), file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
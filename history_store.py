@@ -0,0 +1,248 @@
+"""
+Conversation history for the controller: a bounded in-memory ring buffer
+backed by an append-only JSONL log.
+
+Every entry gets an increasing integer ``id``; clients page with
+``cursor`` = the last id they have seen. Recent entries are served from
+memory, older ones are read from the log.
+
+The log is rotated into segments once it reaches ``segment_bytes``: the
+live file keeps its name and each closed segment is renamed to
+``<name>.<first id>``. Ids grow along every file, so an old cursor is found
+by picking its segment from the names and bisecting byte offsets inside
+it, reading one line per probe; a restart reads only the tail of the log,
+backwards from its end, to refill the ring buffer.
+"""
+import bisect
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+_BLOCK = 64 * 1024  # bytes read per step when scanning a log backwards
+
+def _parse(line: bytes) -> dict | None:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        item = json.loads(line)
+    except ValueError:
+        return None  # torn line after a crash
+    return item if isinstance(item, dict) and isinstance(item.get("id"), int) else None
+
+def _read_backwards(path: Path):
+    """Entries of one log file from the last to the first."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        pos = f.seek(0, os.SEEK_END)
+        rest = b""
+        while pos > 0:
+            step = min(_BLOCK, pos)
+            pos -= step
+            f.seek(pos)
+            lines = (f.read(step) + rest).split(b"\n")
+            rest = lines.pop(0)  # may continue in the previous block
+            for line in reversed(lines):
+                if (item := _parse(line)) is not None:
+                    yield item
+        if (item := _parse(rest)) is not None:
+            yield item
+
+def _first_line_at(f, pos: int) -> int:
+    """Offset of the first line that starts at or after ``pos``."""
+    if pos == 0:
+        return 0
+    f.seek(pos - 1)
+    f.readline()
+    return f.tell()
+
+def _id_at(f, pos: int) -> int | None:
+    """Id of the first readable entry from line start ``pos``; None at the end of the file."""
+    f.seek(pos)
+    for line in f:
+        if (item := _parse(line)) is not None:
+            return item["id"]
+    return None
+
+def _offset_after(f, size: int, cursor: int) -> int:
+    """Offset of the first line with id > cursor, bisecting over byte positions."""
+    lo, hi = 0, size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        item_id = _id_at(f, _first_line_at(f, mid))
+        if item_id is None or item_id > cursor:
+            hi = mid
+        else:
+            lo = mid + 1
+    return _first_line_at(f, lo)
+
+class HistoryStore:
+    def __init__(self, path: str | Path | None, max_items: int = 1000,
+                 flush_every: int = 32, flush_interval: float = 1.0,
+                 segment_bytes: int = 16 * 1024 * 1024, max_segments: int = 0):
+        self.path = Path(path) if path else None
+        self.max_items = max_items
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.segment_bytes = segment_bytes  # 0 = never rotate
+        self.max_segments = max_segments    # closed segments to keep; 0 = all of them
+        self._items: deque[dict] = deque(maxlen=max_items)
+        self._pending: list[bytes] = []
+        self._lock = threading.Lock()
+        self._file = None
+        self._next_id = 1
+        self._segments: list[tuple[int, Path]] = []  # (first id, path), oldest first
+        self._live_first: int | None = None          # first id in the live file
+        self._last_flush = time.monotonic()
+        self._stop = threading.Event()
+        if self.path:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._segments = self._find_segments()
+            self._load()
+            self._file = open(self.path, "ab")
+            if self._file.tell() and not self._ends_with_newline():
+                self._file.write(b"\n")  # never append to a torn last line
+            threading.Thread(target=self._flusher, daemon=True).start()
+
+    def _find_segments(self) -> list[tuple[int, Path]]:
+        prefix = self.path.name + "."
+        found = [(int(p.name[len(prefix):]), p) for p in self.path.parent.glob(prefix + "*")
+                 if p.name[len(prefix):].isdigit()]
+        return sorted(found)
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _load(self):
+        """Refill the ring buffer with the tail of the log, newest file first, after a restart."""
+        newest_first = [self.path] + [p for _, p in reversed(self._segments)]
+        tail = list(itertools.islice(
+            itertools.chain.from_iterable(_read_backwards(p) for p in newest_first),
+            max(1, self.max_items)))  # at least the newest one, for the next id
+        if tail:
+            self._next_id = tail[0]["id"] + 1
+        self._items.extend(reversed(tail))
+        if self.path.exists():
+            with open(self.path, "rb") as f:
+                self._live_first = _id_at(f, 0)
+
+    def _read_log(self, after: int = 0):
+        """Entries with id > after, oldest first, starting at the segment and offset that hold them."""
+        with self._lock:
+            files = self._segments + [(self._live_first or self._next_id, self.path)]
+        start = max(0, bisect.bisect_right([first for first, _ in files], after + 1) - 1)
+        for _, path in files[start:]:
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                continue  # removed by retention while we were reading
+            with f:
+                f.seek(_offset_after(f, os.fstat(f.fileno()).st_size, after))
+                for line in f:
+                    item = _parse(line)
+                    if item is not None and item["id"] > after:
+                        yield item
+
+    def append(self, question: str, answer: str) -> dict:
+        with self._lock:
+            item = {"id": self._next_id, "q": question, "a": answer, "t": time.time()}
+            self._next_id += 1
+            self._items.append(item)
+            if self._file:
+                if self._live_first is None:
+                    self._live_first = item["id"]
+                self._pending.append((json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8"))
+                if len(self._pending) >= self.flush_every:
+                    self._flush_locked()
+        return item
+
+    def _flush_locked(self):
+        if self._pending and self._file:
+            self._file.write(b"".join(self._pending))
+            self._file.flush()
+            self._pending.clear()
+            if self.segment_bytes and self._file.tell() >= self.segment_bytes:
+                self._rotate_locked()
+        self._last_flush = time.monotonic()
+
+    def _rotate_locked(self):
+        """Close the live file as segment ``<name>.<first id>`` and start a new one."""
+        self._file.close()
+        segment = self.path.with_name(f"{self.path.name}.{self._live_first}")
+        os.replace(self.path, segment)
+        self._segments.append((self._live_first, segment))
+        self._live_first = None
+        self._file = open(self.path, "ab")
+        while self.max_segments and len(self._segments) > self.max_segments:
+            _, oldest = self._segments.pop(0)
+            oldest.unlink(missing_ok=True)
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flusher(self):
+        while not self._stop.wait(self.flush_interval):
+            with self._lock:
+                if self._pending and time.monotonic() - self._last_flush >= self.flush_interval:
+                    self._flush_locked()
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            self._flush_locked()
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def __len__(self):
+        return len(self._items)
+
+    def page(self, cursor: int | None = None, limit: int = 100) -> tuple[list[dict], int | None]:
+        """Up to ``limit`` entries with id > cursor, plus the cursor for the next page."""
+        cursor = cursor or 0
+        with self._lock:
+            first = self._items[0]["id"] if self._items else self._next_id
+            in_memory = cursor >= first - 1 or self.path is None  # no log: memory is all there is
+            if in_memory:
+                start = max(0, cursor - first + 1)
+                items = list(itertools.islice(self._items, start, start + limit))
+        if not in_memory:
+            # Older than the ring buffer: read it from the log, then top up from memory
+            # with whatever was appended after the flush
+            self.flush()
+            items = list(itertools.islice(self._read_log(after=cursor), limit))
+            if len(items) < limit:
+                last = items[-1]["id"] if items else cursor
+                with self._lock:
+                    newer = [item for item in self._items if item["id"] > last]
+                items += newer[:limit - len(items)]
+        next_cursor = items[-1]["id"] if len(items) == limit else None
+        return items, next_cursor
+
+    def iter_from(self, cursor: int | None = None):
+        """Every entry with id > cursor, oldest first, without building a list of them all."""
+        cursor = cursor or 0
+        with self._lock:
+            first = self._items[0]["id"] if self._items else self._next_id
+        if cursor < first - 1 and self.path is not None:
+            # One sequential pass over the log, then whatever is newer from memory
+            self.flush()
+            for item in self._read_log(after=cursor):
+                yield item
+                cursor = item["id"]
+        while True:
+            items, next_cursor = self.page(cursor, 500)
+            yield from items
+            if next_cursor is None:
+                return
+            cursor = next_cursor
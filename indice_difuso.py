@@ -0,0 +1,150 @@
+"""
+Búsqueda difusa indexada sobre las claves de la base de conocimiento.
+
+Devuelve exactamente lo mismo que difflib.get_close_matches(palabra, claves,
+n, cutoff), pero sin pasar SequenceMatcher por todas las claves: un índice
+invertido de bigramas de caracteres descarta de antemano las que no pueden
+llegar al cutoff.
+
+Por qué el filtro es exacto: si ratio() >= cutoff, las dos cadenas comparten
+una subsecuencia común de al menos M = ceil(cutoff*(la+lb)/2) caracteres.
+Cada carácter que queda fuera rompe a lo sumo Q bigramas de su cadena y cada
+hueco del otro lado a lo sumo Q-1, así que comparten al menos
+T = (la-Q+1) - Q*(la-M) - (Q-1)*(lb-M) bigramas contando repeticiones (o el
+simétrico, si es mayor). Las listas invertidas se indexan por (bigrama,
+aparición) -- "dede" -> (de,0), (ed,0), (de,1) -- de modo que el número de
+listas de la consulta en las que aparece una clave es justo ese recuento.
+El conteo se hace con Counter (en C); solo las claves que alcanzan T y caen
+en la ventana de longitudes pasan a SequenceMatcher, con las mismas pruebas y
+el mismo orden que usa difflib.
+
+partes() y desde_partes() pasan las listas invertidas a arrays planos y de
+vuelta, para guardarlas en el snapshot de la base (ver conocimiento.py).
+"""
+import math
+from array import array
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from itertools import chain
+
+Q = 2  # longitud de los q-gramas del índice
+
+def _ocurrencias(s: str) -> list[tuple[str, int]]:
+    """Bigramas de s numerados por aparición."""
+    vistos: dict[str, int] = {}
+    res = []
+    for i in range(len(s) - Q + 1):
+        g = s[i:i + Q]
+        j = vistos.get(g, 0)
+        vistos[g] = j + 1
+        res.append((g, j))
+    return res
+
+class IndiceDifuso:
+    def __init__(self, claves, cutoff: float = 0.82):
+        if not 0.0 < cutoff <= 1.0:
+            raise ValueError(f"cutoff fuera de rango: {cutoff!r}")
+        self.cutoff = cutoff
+        self.claves: list[str] = []
+        self._largos = array("i")  # len() de cada clave, sin tocar la clave
+        self._por_longitud: dict[int, list[int]] = defaultdict(list)
+        self._postings: dict[tuple[str, int], list[int]] = defaultdict(list)
+        for clave in claves:
+            self.agrega(clave)
+
+    @classmethod
+    def desde_partes(cls, claves, partes, cutoff: float = 0.82) -> "IndiceDifuso":
+        """Índice de solo lectura sobre los arrays de partes(); `claves` en el mismo orden."""
+        nombres, inicios, valores, longitudes, inicios_l, valores_l, largos = partes
+        indice = cls((), cutoff)
+        indice.claves = claves
+        indice._largos = largos
+        texto = bytes(nombres).decode("utf-8")
+        indice._postings = {(g[:Q], int(g[Q:])): valores[inicios[i]:inicios[i + 1]]
+                            for i, g in enumerate(texto.split("\n") if texto else ())}
+        indice._por_longitud = {lb: valores_l[inicios_l[i]:inicios_l[i + 1]]
+                                for i, lb in enumerate(longitudes)}
+        return indice
+
+    def partes(self) -> list[tuple[str, object]]:
+        """
+        (código de array, datos) de las listas invertidas y por longitud (nombres
+        "bigrama" + aparición separados por "\n", inicios de cada lista y valores)
+        y la longitud de cada clave.
+        """
+        def planas(listas):
+            inicios, valores = array("q", [0]), array("i")
+            for lista in listas:
+                valores.extend(lista)
+                inicios.append(len(valores))
+            return inicios, valores
+        nombres = "\n".join(f"{g}{j}" for g, j in self._postings).encode("utf-8")
+        inicios, valores = planas(self._postings.values())
+        inicios_l, valores_l = planas(self._por_longitud.values())
+        return [("B", nombres), ("q", inicios), ("i", valores),
+                ("i", array("i", self._por_longitud)), ("q", inicios_l), ("i", valores_l),
+                ("i", self._largos)]
+
+    def __len__(self):
+        return len(self.claves)
+
+    def agrega(self, clave: str):
+        i = len(self.claves)
+        self.claves.append(clave)
+        self._largos.append(len(clave))
+        self._por_longitud[len(clave)].append(i)
+        for oc in _ocurrencias(clave):
+            self._postings[oc].append(i)
+
+    def _ventana_longitud(self, la: int):
+        # ratio() <= 2*min(la, lb)/(la + lb): fuera de esta ventana no hay match posible.
+        c = self.cutoff
+        lmin = max(0, int(la * c / (2 - c)) - 1)
+        lmax = int(la * (2 - c) / c) + 1
+        return lmin, lmax
+
+    def _umbral(self, la: int, lb: int) -> int:
+        """Bigramas compartidos (con repeticiones) exigibles a cadenas de longitudes la y lb."""
+        m = math.ceil(self.cutoff * (la + lb) / 2 - 1e-9)
+        return max((la - Q + 1) - Q * (la - m) - (Q - 1) * (lb - m),
+                   (lb - Q + 1) - Q * (lb - m) - (Q - 1) * (la - m))
+
+    def _candidatos(self, palabra: str):
+        la = len(palabra)
+        lmin, lmax = self._ventana_longitud(la)
+        umbrales = {lb: self._umbral(la, lb) for lb in range(lmin, lmax + 1)}
+        minimo = min(umbrales.values())
+
+        if minimo <= 0:
+            # Consulta demasiado corta para filtrar por bigramas: basta la longitud.
+            for lb in range(lmin, lmax + 1):
+                yield from self._por_longitud.get(lb, ())
+            return
+
+        postings = self._postings
+        cuenta = Counter(chain.from_iterable(
+            postings[oc] for oc in _ocurrencias(palabra) if oc in postings))
+        largos = self._largos
+        for i, c in cuenta.items():
+            if c >= minimo:
+                lb = largos[i]
+                if lmin <= lb <= lmax and c >= umbrales[lb]:
+                    yield i
+
+    def cercanas(self, palabra: str, n: int = 1) -> list[str]:
+        """Equivalente a difflib.get_close_matches(palabra, claves, n, cutoff)."""
+        if n <= 0:
+            raise ValueError(f"n debe ser > 0: {n!r}")
+        cutoff = self.cutoff
+        s = SequenceMatcher()
+        s.set_seq2(palabra)
+        resultado = []
+        for i in self._candidatos(palabra):
+            x = self.claves[i]
+            s.set_seq1(x)
+            if s.real_quick_ratio() >= cutoff and \
+               s.quick_ratio() >= cutoff and \
+               s.ratio() >= cutoff:
+                resultado.append((s.ratio(), x))
+        resultado.sort(reverse=True)
+        return [x for _, x in resultado[:n]]
@@ -0,0 +1,313 @@
+"""
+Motor para tableros de N x M casillas en los que gana quien alinea k fichas
+(tres en raya ampliado, cuatro en raya, gomoku 15x15 con k=5...).
+
+  * Ventanas: todas las rectas de k casillas del tablero (horizontales,
+    verticales y diagonales) se calculan una vez por tamaño. Cada casilla
+    sabe en qué ventanas está y la búsqueda lleva, por ventana, cuántas
+    fichas tiene cada jugador. Poner o quitar una ficha solo toca esas
+    ventanas: la victoria (una ventana llega a k) y la evaluación (suma de
+    ventanas "vivas" de un solo color) se actualizan de forma incremental.
+  * Hash de Zobrist de 64 bits por (casilla, jugador), actualizado con XOR.
+  * Tabla de transposición acotada: array de 2^bits entradas indexado por
+    el hash; se sustituye la entrada si la nueva búsqueda es al menos igual
+    de profunda. Se conserva entre jugadas del mismo tamaño de tablero.
+  * Negamax con poda alfa-beta; las jugadas se ordenan poniendo primero la
+    de la tabla y después por lo que ganan o bloquean en sus ventanas. En
+    tableros grandes solo se miran las casillas a distancia <= 2 de alguna
+    ficha y, por debajo de la raíz, las `ancho` mejores.
+  * Profundización iterativa con un presupuesto de tiempo por jugada: se
+    devuelve la mejor jugada de la última iteración completa.
+"""
+import random
+import threading
+import time
+
+VACIA, X, O = 0, 1, 2
+GANA = 1_000_000
+_DIRECCIONES = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+class _TiempoAgotado(Exception):
+    pass
+
+class Motor:
+    """Datos fijos de un tamaño (ventanas, Zobrist) y su tabla de transposición."""
+    def __init__(self, filas: int, columnas: int, k: int, tt_bits: int = 18, semilla: int = 0x6A7E):
+        if not (1 <= filas <= 25 and 1 <= columnas <= 25):
+            raise ValueError("El tablero debe tener entre 1 y 25 filas y columnas.")
+        if not 2 <= k <= max(filas, columnas):
+            raise ValueError("k debe estar entre 2 y el lado mayor del tablero.")
+        self.filas, self.columnas, self.k = filas, columnas, k
+        self.casillas = filas * columnas
+
+        ventanas = []
+        for f in range(filas):
+            for c in range(columnas):
+                for df, dc in _DIRECCIONES:
+                    ff, cf = f + df * (k - 1), c + dc * (k - 1)
+                    if 0 <= ff < filas and 0 <= cf < columnas:
+                        ventanas.append(tuple((f + df * i) * columnas + c + dc * i for i in range(k)))
+        self.ventanas = ventanas
+        por_casilla = [[] for _ in range(self.casillas)]
+        for w, celdas in enumerate(ventanas):
+            for i in celdas:
+                por_casilla[i].append(w)
+        self.ventanas_de = [tuple(ws) for ws in por_casilla]
+        # Valor de una ventana con n fichas de un solo color (n = k ya es victoria)
+        self.peso = [0] + [10 ** (n - 1) for n in range(1, k)] + [GANA]
+
+        vecinas = []
+        for f in range(filas):
+            for c in range(columnas):
+                vecinas.append(tuple(
+                    ff * columnas + cc
+                    for ff in range(max(0, f - 2), min(filas, f + 3))
+                    for cc in range(max(0, c - 2), min(columnas, c + 3))
+                    if (ff, cc) != (f, c)))
+        self.vecinas = vecinas
+
+        rnd = random.Random(semilla)
+        self.zobrist = [(0, rnd.getrandbits(64), rnd.getrandbits(64)) for _ in range(self.casillas)]
+        self.tt_mascara = (1 << tt_bits) - 1
+        self.tt = [None] * (1 << tt_bits)  # (hash, profundidad, valor, tipo, jugada)
+        self.ancho = None if self.casillas <= 25 else 12
+
+    def mejor_jugada(self, celdas, tiempo: float = 1.0, profundidad_max: int | None = None) -> dict:
+        """
+        celdas: lista de filas*columnas enteros (0 vacía, 1 X, 2 O); empieza X.
+        Devuelve la jugada (índice), su valor, la profundidad completada y los nodos visitados.
+        """
+        if len(celdas) != self.casillas:
+            raise ValueError(f"El tablero debe tener {self.casillas} casillas.")
+        return _Busqueda(self, list(celdas)).ejecuta(tiempo, profundidad_max)
+
+class _Busqueda:
+    """Estado mutable de una búsqueda (uno por petición; el Motor se comparte)."""
+    def __init__(self, motor: Motor, celdas):
+        self.m = motor
+        self.celdas = celdas
+        n = len(motor.ventanas)
+        self.cuenta = [[0] * n, [0] * n, [0] * n]  # fichas por ventana de cada jugador (índice 1 y 2)
+        self.eval = 0   # desde X
+        self.hash = 0
+        self.ganador = VACIA
+        self.nodos = 0
+        x = o = 0
+        for i, v in enumerate(celdas):
+            if v not in (VACIA, X, O):
+                raise ValueError("Casilla inválida: usa 0, 1 (X) o 2 (O).")
+            if v:
+                celdas[i] = VACIA
+                self.pon(i, v)
+                x += v == X
+                o += v == O
+        if not (x == o or x == o + 1):
+            raise ValueError("Tablero imposible en una partida en la que empieza X.")
+        self.turno = X if x == o else O
+        self.libres = self.m.casillas - x - o
+
+    # ---------------- Hacer / deshacer ----------------
+    def _aporte(self, w):
+        a, b = self.cuenta[X][w], self.cuenta[O][w]
+        if a and not b:
+            return self.m.peso[a]
+        if b and not a:
+            return -self.m.peso[b]
+        return 0
+
+    def pon(self, i, jugador):
+        self.celdas[i] = jugador
+        self.hash ^= self.m.zobrist[i][jugador]
+        cuenta = self.cuenta[jugador]
+        k = self.m.k
+        for w in self.m.ventanas_de[i]:
+            antes = self._aporte(w)
+            cuenta[w] += 1
+            self.eval += self._aporte(w) - antes
+            if cuenta[w] == k:
+                self.ganador = jugador
+
+    def quita(self, i):
+        jugador = self.celdas[i]
+        self.celdas[i] = VACIA
+        self.hash ^= self.m.zobrist[i][jugador]
+        cuenta = self.cuenta[jugador]
+        for w in self.m.ventanas_de[i]:
+            antes = self._aporte(w)
+            cuenta[w] -= 1
+            self.eval += self._aporte(w) - antes
+        self.ganador = VACIA  # solo se busca desde posiciones sin ganador
+
+    # ---------------- Generación y orden de jugadas ----------------
+    def _candidatas(self):
+        celdas = self.celdas
+        if self.m.casillas <= 25 or self.libres == self.m.casillas:
+            libres = [i for i, v in enumerate(celdas) if v == VACIA]
+            if self.libres == self.m.casillas and self.m.casillas > 25:
+                return [(self.m.filas // 2) * self.m.columnas + self.m.columnas // 2]
+            return libres
+        vistas = set()
+        for i, v in enumerate(celdas):
+            if v:
+                for j in self.m.vecinas[i]:
+                    if celdas[j] == VACIA:
+                        vistas.add(j)
+        return list(vistas)
+
+    def _prioridad(self, i, jugador):
+        """Cuánto gana (o bloquea) poner en i: ventanas que completa o amenaza."""
+        rival = 3 - jugador
+        propias, ajenas, peso = self.cuenta[jugador], self.cuenta[rival], self.m.peso
+        p = 0
+        for w in self.m.ventanas_de[i]:
+            a, b = propias[w], ajenas[w]
+            if not b:
+                p += peso[a + 1] * 2  # atacar vale un poco más que defender
+            elif not a:
+                p += peso[b + 1]
+        return p
+
+    def _ordena(self, jugadas, jugador, primera, raiz):
+        jugadas.sort(key=lambda i: self._prioridad(i, jugador), reverse=True)
+        if primera is not None and primera in jugadas:
+            jugadas.remove(primera)
+            jugadas.insert(0, primera)
+        if not raiz and self.m.ancho:
+            del jugadas[self.m.ancho:]
+        return jugadas
+
+    # ---------------- Búsqueda ----------------
+    def _negamax(self, profundidad, alfa, beta, jugador, ply):
+        self.nodos += 1
+        if self.nodos & 1023 == 0 and time.perf_counter() > self.limite:
+            raise _TiempoAgotado()
+        if self.ganador:
+            return -(GANA - ply)  # quien acaba de mover ha ganado
+        if self.libres == 0:
+            return 0
+        if profundidad == 0:
+            return self.eval if jugador == X else -self.eval
+
+        m = self.m
+        alfa_original = alfa
+        entrada = m.tt[self.hash & m.tt_mascara]
+        primera = None
+        if entrada is not None and entrada[0] == self.hash:
+            _, prof, valor, tipo, primera = entrada
+            if prof >= profundidad:
+                if tipo == 0:
+                    return valor
+                if tipo == 1 and valor > alfa:
+                    alfa = valor
+                elif tipo == 2 and valor < beta:
+                    beta = valor
+                if alfa >= beta:
+                    return valor
+
+        mejor, mejor_jugada = -GANA - 1, None
+        for i in self._ordena(self._candidatas(), jugador, primera, False):
+            self.pon(i, jugador)
+            self.libres -= 1
+            try:
+                v = -self._negamax(profundidad - 1, -beta, -alfa, 3 - jugador, ply + 1)
+            finally:
+                self.libres += 1
+                self.quita(i)
+            if v > mejor:
+                mejor, mejor_jugada = v, i
+            if v > alfa:
+                alfa = v
+            if alfa >= beta:
+                break
+
+        tipo = 2 if mejor <= alfa_original else (1 if mejor >= beta else 0)  # 2: cota sup., 1: cota inf.
+        indice = self.hash & m.tt_mascara
+        vieja = m.tt[indice]
+        if vieja is None or vieja[1] <= profundidad:
+            m.tt[indice] = (self.hash, profundidad, mejor, tipo, mejor_jugada)
+        return mejor
+
+    def _raiz(self, profundidad, orden):
+        alfa, beta = -GANA - 1, GANA + 1
+        mejor, mejor_jugada = -GANA - 1, orden[0]
+        jugador = self.turno
+        for i in orden:
+            self.pon(i, jugador)
+            self.libres -= 1
+            try:
+                if self.ganador:
+                    v = GANA - 1
+                else:
+                    v = -self._negamax(profundidad - 1, -beta, -alfa, 3 - jugador, 1)
+            finally:
+                self.libres += 1
+                self.quita(i)
+            if v > mejor:
+                mejor, mejor_jugada = v, i
+            if v > alfa:
+                alfa = v
+        return mejor, mejor_jugada
+
+    def ejecuta(self, tiempo, profundidad_max):
+        t0 = time.perf_counter()
+        self.limite = t0 + tiempo
+        if self.ganador or self.libres == 0:
+            return {"jugada": None, "valor": 0, "profundidad": 0, "nodos": 0,
+                    "terminado": True, "ganador": self.ganador or None, "ms": 0.0}
+        orden = self._ordena(self._candidatas(), self.turno, None, True)
+        mejor = (0, orden[0])
+        completada = 0
+        maximo = min(profundidad_max or self.libres, self.libres)
+        for profundidad in range(1, maximo + 1):
+            try:
+                mejor = self._raiz(profundidad, orden)
+            except _TiempoAgotado:
+                break
+            completada = profundidad
+            # La mejor jugada encabeza la siguiente iteración
+            orden.remove(mejor[1])
+            orden.insert(0, mejor[1])
+            if abs(mejor[0]) >= GANA - self.m.casillas:
+                break  # victoria o derrota forzada: más profundidad no cambia nada
+        return {"jugada": mejor[1], "valor": mejor[0], "profundidad": completada,
+                "nodos": self.nodos, "terminado": False, "ganador": None,
+                "ms": round((time.perf_counter() - t0) * 1e3, 1)}
+
+_MOTORES: dict[tuple[int, int, int], Motor] = {}
+_MOTORES_MAX = 8
+_LOCK = threading.Lock()
+
+def motor(filas: int, columnas: int, k: int) -> Motor:
+    """Motor compartido por tamaño, para reutilizar su tabla de transposición."""
+    clave = (filas, columnas, k)
+    with _LOCK:
+        m = _MOTORES.get(clave)
+        if m is None:
+            if len(_MOTORES) >= _MOTORES_MAX:
+                _MOTORES.pop(next(iter(_MOTORES)))
+            m = _MOTORES[clave] = Motor(filas, columnas, k)
+        return m
+
+def lee_tablero(tablero, casillas: int) -> list[int]:
+    """Como tres_en_raya.lee_tablero, para un tablero de `casillas` posiciones."""
+    from tres_en_raya import SIMBOLOS
+    if isinstance(tablero, str):
+        tablero = list(tablero)
+    if not isinstance(tablero, (list, tuple)) or len(tablero) != casillas:
+        raise ValueError(f"El tablero debe tener {casillas} casillas.")
+    try:
+        return [SIMBOLOS[c if c is not None else ""] for c in tablero]
+    except (KeyError, TypeError):
+        raise ValueError("Casilla inválida: usa 'X', 'O' o vacío.") from None
+
+def mejor_jugada(tablero, filas: int, columnas: int, k: int, tiempo: float = 1.0) -> dict:
+    """Misma forma de respuesta que tres_en_raya.mejor_jugada(), más profundidad y nodos."""
+    m = motor(filas, columnas, k)
+    celdas = lee_tablero(tablero, m.casillas)
+    r = m.mejor_jugada(celdas, tiempo)
+    x, o = celdas.count(X), celdas.count(O)
+    marcas = ("", "X", "O")
+    if r["terminado"]:
+        r["ganador"] = marcas[r["ganador"]] if r["ganador"] else "empate"
+    r["turno"] = "X" if x == o else "O"
+    return r
@@ -0,0 +1,60 @@
+"""
+Limitador de tasa por cliente (cubeta de fichas), seguro entre hilos.
+
+Cada cliente (p. ej. su IP) tiene una cubeta de `rafaga` fichas que se
+rellena a `tasa` fichas por segundo; cada mensaje gasta una. Un cliente
+puede enviar una ráfaga corta de golpe, pero no sostener más de `tasa`
+mensajes por segundo. Las cubetas que ya se han rellenado del todo no
+guardan nada útil y se descartan cuando hay demasiadas.
+"""
+import threading
+import time
+
+class LimiteTasa:
+    def __init__(self, tasa: float, rafaga: int, max_clientes: int = 10000):
+        if tasa <= 0 or rafaga < 1:
+            raise ValueError(f"tasa debe ser > 0 y rafaga >= 1: {tasa!r}, {rafaga!r}")
+        self.tasa = tasa
+        self.rafaga = rafaga
+        self.max_clientes = max_clientes
+        self._cubetas: dict = {}  # cliente -> [fichas, momento de la última cuenta]
+        self._lock = threading.Lock()
+        self.permitidos = 0
+        self.limitados = 0
+
+    def permite(self, cliente) -> bool:
+        """Gasta una ficha del cliente; False si no le queda ninguna."""
+        ahora = time.monotonic()
+        with self._lock:
+            cubeta = self._cubetas.get(cliente)
+            if cubeta is None:
+                if len(self._cubetas) >= self.max_clientes:
+                    self._purga(ahora)
+                cubeta = self._cubetas[cliente] = [float(self.rafaga), ahora]
+            else:
+                cubeta[0] = min(self.rafaga, cubeta[0] + (ahora - cubeta[1]) * self.tasa)
+                cubeta[1] = ahora
+            if cubeta[0] >= 1.0:
+                cubeta[0] -= 1.0
+                self.permitidos += 1
+                return True
+            self.limitados += 1
+            return False
+
+    def _purga(self, ahora: float):
+        lleno = self.rafaga / self.tasa  # segundos sin mensajes para volver a tener la cubeta llena
+        self._cubetas = {c: v for c, v in self._cubetas.items() if ahora - v[1] < lleno}
+        if len(self._cubetas) >= self.max_clientes:
+            # Todos activos: se olvida la mitad más antigua (vuelven con la cubeta llena)
+            antiguas = sorted(self._cubetas.items(), key=lambda cv: cv[1][1])
+            self._cubetas = dict(antiguas[len(antiguas) // 2:])
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "tasa": self.tasa,
+                "rafaga": self.rafaga,
+                "clientes": len(self._cubetas),
+                "permitidos": self.permitidos,
+                "limitados": self.limitados,
+            }
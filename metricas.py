@@ -0,0 +1,123 @@
+"""
+Métricas del servidor: contadores, valores instantáneos e histogramas de
+latencia con cubetas fijas (al estilo Prometheus).
+
+Se activan o desactivan con CHATBOT_METRICAS=1/0 o con --metricas/--no-metricas
+en Servidor.py. Desactivadas, quien instrumenta comprueba METRICAS.activas y
+no llama a nada más: ni reloj ni locks.
+"""
+import bisect
+import os
+import threading
+import time
+
+# Límites superiores de las cubetas, en segundos
+CUBETAS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+           0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+class Histograma:
+    def __init__(self, cubetas=CUBETAS):
+        self.cubetas = tuple(cubetas)
+        self.cuentas = [0] * (len(self.cubetas) + 1)  # la última es +Inf
+        self.suma = 0.0
+        self.n = 0
+
+    def observa(self, valor: float):
+        self.cuentas[bisect.bisect_left(self.cubetas, valor)] += 1
+        self.suma += valor
+        self.n += 1
+
+    def a_dict(self) -> dict:
+        acumulado, cubetas = 0, []
+        for limite, c in zip(self.cubetas + (float("inf"),), self.cuentas):
+            acumulado += c
+            cubetas.append(["+Inf" if limite == float("inf") else limite, acumulado])
+        return {"cubetas": cubetas, "suma": self.suma, "n": self.n}
+
+class Metricas:
+    def __init__(self, activas: bool = True):
+        self.activas = activas
+        self._lock = threading.Lock()
+        self.reinicia()
+
+    def reinicia(self):
+        with self._lock:
+            self.inicio = time.time()
+            self.contadores: dict[str, int] = {}
+            self.valores: dict[str, int] = {}
+            self.histogramas: dict[str, Histograma] = {}
+
+    def suma(self, nombre: str, n: int = 1):
+        with self._lock:
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + n
+
+    def ajusta(self, nombre: str, delta: int):
+        """Valor instantáneo que sube y baja (p. ej. conexiones activas)."""
+        with self._lock:
+            self.valores[nombre] = self.valores.get(nombre, 0) + delta
+
+    def observa(self, nombre: str, segundos: float):
+        with self._lock:
+            h = self.histogramas.get(nombre)
+            if h is None:
+                h = self.histogramas[nombre] = Histograma()
+            h.observa(segundos)
+
+    def registra_respuesta(self, etapa: str, total: float, tiempos):
+        """Una petición de responder(): etapa que contestó, latencia total y tiempo por etapa."""
+        with self._lock:
+            for nombre, segundos in (("respuesta", total), *(("etapa:" + e, s) for e, s in tiempos)):
+                h = self.histogramas.get(nombre)
+                if h is None:
+                    h = self.histogramas[nombre] = Histograma()
+                h.observa(segundos)
+            clave = "respondidas:" + etapa
+            self.contadores[clave] = self.contadores.get(clave, 0) + 1
+
+    def instantanea(self) -> dict:
+        with self._lock:
+            return {
+                "activas": self.activas,
+                "desde": self.inicio,
+                "contadores": dict(self.contadores),
+                "valores": dict(self.valores),
+                "histogramas": {k: h.a_dict() for k, h in self.histogramas.items()},
+            }
+
+METRICAS = Metricas(activas=os.environ.get("CHATBOT_METRICAS", "1") != "0")
+
+# ---------------- Formato de texto de Prometheus ----------------
+def _nombre_y_etiqueta(nombre: str, prefijo: str):
+    """'respondidas:kb' -> ('chatbot_respondidas', '{etapa="kb"}')"""
+    base, _, etiqueta = nombre.partition(":")
+    return f"{prefijo}_{base}", (f'etapa="{etiqueta}"' if etiqueta else "")
+
+def a_prometheus(inst: dict, prefijo: str = "chatbot") -> str:
+    lineas = [f"# TYPE {prefijo}_metricas_activas gauge",
+              f"{prefijo}_metricas_activas {int(bool(inst.get('activas')))}"]
+    vistos = set()
+
+    def tipo(nombre, t):
+        if nombre not in vistos:
+            vistos.add(nombre)
+            lineas.append(f"# TYPE {nombre} {t}")
+
+    for k, v in sorted(inst.get("contadores", {}).items()):
+        nombre, etiqueta = _nombre_y_etiqueta(k, prefijo)
+        tipo(nombre + "_total", "counter")
+        lineas.append(f"{nombre}_total{{{etiqueta}}} {v}" if etiqueta else f"{nombre}_total {v}")
+    for k, v in sorted(inst.get("valores", {}).items()):
+        nombre, etiqueta = _nombre_y_etiqueta(k, prefijo)
+        tipo(nombre, "gauge")
+        lineas.append(f"{nombre}{{{etiqueta}}} {v}" if etiqueta else f"{nombre} {v}")
+    for k, h in sorted(inst.get("histogramas", {}).items()):
+        nombre, etiqueta = _nombre_y_etiqueta(k, prefijo)
+        nombre += "_segundos"
+        tipo(nombre, "histogram")
+        extra = etiqueta + "," if etiqueta else ""
+        for limite, acumulado in h["cubetas"]:
+            lineas.append(f'{nombre}_bucket{{{extra}le="{limite}"}} {acumulado}')
+        sufijo = f"{{{etiqueta}}}" if etiqueta else ""
+        lineas.append(f"{nombre}_sum{sufijo} {h['suma']}")
+        lineas.append(f"{nombre}_count{sufijo} {h['n']}")
+    return "\n".join(lineas) + "\n"
@@ -0,0 +1,111 @@
+"""
+Normalización de texto de una sola pasada.
+
+normaliza() devuelve exactamente lo mismo que la versión original
+(normaliza_referencia(): strip + lower + NFD quitando las marcas Mn + los
+signos de puntuación a espacios + espacios colapsados), pero para el texto
+habitual en español no pasa por unicodedata carácter a carácter:
+
+  * Para cada carácter por debajo de U+0370 (latín, latín extendido y marcas
+    combinantes) se precalcula a qué queda reducido: "Á" -> "a", "¿" -> " ",
+    "́" -> "". Con esa tabla, una sola traducción hace minúsculas, acentos
+    y puntuación a la vez, y split()/join colapsa los espacios.
+  * En Latin-1 (todo el español) cada carácter queda en exactamente uno, así
+    que la tabla cabe en 256 bytes: el texto se codifica en Latin-1 y se
+    traduce con bytes.translate(), que es un recorrido en C sin diccionarios.
+    El resto del rango usa str.translate() con la tabla completa.
+  * Quitar las marcas carácter a carácter da lo mismo que sobre el texto
+    descompuesto entero: la reordenación canónica de NFD solo mueve marcas
+    combinantes, y todas ellas (en ese rango) se eliminan. La única minúscula
+    que depende del contexto (la sigma final) está fuera del rango.
+  * Cualquier texto con un carácter desde U+0370 (griego, cirílico, CJK,
+    emoji...) va por la implementación original, así que el resultado es
+    siempre idéntico.
+
+Las entradas cortas se memorizan (los saludos y preguntas frecuentes se
+repiten mucho) y normaliza_lote() procesa corpus enteros sin memorizar.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+SIGNOS = "¿?¡!.,;:-_()[]{}\"'"
+LIMITE_TABLA = 0x370
+MEMO_MAX = 8192       # entradas memorizadas
+MEMO_LONGITUD = 256   # los textos más largos no se memorizan
+
+# ---------------- Implementación original ----------------
+def _sin_marcas(txt: str) -> str:
+    return "".join(
+        c for c in unicodedata.normalize("NFD", txt)
+        if unicodedata.category(c) != "Mn"
+    )
+
+def normaliza_referencia(txt: str) -> str:
+    """La normalización de siempre, paso a paso; es la especificación de normaliza()."""
+    txt = _sin_marcas(txt.strip().lower())
+    for ch in SIGNOS:
+        txt = txt.replace(ch, " ")
+    txt = " ".join(txt.split())
+    return txt
+
+def sin_acentos_referencia(txt: str) -> str:
+    """Como normaliza_referencia() pero conservando la puntuación (aritmetica.prepara)."""
+    return " ".join(_sin_marcas(txt.strip().lower()).split())
+
+# ---------------- Tablas ----------------
+def _tabla(signos: str) -> dict[int, str]:
+    tabla = {}
+    for i in range(LIMITE_TABLA):
+        c = chr(i)
+        r = _sin_marcas(c.lower())
+        for ch in signos:
+            r = r.replace(ch, " ")
+        if r != c:
+            tabla[i] = r
+    return tabla
+
+def _tabla_bytes(tabla: dict[int, str]) -> bytes:
+    """La parte Latin-1 de la tabla como tabla de bytes.translate() (todo es 1 a 1)."""
+    return bytes(ord(tabla.get(i, chr(i))) for i in range(256))
+
+_TABLA = _tabla(SIGNOS)
+_TABLA_ACENTOS = _tabla("")
+_BYTES = _tabla_bytes(_TABLA)
+_BYTES_ACENTOS = _tabla_bytes(_TABLA_ACENTOS)
+_FUERA_DE_TABLA = re.compile(f"[^\\x00-{chr(LIMITE_TABLA - 1)}]").search
+
+# ---------------- API ----------------
+def _rapida(txt: str) -> str:
+    try:
+        return " ".join(txt.encode("latin-1").translate(_BYTES).decode("latin-1").split())
+    except UnicodeEncodeError:
+        pass
+    if _FUERA_DE_TABLA(txt) is None:
+        return " ".join(txt.translate(_TABLA).split())
+    return normaliza_referencia(txt)
+
+_memo = lru_cache(maxsize=MEMO_MAX)(_rapida)
+
+def normaliza(txt: str) -> str:
+    if len(txt) <= MEMO_LONGITUD:
+        return _memo(txt)
+    return _rapida(txt)
+
+def normaliza_lote(textos) -> list[str]:
+    """normaliza() de muchos textos (p. ej. al cargar la base), sin pasar por la memoria."""
+    return [_rapida(t) for t in textos]
+
+def sin_acentos(txt: str) -> str:
+    """Minúsculas, sin acentos y con los espacios colapsados; la puntuación se queda."""
+    try:
+        return " ".join(txt.encode("latin-1").translate(_BYTES_ACENTOS).decode("latin-1").split())
+    except UnicodeEncodeError:
+        pass
+    if _FUERA_DE_TABLA(txt) is None:
+        return " ".join(txt.translate(_TABLA_ACENTOS).split())
+    return sin_acentos_referencia(txt)
+
+def estadisticas_memo() -> dict:
+    info = _memo.cache_info()
+    return {"aciertos": info.hits, "fallos": info.misses, "entradas": info.currsize, "max": info.maxsize}
@@ -0,0 +1,149 @@
+r"""
+Framing del protocolo TCP de preguntas.
+
+Cada mensaje (pregunta, respuesta o saludo) viaja en una sola línea UTF-8
+terminada en salto de línea. Los saltos de línea dentro del texto se escapan
+como \n (y la barra invertida como \\), así una respuesta de varias líneas
+sigue siendo un único mensaje y el receptor puede separar mensajes aunque TCP
+los junte o los parta en varios segmentos.
+"""
+import os
+import re
+import socket
+import struct
+import time
+
+MAX_LINEA = 64 * 1024  # bytes máximos por mensaje (sin contar el "\n")
+
+_ESCAPES = {"n": "\n", "r": "\r", "\\": "\\"}
+_RE_ESCAPE = re.compile(r"\\(.)", re.S)
+
+class LineaDemasiadoLarga(ValueError):
+    """El mensaje supera MAX_LINEA bytes."""
+
+def codifica(texto: str) -> bytes:
+    """Convierte un texto en una línea lista para enviarse por el socket."""
+    texto = texto.replace("\\", "\\\\").replace("\n", "\\n").replace("\r", "\\r")
+    return (texto + "\n").encode("utf-8")
+
+def decodifica(linea: bytes) -> str:
+    """Inversa de codifica(): quita el salto de línea final y deshace los escapes."""
+    texto = linea.decode("utf-8", errors="ignore").rstrip("\r\n")
+    if "\\" not in texto:
+        return texto
+    return _RE_ESCAPE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(0)), texto)
+
+def lee_mensaje(archivo, max_linea: int = MAX_LINEA):
+    """
+    Lee un mensaje de un archivo binario con buffer (p. ej. sock.makefile("rb")).
+    Devuelve None si el otro extremo cerró la conexión.
+    """
+    linea = archivo.readline(max_linea + 1)
+    if not linea:
+        return None
+    if not linea.endswith(b"\n"):
+        if len(linea) > max_linea:
+            raise LineaDemasiadoLarga(f"Mensaje de más de {max_linea} bytes.")
+        # EOF a mitad de línea: se entrega lo recibido
+    return decodifica(linea)
+
+class PlazoAgotado(TimeoutError):
+    """No llegó un mensaje a tiempo. fase: "inactiva" (no empezó) o "lectura" (no terminó)."""
+    def __init__(self, fase: str):
+        super().__init__(f"Plazo agotado ({fase}).")
+        self.fase = fase
+
+# En POSIX los plazos van en SO_RCVTIMEO/SO_SNDTIMEO con el socket en modo bloqueante:
+# recv()/send() no hacen un poll() previo como con settimeout(), y el plazo solo se
+# cambia (una llamada al sistema) cuando cambia la fase, no en cada mensaje.
+_PLAZO_SO = os.name == "posix" and hasattr(socket, "SO_RCVTIMEO")
+
+def _fija_plazo(sock, opcion, segundos: float | None):
+    if _PLAZO_SO:
+        seg = 0 if segundos is None else max(segundos, 1e-6)  # 0 = sin plazo para el kernel
+        sock.setsockopt(socket.SOL_SOCKET, opcion, struct.pack("ll", int(seg), int(seg % 1 * 1e6)))
+    else:
+        sock.settimeout(segundos)
+
+def fija_plazo_envio(sock, segundos: float | None):
+    """Plazo de cada envío; al vencer, sendall() lanza TimeoutError o BlockingIOError."""
+    _fija_plazo(sock, getattr(socket, "SO_SNDTIMEO", None), segundos)
+
+class LectorSocket:
+    """
+    Lee mensajes de un socket con dos plazos: `inactivo` segundos para que
+    empiece a llegar el siguiente mensaje y `lectura` para que, una vez
+    empezado, llegue entero. Así un cliente callado o uno que envía byte a
+    byte no retiene para siempre el hilo que lo atiende. None = sin plazo.
+    """
+    def __init__(self, sock, inactivo: float | None = None, lectura: float | None = None,
+                 max_linea: int = MAX_LINEA):
+        self.sock = sock
+        self.inactivo = inactivo
+        self.lectura = lectura
+        self.max_linea = max_linea
+        self._buf = bytearray()
+        self._plazo = False  # último plazo fijado (False: ninguno aún)
+        self._en_espera = False  # en recv() sin nada de un mensaje recibido
+        self._cerrar = False
+        self.leidos = 0
+
+    def cierra_en_espera(self):
+        """
+        Para apagar sin cortar preguntas: desde ahora, en cuanto no haya un mensaje
+        a medias, lee_mensaje() devuelve None como si el cliente hubiera cerrado.
+        Si ya está esperando el siguiente mensaje, se le despierta con shutdown().
+        Una conexión recién abierta espera antes su primer mensaje: el cliente
+        acaba de recibir el saludo y va a preguntar.
+        """
+        self._cerrar = True
+        if self._en_espera and self.leidos:
+            try:
+                self.sock.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+
+    def lee_mensaje(self):
+        """Como lee_mensaje(); además lanza PlazoAgotado si vence un plazo."""
+        buf = self._buf
+        fin = buf.find(b"\n")
+        limite = None
+        while fin < 0:
+            if len(buf) > self.max_linea:
+                raise LineaDemasiadoLarga(f"Mensaje de más de {self.max_linea} bytes.")
+            if not buf:
+                fase, plazo = "inactiva", self.inactivo
+            else:
+                if limite is None and self.lectura:
+                    limite = time.monotonic() + self.lectura
+                fase, plazo = "lectura", (limite - time.monotonic() if limite else None)
+                if plazo is not None and plazo <= 0:
+                    raise PlazoAgotado(fase)
+            if plazo != self._plazo:
+                _fija_plazo(self.sock, getattr(socket, "SO_RCVTIMEO", None), plazo)
+                self._plazo = plazo
+            try:
+                if not buf:
+                    self._en_espera = True
+                    if self._cerrar and self.leidos:
+                        return None
+                datos = self.sock.recv(65536)
+            except (TimeoutError, BlockingIOError):
+                raise PlazoAgotado(fase) from None
+            finally:
+                self._en_espera = False
+            if not datos:
+                if not buf or self._cerrar:  # si lo cortó shutdown(), el mensaje no está entero
+                    return None
+                linea = bytes(buf)  # EOF a mitad de línea: se entrega lo recibido
+                buf.clear()
+                return decodifica(linea)
+            inicio = len(buf)
+            buf += datos
+            fin = buf.find(b"\n", inicio)
+        if fin > self.max_linea:
+            raise LineaDemasiadoLarga(f"Mensaje de más de {self.max_linea} bytes.")
+        linea = bytes(buf[:fin + 1])
+        del buf[:fin + 1]
+        self.leidos += 1
+        return decodifica(linea)
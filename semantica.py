@@ -0,0 +1,217 @@
+"""
+Recuperación por similitud TF-IDF sobre las claves normalizadas de la base,
+para preguntas dichas con otras palabras ("sabes quien pinto la mona lisa"
+-> "quien pinto la mona lisa").
+
+Cada clave se describe con palabras sueltas, pares de palabras seguidas y
+trigramas de caracteres dentro de cada palabra (" fr", "fra", "ran"...; así
+"francesa" y "francia" se parecen). El peso es tf sublineal por idf, con
+cada fila normalizada a norma 1: la puntuación de una consulta es el
+coseno, un producto escalar disperso.
+
+La matriz se guarda por columnas (CSC: para cada rasgo, las claves que lo
+tienen y su peso), que es lo que necesita una consulta: solo se recorren
+las columnas de sus rasgos, acumulando en un vector denso con operaciones
+de NumPy. Para acotar la latencia con bases muy grandes se recorren los
+rasgos de más a menos idf hasta gastar MAX_POSTINGS entradas; los que
+quedan fuera son los más comunes ("de", " la"), que apenas distinguen.
+consulta_lote() puntúa muchas consultas con un solo producto de matrices
+dispersas si SciPy está instalado.
+
+Un coseno alto no basta para dar una respuesta por buena: "capital de
+portugal" se parece mucho a "capital de italia". palabras_contenido() deja
+las palabras que cambian el sentido (sin artículos, preposiciones ni
+"cual es"), para que quien contesta pueda exigir que coincidan.
+
+partes() y desde_partes() exponen los arrays del índice para guardarlos en
+el snapshot de la base y abrirlos sin copiarlos (ver conocimiento.py).
+
+NumPy es opcional: sin él, disponible() es False y la etapa no se usa.
+"""
+import math
+import threading
+from array import array
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # la etapa semántica queda desactivada
+    np = None
+
+try:
+    import scipy.sparse as sp
+except ImportError:  # consulta_lote() recorre las consultas una a una
+    sp = None
+
+MAX_POSTINGS = 200_000  # entradas de la matriz que puede recorrer una consulta
+
+# Palabras (ya normalizadas) que no cambian lo que se pregunta. Las interrogativas
+# que sí lo cambian ("quien", "cuando", "como"...) y los pronombres ("tu", "mi") no están.
+PALABRAS_VACIAS = frozenset("""
+    a al ante con de del desde el en entre es esta este hacia la las lo los o para por
+    se son su sus un una unas uno unos y
+    que cual cuales dime sabes oye favor puedes podrias decir
+""".split())
+
+def disponible() -> bool:
+    return np is not None
+
+def rasgos(texto: str) -> Counter:
+    """Palabras, pares de palabras y trigramas de caracteres de un texto ya normalizado."""
+    palabras = texto.split()
+    c = Counter(palabras)
+    c.update(f"{a} {b}" for a, b in zip(palabras, palabras[1:]))
+    for p in palabras:
+        p = f" {p} "
+        c.update("#" + p[i:i + 3] for i in range(len(p) - 2))  # "#" separa trigramas de palabras
+    return c
+
+def palabras_contenido(texto: str) -> frozenset:
+    """Palabras de un texto ya normalizado que no están en PALABRAS_VACIAS."""
+    return frozenset(p for p in texto.split() if p not in PALABRAS_VACIAS)
+
+class IndiceSemantico:
+    def __init__(self, claves, max_postings: int = MAX_POSTINGS):
+        if np is None:
+            raise RuntimeError("La etapa semántica necesita NumPy.")
+        self.claves = list(claves)
+        self.max_postings = max_postings
+        vocabulario: dict[str, int] = {}
+        filas, columnas, tfs = array("i"), array("i"), array("H")  # compactos: ~40 por clave
+        for fila, clave in enumerate(self.claves):
+            for rasgo, tf in rasgos(clave).items():
+                col = vocabulario.setdefault(rasgo, len(vocabulario))
+                filas.append(fila)
+                columnas.append(col)
+                tfs.append(min(tf, 65535))
+        self.vocabulario = vocabulario
+        n = len(self.claves)
+        filas = np.frombuffer(filas, dtype=np.int32)
+        columnas = np.frombuffer(columnas, dtype=np.int32)
+        df = np.bincount(columnas, minlength=len(vocabulario))
+        self.idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+        pesos = (1 + np.log(np.frombuffer(tfs, dtype=np.uint16).astype(np.float32))) * self.idf[columnas]
+        normas = np.sqrt(np.bincount(filas, weights=pesos * pesos, minlength=n))
+        pesos /= np.maximum(normas[filas], 1e-12).astype(np.float32)
+
+        # CSC: columna c -> filas[indptr[c]:indptr[c + 1]] con sus pesos
+        orden = np.argsort(columnas, kind="stable")
+        self.indices = filas[orden]
+        self.datos = pesos[orden].astype(np.float32)
+        self.indptr = np.zeros(len(vocabulario) + 1, dtype=np.int64)
+        np.cumsum(df, out=self.indptr[1:])
+        self._prepara()
+
+    def _prepara(self):
+        # Copias en listas para vector(), que las consulta rasgo a rasgo desde Python
+        self._idf = self.idf.tolist()
+        self._largos = np.diff(self.indptr).tolist()
+        self._local = threading.local()
+
+    @classmethod
+    def desde_partes(cls, claves, partes, max_postings: int = MAX_POSTINGS) -> "IndiceSemantico":
+        """Índice sobre los arrays de partes() (p. ej. un mmap, sin copiarlos); `claves` en el mismo orden."""
+        if np is None:
+            raise RuntimeError("La etapa semántica necesita NumPy.")
+        nombres, idf, indptr, indices, datos = partes
+        indice = cls.__new__(cls)
+        indice.claves = claves
+        indice.max_postings = max_postings
+        texto = bytes(nombres).decode("utf-8")
+        indice.vocabulario = {r: c for c, r in enumerate(texto.split("\n"))} if texto else {}
+        indice.idf = np.frombuffer(idf, dtype=np.float32)
+        indice.indptr = np.frombuffer(indptr, dtype=np.int64)
+        indice.indices = np.frombuffer(indices, dtype=np.int32)
+        indice.datos = np.frombuffer(datos, dtype=np.float32)
+        indice._prepara()
+        return indice
+
+    def partes(self) -> list[tuple[str, object]]:
+        """(código de array, datos): rasgos en orden de columna separados por "\n", idf y matriz CSC."""
+        nombres = "\n".join(self.vocabulario).encode("utf-8")
+        return [("B", nombres), ("f", self.idf), ("q", self.indptr), ("i", self.indices), ("f", self.datos)]
+
+    def __len__(self):
+        return len(self.claves)
+
+    def vector(self, texto: str) -> list[tuple[int, float]]:
+        """
+        (columna, peso) de la consulta, normalizada con todos sus rasgos conocidos
+        y recortada a los de más idf que caben en max_postings.
+        """
+        voc, idf, largos = self.vocabulario, self._idf, self._largos
+        pesos = [(c, (1 + math.log(tf)) * idf[c]) for r, tf in rasgos(texto).items()
+                 if (c := voc.get(r)) is not None]
+        if not pesos:
+            return []
+        norma = math.sqrt(sum(w * w for _, w in pesos))
+        pesos.sort(key=lambda cw: -idf[cw[0]])
+        vector, gastado = [], 0
+        for c, w in pesos:
+            largo = largos[c]
+            if vector and gastado + largo > self.max_postings:
+                continue
+            gastado += largo
+            vector.append((c, w / norma))
+        return vector
+
+    def _acumulador(self):
+        acc = getattr(self._local, "acc", None)
+        if acc is None:
+            acc = self._local.acc = np.zeros(len(self.claves), dtype=np.float32)
+        return acc
+
+    def consulta(self, texto: str, k: int = 1) -> list[tuple[str, float]]:
+        """Las k claves más parecidas a `texto` (ya normalizado), con su coseno."""
+        vector = self.vector(texto)
+        if not vector:
+            return []
+        cols = np.fromiter((c for c, _ in vector), dtype=np.int64, count=len(vector))
+        ws = np.fromiter((w for _, w in vector), dtype=np.float32, count=len(vector))
+        inicios = self.indptr[cols]
+        largos = self.indptr[cols + 1] - inicios
+        # Posiciones de todas las entradas de esas columnas, sin recorrerlas una a una
+        saltos = np.repeat(inicios - (np.cumsum(largos) - largos), largos)
+        pos = saltos + np.arange(len(saltos))
+        tocadas = self.indices[pos]
+        acc = self._acumulador()
+        np.add.at(acc, tocadas, self.datos[pos] * np.repeat(ws, largos))
+        puntos = acc[tocadas]
+        acc[tocadas] = 0.0
+        # Una fila aparece una vez por rasgo compartido: entre las k*len(vector) mejores
+        # entradas están seguro las k mejores filas distintas
+        m = min(len(puntos), k * len(vector))
+        mejores = np.argpartition(-puntos, m - 1)[:m] if m < len(puntos) else np.arange(len(puntos))
+        mejores = mejores[np.lexsort((tocadas[mejores], -puntos[mejores]))]
+        vistas, res = set(), []
+        for fila, valor in zip(tocadas[mejores].tolist(), puntos[mejores].tolist()):
+            if fila not in vistas:
+                vistas.add(fila)
+                res.append((self.claves[fila], valor))
+                if len(res) == k:
+                    break
+        return res
+
+    def consulta_lote(self, textos, k: int = 1) -> list[list[tuple[str, float]]]:
+        """consulta() de muchos textos; con SciPy, un solo producto disperso para todos."""
+        if sp is None:
+            return [self.consulta(t, k) for t in textos]
+        filas, cols, pesos = [], [], []
+        for i, t in enumerate(textos):
+            for c, w in self.vector(t):
+                filas.append(i)
+                cols.append(c)
+                pesos.append(w)
+        q = sp.csr_matrix((np.asarray(pesos, dtype=np.float32), (filas, cols)),
+                          shape=(len(textos), len(self.vocabulario)))
+        x = sp.csc_matrix((self.datos, self.indices, self.indptr),
+                          shape=(len(self.claves), len(self.vocabulario)))
+        puntos = (q @ x.T).tocsr()  # consultas x claves, solo donde comparten algún rasgo
+        res = []
+        for i in range(len(textos)):
+            a, b = puntos.indptr[i], puntos.indptr[i + 1]
+            fila_cols, fila_val = puntos.indices[a:b], puntos.data[a:b]
+            sel = np.argpartition(-fila_val, k - 1)[:k] if b - a > k else range(b - a)
+            orden = sorted(sel, key=lambda j: (-fila_val[j], fila_cols[j]))
+            res.append([(self.claves[fila_cols[j]], float(fila_val[j])) for j in orden if fila_val[j] > 0])
+        return res
@@ -24,7 +24,9 @@ const state = {
   serverOn: false,
   clientOn: false,
   history: [],
+  remote: [],  // entries from other browsers, pushed by /events (not saved locally)
 }
+const REMOTE_MAX = 200
 
 const chatEl = () => document.getElementById('chat')
 const msgTpl = () => document.getElementById('tpl-msg')
@@ -74,20 +76,30 @@ function saveHistoryLocal(){
 function renderHistory(){
   const cont = document.getElementById('historyList')
   cont.innerHTML = ''
-  state.history.slice().reverse().forEach(item => {
+  state.history.concat(state.remote).sort((x, y) => y.t - x.t).forEach(item => {
     const div = document.createElement('div')
-    div.className = 'history-item'
-    div.innerHTML = `<strong>Q:</strong> ${item.q}<br/><strong>A:</strong> ${item.a}<time>${new Date(item.t).toLocaleString()}</time>`
+    div.className = item.remote ? 'history-item remote' : 'history-item'
+    // Text nodes only: entries pushed from other browsers must not be parsed as HTML
+    const label = text => { const b = document.createElement('strong'); b.textContent = text; return b }
+    const time = document.createElement('time')
+    time.textContent = new Date(item.t).toLocaleString()
+    div.append(label('Q:'), ' ' + item.q, document.createElement('br'), label('A:'), ' ' + item.a, time)
     cont.appendChild(div)
   })
 }
 
+function applyServerStatus(s){
+  state.serverOn = s.server_on
+  // On but not ready yet: still loading the knowledge base or binding the port
+  setStatus('serverStatus', s.server_ready, 'Servidor: encendido',
+            s.server_on ? 'Servidor: arrancando' : 'Servidor: apagado')
+}
+
 async function refreshStatus(){
   try{
     const s = await fetch('/status').then(r => r.json())
-    state.serverOn = s.server_on
+    applyServerStatus(s)
     state.clientOn = s.client_on
-    setStatus('serverStatus', s.server_on, 'Servidor: encendido', 'Servidor: apagado')
     setStatus('clientStatus', s.client_on, 'Cliente: conectado', 'Cliente: desconectado')
   }catch(e){
     console.warn(e)
@@ -95,10 +107,43 @@ async function refreshStatus(){
 }
 
 async function startServer(){
-  const data = await api('/server/start')
-  state.serverOn = data.server_on
-  setStatus('serverStatus', true, 'Servidor: encendido', 'Servidor: apagado')
-  addMessage('bot', 'Servidor encendido.')
+  setStatus('serverStatus', false, 'Servidor: encendido', 'Servidor: arrancando')
+  try{
+    const data = await api('/server/start')  // answers once the server accepts connections
+    state.serverOn = data.server_on
+    setStatus('serverStatus', true, 'Servidor: encendido', 'Servidor: apagado')
+    addMessage('bot', 'Servidor encendido.')
+  }catch(e){
+    addMessage('bot', 'Error al encender el servidor: ' + e.message)
+    if(!state.events){ await refreshStatus() }
+  }
+}
+
+async function restartServer(){
+  try{
+    const data = await api('/server/restart')
+    addMessage('bot', `Servidor reiniciado (pid ${data.pid}).`)
+  }catch(e){
+    addMessage('bot', 'Error al reiniciar el servidor: ' + e.message)
+  }
+  if(!state.events){ await refreshStatus() }
+}
+
+// --- Push channel: server status and other users' questions arrive over SSE ---
+function connectEvents(){
+  if(!window.EventSource){ return }
+  // EventSource reconnects by itself (also after being dropped for falling behind)
+  const es = state.events = new EventSource('/events')
+  es.addEventListener('status', ev => applyServerStatus(JSON.parse(ev.data)))
+  es.addEventListener('history', ev => {
+    const data = JSON.parse(ev.data)
+    if(data.own){ return }  // this browser already showed its own replies
+    for(const item of data.items){
+      state.remote.push({q: item.q, a: item.a, t: item.t * 1000, remote: true})
+    }
+    state.remote.splice(0, state.remote.length - REMOTE_MAX)
+    renderHistory()
+  })
 }
 
 async function stopServer(){
@@ -152,6 +197,40 @@ if(!text){ return }
   }
 }
 
+// --- Typeahead: KB questions that start with what is being typed ---
+const SUGGEST_DELAY_MS = 150
+let suggestTimer = null
+let suggestAbort = null
+
+function renderSuggestions(items){
+  const list = document.getElementById('suggestions')
+  list.replaceChildren(...items.map(q => {
+    const opt = document.createElement('option')
+    opt.value = q
+    return opt
+  }))
+}
+
+async function fetchSuggestions(text){
+  if(suggestAbort){ suggestAbort.abort() }  // the answer to an older prefix is no longer useful
+  if(!text.trim()){ renderSuggestions([]); return }
+  const ctrl = suggestAbort = new AbortController()
+  try{
+    const res = await fetch('/suggest?q=' + encodeURIComponent(text), {signal: ctrl.signal})
+    if(!res.ok){ return }
+    const data = await res.json()
+    if(ctrl === suggestAbort){ renderSuggestions(data.suggestions || []) }
+  }catch(e){
+    if(e.name !== 'AbortError'){ console.warn(e) }
+  }
+}
+
+function onMessageInput(ev){
+  clearTimeout(suggestTimer)
+  const text = ev.target.value
+  suggestTimer = setTimeout(() => fetchSuggestions(text), SUGGEST_DELAY_MS)
+}
+
 async function exitApp(){
   try{
     await api('/exit')
@@ -173,16 +252,18 @@ function initMenu(){
 
 function bindUI(){
   document.getElementById('btnStartServer').addEventListener('click', startServer)
+  document.getElementById('btnRestartServer').addEventListener('click', restartServer)
   document.getElementById('btnStopServer').addEventListener('click', stopServer)
   document.getElementById('btnConnect').addEventListener('click', connectClient)
   document.getElementById('btnDisconnect').addEventListener('click', disconnectClient)
   document.getElementById('btnExitApp').addEventListener('click', exitApp)
   document.getElementById('composer').addEventListener('submit', sendMessage)
+  document.getElementById('messageInput').addEventListener('input', onMessageInput)
   document.getElementById('btnToggleHistory').addEventListener('click', () => {
     document.getElementById('historyPanel').classList.toggle('hidden')
   })
   document.getElementById('btnClearHistory').addEventListener('click', () => {
-    state.history = []; saveHistoryLocal(); addMessage('bot', 'Historial local borrado.')
+    state.history = []; state.remote = []; saveHistoryLocal(); addMessage('bot', 'Historial local borrado.')
   })
 
   // Restore local history
@@ -197,4 +278,5 @@ window.addEventListener('DOMContentLoaded', async () => {
   initMenu()
   bindUI()
   await refreshStatus()
+  connectEvents()
 })
@@ -1,20 +1,28 @@
 
-/* Minimax Tic-Tac-Toe with simple alpha-beta pruning */
+/* Tic-Tac-Toe and k-in-a-row on larger boards: moves come from the server
+   (/game/move: perfect-play table for 3x3, time-bounded search otherwise),
+   with a local minimax (3x3) or one-ply heuristic (larger boards) as fallback */
 (() => {
   const boardEl = document.getElementById('board')
   const statusEl = document.getElementById('status')
   const selMark = document.getElementById('humanMark')
+  const selSize = document.getElementById('boardSize')
   const btnNew = document.getElementById('btnNew')
   const btnBack = document.getElementById('btnBack')
 
   const EMPTY = ''
-  let board = Array(9).fill(EMPTY)
+  let rows = 3, cols = 3, k = 3
+  let board = Array(rows * cols).fill(EMPTY)
   let human = 'X'
   let ai = 'O'
   let gameOver = false
+  let thinking = false
 
   function draw(){
     boardEl.innerHTML = ''
+    boardEl.style.gridTemplateColumns = `repeat(${cols}, 1fr)`
+    boardEl.style.gridTemplateRows = `repeat(${rows}, 1fr)`
+    boardEl.classList.toggle('large', cols > 3)
     board.forEach((val, i) => {
       const d = document.createElement('div')
       d.className = 'cell' + (gameOver ? ' disabled' : '')
@@ -27,17 +35,28 @@
     })
   }
 
+  // Every run of k cells (rows, columns, both diagonals); rebuilt when the size changes
+  let windows = []
   function lines(){
-    return [
-      [0,1,2],[3,4,5],[6,7,8],
-      [0,3,6],[1,4,7],[2,5,8],
-      [0,4,8],[2,4,6]
-    ]
+    const out = []
+    for(let r = 0; r < rows; r++){
+      for(let c = 0; c < cols; c++){
+        for(const [dr, dc] of [[0,1],[1,0],[1,1],[1,-1]]){
+          const er = r + dr*(k-1), ec = c + dc*(k-1)
+          if(er < 0 || er >= rows || ec < 0 || ec >= cols) continue
+          const w = []
+          for(let i = 0; i < k; i++) w.push((r + dr*i) * cols + c + dc*i)
+          out.push(w)
+        }
+      }
+    }
+    return out
   }
 
   function winner(b){
-    for(const [a,c,d] of lines()){
-      if(b[a] && b[a] === b[c] && b[a] === b[d]) return {mark:b[a], line:[a,c,d]}
+    for(const w of windows){
+      const m = b[w[0]]
+      if(m && w.every(i => b[i] === m)) return {mark:m, line:w}
     }
     if(b.every(v => v)) return {mark:'draw', line:[]}
     return null
@@ -46,8 +65,11 @@
   function setStatus(msg){ statusEl.textContent = msg }
 
   function restart(){
-    board = Array(9).fill(EMPTY)
+    [rows, cols, k] = (selSize && selSize.value || '3x3x3').split('x').map(Number)
+    windows = lines()
+    board = Array(rows * cols).fill(EMPTY)
     gameOver = false
+    thinking = false
     human = selMark.value || 'X'
     ai = human === 'X' ? 'O' : 'X'
     draw()
@@ -59,7 +81,7 @@
   }
 
   function userMove(i){
-    if(gameOver || board[i]) return
+    if(gameOver || thinking || board[i]) return
     board[i] = human
     const w = winner(board)
     if(w){
@@ -69,8 +91,32 @@
     aiMove()
   }
 
-  function aiMove(){
-    const { index } = bestMove(board, ai, -Infinity, Infinity)
+  // Ask the server (perfect-play table or time-bounded search); play locally if it is unreachable
+  async function serverMove(b){
+    if(location.protocol === 'file:') return undefined
+    try{
+      const res = await fetch('/game/move', {
+        method: 'POST',
+        headers: {'Content-Type': 'application/json'},
+        body: JSON.stringify({board: b, rows, cols, k})
+      })
+      if(!res.ok) return undefined
+      const data = await res.json()
+      return (data.ok && Number.isInteger(data.move)) ? data.move : undefined
+    }catch{
+      return undefined
+    }
+  }
+
+  async function aiMove(){
+    thinking = true
+    const game = board
+    let index = await serverMove(board)
+    if(game !== board || gameOver) return  // restarted while waiting
+    if(index === undefined || board[index]){
+      index = rows * cols === 9 ? bestMove(board, ai, -Infinity, Infinity).index : greedyMove(board)
+    }
+    thinking = false
     if(index !== undefined){
       board[index] = ai
     }
@@ -111,6 +157,28 @@
     return best
   }
 
+  // One-ply heuristic for larger boards: each move is scored by the windows it
+  // extends for the AI (attack) or spoils for the human (defence)
+  function greedyMove(b){
+    let best, bestScore = -1
+    for(let i = 0; i < b.length; i++){
+      if(b[i]) continue
+      let score = 0
+      for(const w of windows){
+        if(!w.includes(i)) continue
+        let mine = 0, theirs = 0
+        for(const j of w){
+          if(b[j] === ai) mine++
+          else if(b[j] === human) theirs++
+        }
+        if(!theirs) score += mine === k-1 ? 1e9 : 2 * 10 ** mine
+        if(!mine) score += theirs === k-1 ? 1e8 : 10 ** theirs
+      }
+      if(score > bestScore){ bestScore = score; best = i }
+    }
+    return best
+  }
+
   function endGame(w){
     gameOver = true
     draw()
@@ -126,6 +194,7 @@
 
   // Events
   selMark.addEventListener('change', restart)
+  if(selSize) selSize.addEventListener('change', restart)
   btnNew.addEventListener('click', restart)
   btnBack.addEventListener('click', () => window.close() || (window.location.href = 'index.html'))
 
@@ -0,0 +1,215 @@
+"""
+Tres en raya con juego perfecto precalculado.
+
+Cada tablero se codifica en base 3 (casilla i -> dígito i: 0 vacía, 1 X,
+2 O), así que cabe en un entero < 3^9 = 19683 que sirve de índice directo
+en arrays compactos. Se recorren una sola vez todas las posiciones
+alcanzables (X siempre empieza), plegadas por las 8 simetrías del tablero:
+solo se resuelven las ~765 canónicas y, para cada código alcanzable, se
+guarda qué canónica le corresponde y con qué simetría. Consultar la mejor
+jugada es leer unos arrays y deshacer la simetría: O(1).
+
+Puntuación (desde el jugador que mueve, como en tictactoe.js): ganar vale
+10 menos las jugadas que faltan, perder lo contrario y empatar 0; así se
+prefieren las victorias rápidas y las derrotas lentas.
+
+Las tablas se construyen en milisegundos; también se pueden guardar y leer
+de un archivo (python tres_en_raya.py --snapshot tres_en_raya.bin).
+"""
+import argparse
+import sys
+from array import array
+from pathlib import Path
+
+CASILLAS = 9
+TOTAL = 3 ** CASILLAS
+SIMBOLOS = {"": 0, " ": 0, "-": 0, ".": 0, "X": 1, "x": 1, "O": 2, "o": 2, "0": 2}
+MARCAS = ("", "X", "O")
+LINEAS = ((0, 1, 2), (3, 4, 5), (6, 7, 8), (0, 3, 6), (1, 4, 7), (2, 5, 8), (0, 4, 8), (2, 4, 6))
+ORDEN = (4, 0, 2, 6, 8, 1, 3, 5, 7)  # centro, esquinas, lados (desempate entre jugadas iguales)
+
+# Las 8 simetrías como permutaciones: la casilla i del tablero transformado es la SIM[s][i] del original
+_ROTA = (6, 3, 0, 7, 4, 1, 8, 5, 2)
+_REFLEJA = (2, 1, 0, 5, 4, 3, 8, 7, 6)
+
+def _compone(p, q):
+    return tuple(p[q[i]] for i in range(CASILLAS))
+
+def _simetrias():
+    sims, r = [], tuple(range(CASILLAS))
+    for _ in range(4):
+        sims.append(r)
+        sims.append(_compone(r, _REFLEJA))
+        r = _compone(r, _ROTA)
+    return tuple(sims)
+
+SIMETRIAS = _simetrias()
+_POT = tuple(3 ** i for i in range(CASILLAS))
+_MAGIA = b"TER1"
+SIN_DATO = -128
+
+def codifica(celdas) -> int:
+    return sum(c * _POT[i] for i, c in enumerate(celdas))
+
+def decodifica(codigo: int) -> list[int]:
+    celdas = []
+    for _ in range(CASILLAS):
+        codigo, d = divmod(codigo, 3)
+        celdas.append(d)
+    return celdas
+
+def ganador(celdas):
+    for a, b, c in LINEAS:
+        if celdas[a] and celdas[a] == celdas[b] == celdas[c]:
+            return celdas[a]
+    return 0
+
+class Tablas:
+    """Arrays indexados por el código base 3 de cualquier tablero alcanzable."""
+    def __init__(self):
+        self.canonica = array("H", [0]) * TOTAL     # código canónico de cada tablero
+        self.simetria = array("b", [-1]) * TOTAL    # simetría que lleva al canónico (-1: inalcanzable)
+        self.valor = array("b", [SIN_DATO]) * TOTAL  # solo en códigos canónicos
+        self.jugada = array("b", [-1]) * TOTAL       # casilla en el marco canónico; -1 si terminado
+
+    @classmethod
+    def construye(cls) -> "Tablas":
+        t = cls()
+        t._recorre([0] * CASILLAS, 1)
+        return t
+
+    def _canoniza(self, celdas):
+        mejor, sim = None, 0
+        for s, perm in enumerate(SIMETRIAS):
+            c = sum(celdas[perm[i]] * _POT[i] for i in range(CASILLAS))
+            if mejor is None or c < mejor:
+                mejor, sim = c, s
+        return mejor, sim
+
+    def _recorre(self, celdas, turno):
+        """Marca todos los tableros alcanzables con su canónico y su simetría."""
+        codigo = codifica(celdas)
+        if self.simetria[codigo] >= 0:
+            return
+        canon, sim = self._canoniza(celdas)
+        if self.valor[canon] == SIN_DATO:
+            self._resuelve([celdas[p] for p in SIMETRIAS[sim]], canon, turno)
+        self.canonica[codigo] = canon
+        self.simetria[codigo] = sim
+        if ganador(celdas) or all(celdas):
+            return
+        for i in range(CASILLAS):
+            if not celdas[i]:
+                celdas[i] = turno
+                self._recorre(celdas, 3 - turno)
+                celdas[i] = 0
+
+    def _resuelve(self, celdas, canon, turno) -> int:
+        """Negamax sobre una posición canónica; los hijos se resuelven por su propio canónico."""
+        if ganador(celdas):
+            valor, mejor = -10, -1  # el rival acaba de ganar
+        elif all(celdas):
+            valor, mejor = 0, -1
+        else:
+            valor, mejor = None, -1
+            rival = 3 - turno
+            for i in ORDEN:
+                if celdas[i]:
+                    continue
+                celdas[i] = turno
+                hijo, sim = self._canoniza(celdas)
+                v = self.valor[hijo]
+                if v == SIN_DATO:
+                    v = self._resuelve([celdas[p] for p in SIMETRIAS[sim]], hijo, rival)
+                celdas[i] = 0
+                v = -v
+                v += -1 if v > 0 else (1 if v < 0 else 0)  # una jugada más lejos
+                if valor is None or v > valor:
+                    valor, mejor = v, i
+        self.valor[canon] = valor
+        self.jugada[canon] = mejor
+        return valor
+
+    # ---------------- Archivo ----------------
+    def guarda(self, ruta):
+        with open(ruta, "wb") as f:
+            f.write(_MAGIA)
+            for a in (self.canonica, self.simetria, self.valor, self.jugada):
+                a.tofile(f)
+
+    @classmethod
+    def lee(cls, ruta) -> "Tablas":
+        t = cls()
+        with open(ruta, "rb") as f:
+            if f.read(len(_MAGIA)) != _MAGIA:
+                raise ValueError(f"{ruta}: no es un archivo de tablas de tres en raya")
+            for a in (t.canonica, t.simetria, t.valor, t.jugada):
+                del a[:]
+                a.fromfile(f, TOTAL)
+        return t
+
+    # ---------------- Consulta ----------------
+    def consulta(self, celdas) -> dict:
+        """
+        celdas: 9 enteros (0, 1=X, 2=O). Devuelve quién mueve, la mejor jugada,
+        su puntuación y el ganador si la partida ya terminó.
+        """
+        if len(celdas) != CASILLAS:
+            raise ValueError("El tablero debe tener 9 casillas.")
+        codigo = codifica(celdas)
+        sim = self.simetria[codigo]
+        if sim < 0:
+            raise ValueError("Tablero imposible en una partida en la que empieza X.")
+        x, o = celdas.count(1), celdas.count(2)
+        turno = 1 if x == o else 2
+        canon = self.canonica[codigo]
+        g = ganador(celdas)
+        if g or all(celdas):
+            return {"turno": MARCAS[turno], "jugada": None, "valor": self.valor[canon],
+                    "terminado": True, "ganador": MARCAS[g] or "empate"}
+        # La casilla i del canónico es la SIMETRIAS[sim][i] del tablero real
+        jugada = SIMETRIAS[sim][self.jugada[canon]]
+        return {"turno": MARCAS[turno], "jugada": jugada, "valor": self.valor[canon],
+                "terminado": False, "ganador": None}
+
+_TABLAS: Tablas | None = None
+
+def carga(ruta=None) -> Tablas:
+    """Tablas del módulo: leídas de `ruta` si existe y es válida; si no, se construyen."""
+    global _TABLAS
+    if ruta and Path(ruta).exists():
+        try:
+            _TABLAS = Tablas.lee(ruta)
+            return _TABLAS
+        except (OSError, ValueError, EOFError):
+            pass
+    _TABLAS = Tablas.construye()
+    return _TABLAS
+
+def lee_tablero(tablero) -> list[int]:
+    """Acepta una lista de 9 marcas ('X', 'O', '') o una cadena como 'X O  XO  '."""
+    if isinstance(tablero, str):
+        tablero = list(tablero)
+    if not isinstance(tablero, (list, tuple)) or len(tablero) != CASILLAS:
+        raise ValueError("El tablero debe tener 9 casillas.")
+    try:
+        return [SIMBOLOS[c if c is not None else ""] for c in tablero]
+    except (KeyError, TypeError):
+        raise ValueError("Casilla inválida: usa 'X', 'O' o vacío.") from None
+
+def mejor_jugada(tablero) -> dict:
+    return (_TABLAS or carga()).consulta(lee_tablero(tablero))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tablas de juego perfecto de tres en raya.")
+    parser.add_argument("--snapshot", required=True, help="archivo donde guardar las tablas")
+    args = parser.parse_args(argv)
+    t = Tablas.construye()
+    t.guarda(args.snapshot)
+    canonicas = sum(1 for v in t.valor if v != SIN_DATO)
+    alcanzables = sum(1 for s in t.simetria if s >= 0)
+    print(f"{alcanzables} tableros alcanzables, {canonicas} canónicos -> {args.snapshot}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())